@@ -1,52 +1,47 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import threading
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
+from metrics import render_prometheus, get_trace
+import llm_runtime
+import providers
 from orchestrator import run_orchestrator
+from llm_cache import response_cache
+from events import broker
+from job_queue import JobQueue
+from session_store import SessionStore
+import archive
+import batch
+import prompt_templates
+import session_log
 import os
-import zipfile
-import io
 import json
-import time
+import uuid
 
 app = Flask(__name__)
-results = {}
-HISTORY_FILE = 'history.json'
-
-def load_history():
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-def save_history(history):
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
-
-def add_to_history(session_id, prompt, status):
-    history = load_history()
-    entry = {
-        'session_id': session_id,
-        'prompt': prompt,
-        'timestamp': int(time.time()),
-        'status': status
-    }
-    history.append(entry)
-    save_history(history)
-
-def update_history_status(session_id, status):
-    history = load_history()
-    for entry in history:
-        if entry['session_id'] == session_id:
-            entry['status'] = status
-            break
-    save_history(history)
-
-def workflow_thread(user_idea, session_id):
+jobs = JobQueue()
+sessions = SessionStore()
+batches = batch.BatchRegistry()
+
+def workflow_thread(session_id, cancel_event, user_idea, project_dir=None):
     def update_progress(status):
-        results[session_id] = {'status': status}
+        sessions.set_status(session_id, status)
+        broker.publish(session_id, 'phase', {'status': status})
+    def stream_token(persona, file_name, text):
+        broker.publish(session_id, 'token', {'persona': persona, 'file_name': file_name, 'text': text})
     update_progress('Processing...')
-    result = run_orchestrator(user_idea, progress_callback=update_progress)
-    results[session_id] = result
-    update_history_status(session_id, result.get('status', 'Unknown'))
+    try:
+        result = run_orchestrator(user_idea, progress_callback=update_progress, token_callback=stream_token,
+                                  cancel_event=cancel_event, session_id=session_id,
+                                  project_dir=project_dir, resume=project_dir is not None)
+    except Exception as e:
+        result = {'status': 'error', 'message': str(e)}
+    sessions.finish(session_id, result)
+    broker.close(session_id, final_event(session_id, result))
+
+def final_event(session_id, result):
+    """Data of a session's 'done' event."""
+    final = {'status': result.get('status', 'Unknown')}
+    if 'project_dir' in result:
+        final['download_url'] = f"/download/{session_id}"
+    return final
 
 @app.route('/', methods=['GET'])
 def index():
@@ -55,19 +50,125 @@ def index():
 @app.route('/start', methods=['POST'])
 def start():
     user_idea = request.form['idea']
-    session_id = str(len(results) + 1)
-    thread = threading.Thread(target=workflow_thread, args=(user_idea, session_id))
-    thread.start()
-    return jsonify({'session_id': session_id})
+    # A refinement of an earlier session reuses its project, regenerating only what the change affects
+    project_dir = None
+    base_session = request.form.get('base_session')
+    if base_session:
+        base = sessions.get(base_session)
+        if not base or 'project_dir' not in base:
+            return jsonify({'error': 'Base session not found or not finished'}), 404
+        project_dir = base['project_dir']
+    session_id = uuid.uuid4().hex
+    # Record the session before queueing it so history and /status see it at once
+    sessions.create(session_id, user_idea)
+    jobs.submit(workflow_thread, user_idea, project_dir, job_id=session_id)
+    position = jobs.position(session_id)
+    if position is not None:
+        broker.publish(session_id, 'phase', {'status': f"Queued (position {position})"})
+    return jsonify({'session_id': session_id, 'queue_position': position})
+
+@app.route('/batch', methods=['POST'])
+def start_batch():
+    """
+    Queues many ideas at once: a JSON list, {"ideas": [...]} or a JSONL body.
+    Each unique idea becomes an ordinary session on the shared job queue.
+    """
+    payload = request.get_json(silent=True)
+    try:
+        if payload is None:
+            ideas = batch.parse_ideas(request.get_data(as_text=True))
+        else:
+            ideas = batch.check_ideas(payload.get('ideas') if isinstance(payload, dict) else payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    unique, duplicates = batch.unique_ideas(ideas)
+    members = []
+    for user_idea in unique:
+        session_id = uuid.uuid4().hex
+        sessions.create(session_id, user_idea)
+        jobs.submit(workflow_thread, user_idea, job_id=session_id)
+        members.append({'session_id': session_id, 'idea': user_idea})
+    batch_id = batches.add(members, duplicates)
+    return jsonify({'batch_id': batch_id, 'sessions': members, 'duplicates': duplicates,
+                    'report_url': f"/batch/{batch_id}"})
+
+@app.route('/batch/<batch_id>')
+def batch_report(batch_id):
+    entry = batches.get(batch_id)
+    if entry is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    rows = []
+    for member in entry['sessions']:
+        row = batch.summarize_result(member['idea'], sessions.get(member['session_id']) or {})
+        row['session_id'] = member['session_id']
+        rows.append(row)
+    report = batch.build_report(rows, entry['duplicates'])
+    report['batch_id'] = batch_id
+    return jsonify(report)
+
+@app.route('/cancel/<session_id>', methods=['POST'])
+def cancel(session_id):
+    previous = jobs.cancel(session_id)
+    if previous is None:
+        return jsonify({'error': 'Session not found or already finished'}), 404
+    if previous == 'queued':
+        # Never started, so nothing else will report its end
+        sessions.finish(session_id, {'status': 'cancelled'})
+        broker.close(session_id, {'status': 'cancelled'})
+    return jsonify({'session_id': session_id, 'status': 'cancelling' if previous == 'running' else 'cancelled'})
 
 @app.route('/status/<session_id>')
 def status(session_id):
-    result = results.get(session_id, {'status': 'Processing...'})
+    result = sessions.get(session_id)
+    if result is None:
+        return jsonify({'error': 'Session not found'}), 404
     response = dict(result)
+    position = jobs.position(session_id)
+    if position is not None:
+        response['status'] = f"Queued (position {position})"
+        response['queue_position'] = position
     if 'project_dir' in result:
         response['download_url'] = f"/download/{session_id}"
+    response['log_url'] = f"/status/{session_id}/log"
     return jsonify(response)
 
+@app.route('/status/<session_id>/log')
+def status_log(session_id):
+    """
+    The session's log from byte ?offset= on (default 0). Poll again with the
+    returned next_offset until 'finished' is true and 'text' is empty.
+    """
+    if sessions.get(session_id) is None:
+        return jsonify({'error': 'Session not found'}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    try:
+        chunk = session_log.read(session_id, offset)
+    except ValueError:
+        return jsonify({'error': 'Session not found'}), 404
+    if chunk is None:
+        chunk = {'text': '', 'offset': offset, 'next_offset': offset, 'skipped': 0}
+    chunk['finished'] = sessions.is_finished(session_id)
+    return jsonify(chunk)
+
+@app.route('/events/<session_id>')
+def events(session_id):
+    """Server-Sent Events stream of phase and token events for a session."""
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    if sessions.get(session_id) is None:
+        return jsonify({'error': 'Session not found'}), 404
+    if not broker.has(session_id) and sessions.is_finished(session_id):
+        # The backlog of a long finished session is gone; all that is left to send is its end
+        final = final_event(session_id, sessions.get(session_id) or {})
+        return Response(f"event: done\ndata: {json.dumps(final)}\n\n", mimetype='text/event-stream')
+    return Response(
+        stream_with_context(broker.stream(session_id, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/output-directory')
 def output_directory():
     output_dir = os.path.join(os.path.dirname(__file__), 'calculator_app')
@@ -79,36 +180,77 @@ def output_directory():
 
 @app.route('/download/<session_id>')
 def download_project(session_id):
-    result = results.get(session_id)
+    result = sessions.get(session_id)
     if not result or 'project_dir' not in result:
         return 'Project not found or not ready', 404
     project_dir = result['project_dir']
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for root, dirs, files in os.walk(project_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, project_dir)
-                zf.write(file_path, arcname)
-    memory_file.seek(0)
+    if not os.path.isdir(project_dir):
+        return 'Project not found or not ready', 404
+    files = archive.list_files(project_dir)
+    digest = archive.tree_hash(files)
     zip_filename = os.path.basename(project_dir.rstrip('/\\')) + '.zip'
-    return send_file(memory_file, download_name=zip_filename, as_attachment=True)
+    cached_path = archive.cached_archive_path(project_dir, digest)
+    if os.path.exists(cached_path):
+        # Complete archive on disk: send_file handles Range, ETag and If-None-Match
+        return send_file(cached_path, download_name=zip_filename, as_attachment=True,
+                         conditional=True, etag=digest, max_age=0)
+    if digest in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(digest)
+        return response
+    # First download of this tree: stream the zip while it is built and cached
+    response = Response(stream_with_context(archive.stream_archive(project_dir, files, digest)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+    response.set_etag(digest)
+    return response
+
+@app.route('/trace/<session_id>')
+def trace(session_id):
+    session_trace = get_trace(session_id)
+    if session_trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(session_trace.as_dict())
+
+@app.route('/metrics')
+def metrics():
+    gauges = {}
+    for name, value in response_cache.stats().items():
+        if isinstance(value, (int, float)):
+            gauges[f"llm_cache_{name}"] = value
+    for name, value in llm_runtime.limiter_stats().items():
+        gauges[f"llm_runtime_{name}"] = value
+    for name, value in jobs.stats().items():
+        gauges[f"job_queue_{name}"] = value
+    for name, value in providers.router.stats().items():
+        gauges[f"llm_router_{name}"] = value
+    return Response(render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
 
 @app.route('/history', methods=['GET'])
 def get_history():
-    return jsonify(load_history())
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    entries, total = sessions.history(page, per_page)
+    response = jsonify(entries)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 @app.route('/history', methods=['DELETE'])
 def clear_history():
-    save_history([])
+    sessions.clear()
     return '', 204
 
 @app.route('/history/<session_id>', methods=['DELETE'])
 def delete_history_item(session_id):
-    history = load_history()
-    history = [h for h in history if h['session_id'] != session_id]
-    save_history(history)
+    sessions.delete(session_id)
+    if not jobs.state(session_id):
+        broker.discard(session_id)
     return '', 204
 
 if __name__ == '__main__':
-    app.run(debug=False, use_reloader=False) 
\ No newline at end of file
+    prompt_templates.registry.preload()
+    app.run(debug=False, use_reloader=False, threaded=True) 
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+import uuid
+import hashlib
+import zipfile
+
+ARCHIVE_CACHE_DIR = os.getenv('ARCHIVE_CACHE_DIR', '.archive_cache')
+# Most archives kept on disk across all projects; the oldest are removed first
+ARCHIVE_CACHE_MAX_FILES = int(os.getenv('ARCHIVE_CACHE_MAX_FILES', '200'))
+CHUNK_SIZE = 64 * 1024
+# Generated by running the tests, not part of the project
+SKIPPED_DIRS = {'__pycache__', '.pytest_cache'}
+# The pipeline's own bookkeeping at the top of a project: checkpoint manifest and session trace
+SKIPPED_FILES = {'.checkpoint.json', 'trace.json'}
+# Hex digits of the tree hash in a cached archive's name
+_DIGEST_CHARS = 32
+
+
+def list_files(project_dir):
+    """Sorted [(arcname, path, size, mtime_ns)] of the files that go into a project's archive."""
+    entries = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+        for name in files:
+            if root == project_dir and name in SKIPPED_FILES:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(path, project_dir).replace(os.sep, '/'), path, st.st_size, st.st_mtime_ns))
+    entries.sort()
+    return entries
+
+
+def tree_hash(files):
+    """
+    Cheap fingerprint of a project tree from names, sizes and mtimes. Any
+    rewrite of a file (e.g. by the Code Fixer) changes it, which is what
+    invalidates a cached archive.
+    """
+    h = hashlib.sha256()
+    for arcname, _, size, mtime_ns in files:
+        h.update(f"{arcname}\0{size}\0{mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def _project_key(project_dir):
+    """The project's name and a hash of its absolute path, so same-named projects never share archives."""
+    path = os.path.abspath(project_dir)
+    return f"{os.path.basename(path)}-{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def cached_archive_path(project_dir, digest):
+    return os.path.join(ARCHIVE_CACHE_DIR, f"{_project_key(project_dir)}-{digest[:_DIGEST_CHARS]}.zip")
+
+
+def _archive_key(name):
+    """The project key of a cached archive's file name."""
+    return name[:-len(f"-{'0' * _DIGEST_CHARS}.zip")]
+
+
+class _ChunkSink:
+    """Write-only, non-seekable stream that tees into the cache file and a buffer of chunks to send."""
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.chunks = []
+
+    def write(self, data):
+        self.cache_file.write(data)
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        self.cache_file.flush()
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def stream_archive(project_dir, files, digest):
+    """
+    Generator yielding a zip of files as it is compressed, with memory
+    bounded by CHUNK_SIZE. The same bytes are written to the archive cache,
+    which is only published once the archive is complete.
+    """
+    archive_path = cached_archive_path(project_dir, digest)
+    os.makedirs(ARCHIVE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{archive_path}.{uuid.uuid4().hex}.tmp"
+    cache_file = open(tmp_path, 'wb')
+    sink = _ChunkSink(cache_file)
+    try:
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for arcname, path, _, _ in files:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as src, zf.open(info, 'w') as dest:
+                    for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        dest.write(block)
+                        yield from sink.drain()
+                yield from sink.drain()
+        yield from sink.drain()
+        cache_file.close()
+        os.replace(tmp_path, archive_path)
+        prune(project_dir, keep=archive_path)
+    finally:
+        # Client went away or zipping failed: never publish a partial archive
+        if not cache_file.closed:
+            cache_file.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune(project_dir, keep=None):
+    """Removes stale archives of project_dir and trims the cache to ARCHIVE_CACHE_MAX_FILES."""
+    key = _project_key(project_dir)
+    archives = []
+    try:
+        names = os.listdir(ARCHIVE_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith('.zip'):
+            continue
+        path = os.path.join(ARCHIVE_CACHE_DIR, name)
+        # Another project's name may start with this one's, e.g. "todo" and "todo-app"
+        if path != keep and _archive_key(name) == key:
+            _remove(path)
+            continue
+        try:
+            archives.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    archives.sort()
+    for _, path in archives[:max(0, len(archives) - ARCHIVE_CACHE_MAX_FILES)]:
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
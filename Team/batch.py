@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import llm_runtime
+from orchestrator import run_orchestrator, project_name_for
+
+# Orchestrator runs in flight at once for a CLI batch (API batches share the app's job queue)
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+# Largest number of ideas accepted in one batch
+MAX_BATCH_IDEAS = int(os.getenv('MAX_BATCH_IDEAS', '1000'))
+# API batches remembered for /batch/<batch_id>
+MAX_BATCHES = 100
+FINISHED_STATUSES = ('success', 'error', 'cancelled')
+# Same ~4 characters per token estimate as llm_cache.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+
+def parse_ideas(text):
+    """
+    Ideas from JSONL text: one JSON string or {"idea": "..."} object per
+    line. Blank lines and lines starting with # are skipped. Raises
+    ValueError naming the first bad line.
+    """
+    ideas = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number}: not valid JSON")
+        idea = value.get('idea') if isinstance(value, dict) else value
+        if not isinstance(idea, str) or not idea.strip():
+            raise ValueError(f"line {number}: expected a string or an object with an 'idea' string")
+        ideas.append(idea.strip())
+    return check_ideas(ideas)
+
+
+def check_ideas(ideas):
+    if not isinstance(ideas, list) or not all(isinstance(idea, str) and idea.strip() for idea in ideas):
+        raise ValueError("ideas must be a list of non-empty strings")
+    if not ideas:
+        raise ValueError("no ideas given")
+    if len(ideas) > MAX_BATCH_IDEAS:
+        raise ValueError(f"at most {MAX_BATCH_IDEAS} ideas per batch")
+    return [idea.strip() for idea in ideas]
+
+
+def unique_ideas(ideas):
+    """
+    Splits ideas into the ones to run and duplicates that would generate
+    into the same project directory, which are reported instead of run.
+    """
+    seen = {}
+    unique = []
+    duplicates = []
+    for idea in ideas:
+        name = project_name_for(idea)
+        if name in seen:
+            duplicates.append({'idea': idea, 'same_as': seen[name]})
+        else:
+            seen[name] = idea
+            unique.append(idea)
+    return unique, duplicates
+
+
+def summarize_result(idea, result):
+    """One report row: outcome, test pass counts, time and estimated tokens of a session."""
+    trace = result.get('trace') or {}
+    tests = result.get('test_results') or []
+    personas = list(trace.get('personas', {}).values())
+    passed = sum(1 for test in tests if test.get('status') == 'passed')
+    status = result.get('status', 'Unknown')
+    return {
+        'idea': idea,
+        'project_dir': result.get('project_dir'),
+        'status': status if status in FINISHED_STATUSES else 'running',
+        'tests_passed': passed,
+        'tests_total': len(tests),
+        'all_tests_passed': bool(tests) and passed == len(tests),
+        'seconds': trace.get('seconds'),
+        'llm_calls': sum(p['calls'] for p in personas),
+        'cache_hits': sum(p['cache_hits'] for p in personas),
+        'prompt_tokens': sum(p.get('prompt_chars', 0) for p in personas) // CHARS_PER_TOKEN,
+        'response_tokens': sum(p.get('response_chars', 0) for p in personas) // CHARS_PER_TOKEN,
+    }
+
+
+def build_report(entries, duplicates=(), wall_seconds=None):
+    totals = {
+        'projects': len(entries),
+        'finished': sum(1 for e in entries if e['status'] in FINISHED_STATUSES),
+        'succeeded': sum(1 for e in entries if e['status'] == 'success'),
+        'all_tests_passed': sum(1 for e in entries if e['all_tests_passed']),
+        'tests_passed': sum(e['tests_passed'] for e in entries),
+        'tests_total': sum(e['tests_total'] for e in entries),
+        'llm_calls': sum(e['llm_calls'] for e in entries),
+        'prompt_tokens': sum(e['prompt_tokens'] for e in entries),
+        'response_tokens': sum(e['response_tokens'] for e in entries),
+    }
+    report = {'totals': totals, 'projects': entries, 'duplicates': list(duplicates)}
+    if wall_seconds is not None:
+        report['wall_seconds'] = round(wall_seconds, 3)
+    return report
+
+
+def run_batch(ideas, concurrency=None, progress=None):
+    """
+    Runs every unique idea through run_orchestrator on one shared pool of
+    `concurrency` sessions and returns the summary report. progress, if
+    given, receives each report row as its project finishes.
+    """
+    unique, duplicates = unique_ideas(check_ideas(ideas))
+    deduplicated_before = llm_runtime.limiter_stats()['deduplicated']
+    start = time.time()
+
+    def run(idea):
+        try:
+            result = run_orchestrator(idea)
+        except Exception as e:
+            result = {'status': 'error', 'message': str(e)}
+        entry = summarize_result(idea, result)
+        if progress:
+            progress(entry)
+        return entry
+
+    workers = max(1, min(concurrency or BATCH_CONCURRENCY, len(unique)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = list(pool.map(run, unique))
+    report = build_report(entries, duplicates, time.time() - start)
+    report['totals']['deduplicated_requests'] = llm_runtime.limiter_stats()['deduplicated'] - deduplicated_before
+    return report
+
+
+def format_report(report):
+    """Plain-text table of a batch report."""
+    lines = [f"{'status':<10}{'tests':>9}{'seconds':>10}{'tokens':>10}  idea"]
+    for entry in report['projects']:
+        tests = f"{entry['tests_passed']}/{entry['tests_total']}"
+        seconds = f"{entry['seconds']:.1f}" if entry['seconds'] is not None else '-'
+        tokens = entry['prompt_tokens'] + entry['response_tokens']
+        lines.append(f"{entry['status']:<10}{tests:>9}{seconds:>10}{tokens:>10}  {entry['idea'][:60]}")
+    totals = report['totals']
+    lines.append(f"{totals['succeeded']}/{totals['projects']} projects succeeded, "
+                 f"{totals['all_tests_passed']} with all tests passing "
+                 f"({totals['tests_passed']}/{totals['tests_total']} tests), "
+                 f"~{totals['prompt_tokens'] + totals['response_tokens']} tokens.")
+    for duplicate in report['duplicates']:
+        lines.append(f"Skipped duplicate: {duplicate['idea'][:60]} (same project as: {duplicate['same_as'][:60]})")
+    return '\n'.join(lines)
+
+
+class BatchRegistry:
+    """Remembers which sessions belong to each API batch, for the most recent MAX_BATCHES batches."""
+
+    def __init__(self, max_batches=MAX_BATCHES):
+        self.max_batches = max_batches
+        self._lock = threading.Lock()
+        self._batches = OrderedDict()
+
+    def add(self, members, duplicates):
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._batches[batch_id] = {'sessions': members, 'duplicates': duplicates, 'created': time.time()}
+            while len(self._batches) > self.max_batches:
+                self._batches.popitem(last=False)
+        return batch_id
+
+    def get(self, batch_id):
+        with self._lock:
+            return self._batches.get(batch_id)
+
+
+def main(ideas_path, report_path=None):
+    """CLI entry point: runs the ideas in a JSONL file and writes <file>_report.json next to it."""
+    try:
+        with open(ideas_path, 'r', encoding='utf-8') as f:
+            ideas = parse_ideas(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Could not read ideas from {ideas_path}: {e}")
+        return 1
+    unique = len(unique_ideas(ideas)[0])
+    print(f"Running {unique} ideas, {min(BATCH_CONCURRENCY, unique)} at a time...")
+    report = run_batch(ideas, progress=lambda entry: print(
+        f"  {entry['status']}: {entry['idea'][:60]} ({entry['tests_passed']}/{entry['tests_total']} tests passed)"))
+    print(format_report(report))
+    report_path = report_path or os.path.splitext(ideas_path)[0] + '_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {report_path}")
+    return 0 if report['totals']['succeeded'] == report['totals']['projects'] else 1
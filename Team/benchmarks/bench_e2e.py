@@ -0,0 +1,334 @@
+"""
+Offline end-to-end benchmark of the persona pipeline.
+
+Run from the Team directory:
+
+    python benchmarks/bench_e2e.py [--sessions 8] [--latency 0.05] [--mode orchestrator|api]
+    python benchmarks/bench_e2e.py --save-baseline default
+    python benchmarks/bench_e2e.py --compare default
+
+Every model call goes to a deterministic fake provider with a fixed latency
+and configurable response sizes, through the real runtime, cache and routing
+code. Each generated module has a scripted outcome. 'pass' modules are
+correct from the start. 'fix' modules fail their tests until the Code Fixer
+repairs them. 'fail' modules are never repaired. The sessions run
+concurrently, either through run_orchestrator directly or through the
+Flask endpoints (/start, /status, /trace). The report covers throughput,
+p50/p95 session latency, peak RSS and a per-phase breakdown.
+
+Baselines are JSON reports in benchmarks/baselines/. --compare flags every
+metric that is more than --threshold worse than the baseline and exits
+with status 1.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+TEAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+OUTCOMES = ('pass', 'fix', 'fail')
+FINISHED_STATUSES = ('success', 'error', 'cancelled')
+# Metrics compared against a baseline, and whether larger values are better
+COMPARED_METRICS = {
+    'wall_seconds': False,
+    'throughput_per_minute': True,
+    'latency.p50': False,
+    'latency.p95': False,
+    'peak_rss_mb': False,
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _filler(label, chars):
+    line = f"- {label}: deterministic filler text used to size benchmark responses.\n"
+    return line * max(0, chars // len(line))
+
+
+def make_bench_provider(providers, config):
+    """A StubProvider whose answers follow config: module count, response size and scripted outcomes."""
+    modules = [f"mod_{i}" for i in range(config['tasks'])]
+    script = config['script']
+    size = config['response_chars']
+
+    def outcome(module):
+        return script[modules.index(module) % len(script)] if module in modules else 'pass'
+
+    def code(module, correct):
+        value = module if correct else 'wrong'
+        padding = ''.join(f"# {line}" for line in _filler('code', size).splitlines(True))
+        return f'```python\n{padding}\ndef run():\n    return "{value}"\n```'
+
+    class BenchProvider(providers.StubProvider):
+        name = 'bench'
+
+        def respond(self, persona, prompt):
+            if persona == 'product_manager':
+                return ("# PRD\n\n## 1. Objective\nBenchmark project.\n\n## 3. Core Features\n"
+                        + _filler('feature', size) + "\n## 5. Out of Scope\n- Everything else.\n")
+            if persona == 'architect':
+                files = ''.join(f"- {module}.py\n" for module in modules)
+                return ("# System Design\n\n## 1. Technology Stack\nPython.\n\n## 2. System Architecture\n"
+                        + _filler('component', size) + "\n## 4. File Structure\n" + files)
+            if persona == 'project_manager':
+                tasks = [{'file_name': f"{module}.py", 'task_description': f"Implement run() in {module}."}
+                         for module in modules]
+                for task in tasks[1:]:
+                    task['depends_on'] = [tasks[0]['file_name']]
+                return '```json\n' + json.dumps(tasks, indent=2) + '\n```'
+            if persona == 'engineer':
+                module = providers._stub_module(prompt, r"code for '([^']+)'")
+                return code(module, outcome(module) == 'pass')
+            if persona == 'code_fixer':
+                fixes = []
+                for name in providers.stub_fix_targets(prompt):
+                    module = os.path.splitext(name)[0]
+                    fixes.append(f"### {name}\n" + code(module, outcome(module) != 'fail'))
+                return '\n\n'.join(fixes)
+            return super().respond(persona, prompt)
+
+    return BenchProvider()
+
+
+def setup_environment(config, workdir):
+    """Points every setting the pipeline reads at import time at the fake provider and workdir."""
+    os.environ.update({
+        'LLM_PROVIDER': 'bench',
+        'LLM_CACHE': '0',
+        'STUB_LATENCY': str(config['latency']),
+        'SESSION_DB': os.path.join(workdir, 'sessions.db'),
+        'JOB_WORKERS': str(config['concurrency']),
+        'SPECULATIVE_PIPELINE': '1' if config['speculative'] else '0',
+    })
+    shutil.copytree(os.path.join(TEAM_DIR, 'prompts'), os.path.join(workdir, 'prompts'))
+    os.chdir(workdir)
+    sys.path.insert(0, TEAM_DIR)
+    import providers
+    provider = make_bench_provider(providers, config)
+    providers.PROVIDERS[provider.name] = provider
+
+
+def _idea(run_id, k):
+    return f"bench {run_id} session {k}"
+
+
+def run_orchestrator_sessions(config, run_id):
+    import orchestrator
+
+    def one(k):
+        start = time.perf_counter()
+        result = orchestrator.run_orchestrator(_idea(run_id, k), session_id=f"{run_id}-{k}")
+        return {'seconds': time.perf_counter() - start, 'status': result['status'],
+                'trace': result.get('trace', {}), 'test_results': result.get('test_results', [])}
+
+    with ThreadPoolExecutor(max_workers=config['concurrency']) as pool:
+        return list(pool.map(one, range(config['sessions'])))
+
+
+def run_api_sessions(config, run_id, poll_seconds=0.05, timeout=3600):
+    import app as webapp
+    client = webapp.app.test_client()
+    started = {}
+    for k in range(config['sessions']):
+        response = client.post('/start', data={'idea': _idea(run_id, k)})
+        started[response.get_json()['session_id']] = time.perf_counter()
+    sessions = []
+    pending = set(started)
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        for session_id in list(pending):
+            status = client.get(f"/status/{session_id}").get_json()
+            if status.get('status') not in FINISHED_STATUSES:
+                continue
+            pending.discard(session_id)
+            trace = client.get(f"/trace/{session_id}")
+            sessions.append({
+                'seconds': time.perf_counter() - started[session_id],
+                'status': status['status'],
+                'trace': trace.get_json().get('summary', {}) if trace.status_code == 200 else {},
+                'test_results': status.get('test_results', []),
+            })
+        time.sleep(poll_seconds)
+    sessions.extend({'seconds': timeout, 'status': 'timeout', 'trace': {}, 'test_results': []} for _ in pending)
+    return sessions
+
+
+def build_report(config, sessions, wall_seconds):
+    latencies = [s['seconds'] for s in sessions]
+    phases = {}
+    llm_calls = 0
+    for session in sessions:
+        for phase, seconds in session['trace'].get('phases', {}).items():
+            phases.setdefault(phase, []).append(seconds)
+        llm_calls += sum(p['calls'] for p in session['trace'].get('personas', {}).values())
+    script = config['script']
+    tests = {'passed': 0, 'failed': 0, 'unexpected': 0}
+    for session in sessions:
+        for result in session['test_results']:
+            module = os.path.splitext(result['file_name'])[0]
+            index = int(module.rsplit('_', 1)[1]) if module.startswith('mod_') else 0
+            expected = 'failed' if script[index % len(script)] == 'fail' else 'passed'
+            tests['passed' if result['status'] == 'passed' else 'failed'] += 1
+            tests['unexpected'] += int(result['status'] != expected)
+    statuses = {}
+    for session in sessions:
+        statuses[session['status']] = statuses.get(session['status'], 0) + 1
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss_unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'config': config,
+        'sessions': len(sessions),
+        'statuses': statuses,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_per_minute': round(len(sessions) * 60 / wall_seconds, 2) if wall_seconds else 0.0,
+        'latency': {
+            'mean': round(statistics.mean(latencies), 3),
+            'p50': round(percentile(latencies, 0.5), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'max': round(max(latencies), 3),
+        },
+        'peak_rss_mb': round(self_usage.ru_maxrss / rss_unit, 1),
+        'children_peak_rss_mb': round(children_usage.ru_maxrss / rss_unit, 1),
+        'phases': {phase: {'mean': round(statistics.mean(values), 3), 'p95': round(percentile(values, 0.95), 3)}
+                   for phase, values in phases.items()},
+        'llm_calls': llm_calls,
+        'tests': tests,
+    }
+
+
+def _metric(report, name):
+    value = report
+    for part in name.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report, baseline, threshold):
+    """Prints current vs baseline metrics; returns the names of the metrics that regressed."""
+    if baseline.get('config') != report['config']:
+        print("Note: baseline was recorded with a different configuration.")
+    names = list(COMPARED_METRICS) + [f"phases.{phase}.mean" for phase in sorted(report['phases'])]
+    regressions = []
+    print(f"\n{'metric':<30}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name in names:
+        current, previous = _metric(report, name), _metric(baseline, name)
+        if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+            continue
+        change = (current - previous) / previous
+        higher_is_better = COMPARED_METRICS.get(name, False)
+        worse = -change if higher_is_better else change
+        flag = '  REGRESSION' if worse > threshold else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<30}{previous:>12}{current:>12}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def print_report(report):
+    config = report['config']
+    print(f"{report['sessions']} sessions ({config['mode']}, concurrency {config['concurrency']}, "
+          f"{config['tasks']} modules each, {config['latency']}s per model call): {report['statuses']}")
+    print(f"Wall time {report['wall_seconds']}s, throughput {report['throughput_per_minute']} sessions/min")
+    latency = report['latency']
+    print(f"Session latency p50 {latency['p50']}s, p95 {latency['p95']}s, max {latency['max']}s")
+    print(f"Peak RSS {report['peak_rss_mb']} MB (pytest children {report['children_peak_rss_mb']} MB), "
+          f"{report['llm_calls']} model calls")
+    for phase, values in report['phases'].items():
+        print(f"  {phase:<16} mean {values['mean']:>8}s  p95 {values['p95']:>8}s")
+    tests = report['tests']
+    print(f"Tests: {tests['passed']} passed, {tests['failed']} failed, {tests['unexpected']} not as scripted")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('orchestrator', 'api'), default='orchestrator')
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, help='sessions in flight at once (default: all)')
+    parser.add_argument('--tasks', type=int, default=3, help='generated modules per session')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per fake model call')
+    parser.add_argument('--response-chars', type=int, default=2000, help='approximate size of each response')
+    parser.add_argument('--script', default='pass,fix,fail',
+                        help='comma-separated outcomes cycled over the modules: ' + ', '.join(OUTCOMES))
+    parser.add_argument('--speculative', action='store_true', help='run the pipeline in speculative mode')
+    parser.add_argument('--save-baseline', metavar='NAME', help='store the report as benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against benchmarks/baselines/NAME.json')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change counted as a regression')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    script = [outcome.strip() for outcome in args.script.split(',') if outcome.strip()]
+    unknown = set(script) - set(OUTCOMES)
+    if not script or unknown:
+        parser.error(f"--script takes a list of {', '.join(OUTCOMES)}")
+    config = {
+        'mode': args.mode,
+        'sessions': args.sessions,
+        'concurrency': args.concurrency or args.sessions,
+        'tasks': args.tasks,
+        'latency': args.latency,
+        'response_chars': args.response_chars,
+        'script': script,
+        'speculative': args.speculative,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='bench_e2e_')
+    cwd = os.getcwd()
+    try:
+        setup_environment(config, workdir)
+        run_id = f"{int(time.time())}"
+        start = time.perf_counter()
+        if args.mode == 'api':
+            sessions = run_api_sessions(config, run_id)
+        else:
+            sessions = run_orchestrator_sessions(config, run_id)
+        report = build_report(config, sessions, time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {path}")
+    status = 0
+    if report['tests']['unexpected']:
+        # The pipeline's behaviour changed, so its timings aren't comparable either
+        print(f"\n{report['tests']['unexpected']} test outcome(s) differ from the script.")
+        status = 1
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
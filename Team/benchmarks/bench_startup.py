@@ -0,0 +1,105 @@
+"""
+Startup-time benchmark for the Flask app, the orchestrator and the CLI.
+
+Run from the Team directory:
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 12] [--json]
+
+Each target is imported in a fresh interpreter with -X importtime. The
+report gives the median wall time per target (minus a bare interpreter
+start), the modules with the largest cumulative import cost, and whether a
+model SDK was imported eagerly, which it should never be.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+TEAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ['app', 'orchestrator', 'run_project']
+# Imported on first use only; seeing one at startup is a regression
+DEFERRED_MODULES = ['google.generativeai', 'openai', 'dotenv']
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            head, cumulative_us, name = line.split('|')
+            rows.append((name.strip(), int(head.split(':')[1]), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def run_import(statement):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=TEAM_DIR,
+                          capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+
+def measure(module, runs, baseline_seconds):
+    walls = []
+    rows = []
+    for _ in range(runs):
+        wall, proc = run_import(f"import {module}")
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"
+            return {'module': module, 'error': error}
+        walls.append(wall)
+        rows = parse_importtime(proc.stderr)
+    imported = {name for name, _, _ in rows}
+    return {
+        'module': module,
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'over_interpreter_ms': round((statistics.median(walls) - baseline_seconds) * 1000, 1),
+        'import_ms': round(sum(self_us for _, self_us, _ in rows) / 1000, 1),
+        'top': [{'module': name, 'cumulative_ms': round(cumulative / 1000, 1), 'self_ms': round(self_us / 1000, 1)}
+                for name, self_us, cumulative in sorted(rows, key=lambda row: -row[2]) if name != module],
+        'eager_sdks': [name for name in DEFERRED_MODULES if name in imported],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per target (median is reported)')
+    parser.add_argument('--top', type=int, default=12, help='modules listed per target')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    parser.add_argument('targets', nargs='*', default=TARGETS)
+    args = parser.parse_args(argv)
+
+    baseline = statistics.median(run_import('pass')[0] for _ in range(args.runs))
+    results = [measure(module, args.runs, baseline) for module in args.targets]
+    for result in results:
+        result['top'] = result.get('top', [])[:args.top]
+    if args.json:
+        print(json.dumps({'interpreter_ms': round(baseline * 1000, 1), 'targets': results}, indent=2))
+        return 0
+
+    print(f"Bare interpreter start: {baseline * 1000:.1f} ms (median of {args.runs})")
+    failed = False
+    for result in results:
+        print()
+        if 'error' in result:
+            print(f"import {result['module']}: FAILED ({result['error']})")
+            failed = True
+            continue
+        print(f"import {result['module']}: {result['wall_ms']} ms wall, {result['over_interpreter_ms']} ms over a "
+              f"bare interpreter, {result['import_ms']} ms in imports")
+        for row in result['top']:
+            print(f"  {row['cumulative_ms']:8.1f} ms cumulative {row['self_ms']:8.1f} ms self  {row['module']}")
+        if result['eager_sdks']:
+            print(f"  WARNING: imported at startup: {', '.join(result['eager_sdks'])}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
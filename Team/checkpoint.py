@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+MANIFEST_NAME = '.checkpoint.json'
+MANIFEST_VERSION = 1
+
+
+def content_hash(*parts):
+    """sha256 over the given strings, separated so ('ab', 'c') and ('a', 'bc') differ."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def file_hash(path):
+    """sha256 of a file's bytes, or None if it cannot be read."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                h.update(block)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """
+    Per-project manifest of completed pipeline steps. Each step records a
+    hash of its inputs and the hashes of the files it wrote, so a later run
+    can skip steps whose inputs are unchanged and whose outputs still exist.
+    Outputs edited by hand are kept (they still exist); their new content
+    changes the inputs of the steps downstream, which then re-run.
+    """
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._steps = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('steps', {})
+
+    def reset(self):
+        """Forgets every recorded step (a fresh, non-resumed run)."""
+        with self._lock:
+            self._steps = {}
+            self._save()
+
+    def reuse(self, step, inputs_hash):
+        """True when step already ran with the same inputs and all of its outputs are still on disk."""
+        with self._lock:
+            entry = self._steps.get(step)
+        if not entry or entry['inputs'] != inputs_hash:
+            return False
+        return all(os.path.exists(os.path.join(self.project_dir, relpath)) for relpath in entry['outputs'])
+
+    def record(self, step, inputs_hash, outputs=(), **data):
+        """Marks step as done for inputs_hash, hashing the output files (paths relative to the project)."""
+        entry = {
+            'inputs': inputs_hash,
+            'outputs': {relpath: file_hash(os.path.join(self.project_dir, relpath)) for relpath in outputs},
+            'data': data,
+            'timestamp': int(time.time()),
+        }
+        with self._lock:
+            self._steps[step] = entry
+            self._save()
+
+    def forget(self, step):
+        """Drops step from the manifest (its task no longer exists)."""
+        with self._lock:
+            if self._steps.pop(step, None) is not None:
+                self._save()
+
+    def outputs(self, step):
+        """Relative paths of the files step wrote."""
+        with self._lock:
+            entry = self._steps.get(step)
+        return list(entry['outputs']) if entry else []
+
+    def output_hash(self, step, relpath):
+        """Hash of an output file as it was when step recorded it, or None."""
+        with self._lock:
+            entry = self._steps.get(step)
+        return entry['outputs'].get(relpath) if entry else None
+
+    def data(self, step):
+        with self._lock:
+            entry = self._steps.get(step)
+        return dict(entry['data']) if entry else {}
+
+    def _save(self):
+        # Caller must hold self._lock
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'steps': self._steps}, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save checkpoint manifest: {e}")
@@ -1,28 +1,92 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import time
+import asyncio
+import threading
+from llm_cache import response_cache, policy_for
+import llm_runtime
+import providers
+
+_configured = False
+_configure_lock = threading.Lock()
 
 def configure_api():
-    """Loads API key from .env and configures the Gemini API."""
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found in .env file.")
-    genai.configure(api_key=api_key)
-
-def invoke_persona(prompt: str) -> str:
     """
-    Sends a prompt to the Gemini Pro model and returns the text response.
+    Loads API keys from .env and configures the model providers the persona
+    routes use. Runs once per process; a failed attempt is retried on the
+    next call.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        providers.configure()
+        _configured = True
+
+async def _invoke(prompt: str, persona: str = None, on_token=None, info=None) -> str:
+    info = info if info is not None else {}
+    cache_model = providers.cache_namespace(persona)
+    info.update(model=cache_model, cache_hit=False, retries=0)
+    cached = await asyncio.to_thread(response_cache.get, cache_model, prompt, persona)
+    if cached is not None:
+        info['cache_hit'] = True
+        if on_token:
+            on_token(cached)
+        return cached
+
+    async def generate():
+        async with llm_runtime.slot():
+            start = time.time()
+            text = await providers.generate(prompt, persona, on_token, info)
+            return text, time.time() - start
+
+    try:
+        if policy_for(persona)['bypass']:
+            response_text, latency = await generate()
+        else:
+            # Identical prompts already in flight (e.g. from other sessions of a batch) share one request
+            (response_text, latency), shared = await llm_runtime.single_flight((cache_model, prompt), generate)
+            if shared:
+                info['shared'] = True
+                if on_token:
+                    on_token(response_text.strip())
+                return response_text.strip()
+        info['model_seconds'] = latency
+        cleaned_text = response_text.strip()
+        await asyncio.to_thread(response_cache.put, cache_model, prompt, cleaned_text, persona, latency)
+        return cleaned_text
+    except Exception as e:
+        info['error'] = str(e)
+        print(f"An error occurred while calling the model providers: {e}")
+        return ""
+
+async def invoke_persona_async(prompt: str, persona: str = None, on_token=None, info=None) -> str:
+    """
+    Sends a prompt along the persona's model route (see providers.py),
+    falling back to the next model on timeouts, rate limits and errors, and
+    returns the text response. Identical prompts are served from the
+    response cache unless the persona's cache policy bypasses it. When
+    on_token is given the response is streamed and on_token is called with
+    each chunk of text as it arrives.
+
+    The request runs on the shared LLM runtime loop and waits for one of its
+    process-wide slots, so it can be awaited from any event loop.
+
     Args:
         prompt: The complete prompt for the persona.
+        persona: Name of the persona (prompt file stem) used to pick the model route and cache policy.
+        on_token: Optional callable receiving streamed text chunks.
+        info: Optional dict filled with call details (model, cache_hit, retries, fallback_errors, error).
+
     Returns:
         The generated text from the model.
     """
-    try:
-        model = genai.GenerativeModel('models/gemini-1.5-pro-latest')
-        response = model.generate_content(prompt)
-        cleaned_text = response.text.replace("```python", "").replace("```", "").strip()
-        return cleaned_text
-    except Exception as e:
-        print(f"An error occurred while calling the Gemini API: {e}")
-        return "" 
\ No newline at end of file
+    return await llm_runtime.submit(_invoke(prompt, persona, on_token, info))
+
+def invoke_persona(prompt: str, persona: str = None, on_token=None, info=None) -> str:
+    """Blocking wrapper around invoke_persona_async() for synchronous callers."""
+    return llm_runtime.run_sync(_invoke(prompt, persona, on_token, info))
+
+def forget_response(prompt: str, persona: str = None):
+    """Drops a cached response that turned out to be unusable so the next call asks the model again."""
+    response_cache.discard(providers.cache_namespace(persona), prompt)
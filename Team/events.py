@@ -0,0 +1,109 @@
+import json
+import time
+import threading
+from collections import deque
+
+# Events kept per session so a reconnecting client can replay what it missed
+BACKLOG_SIZE = 5000
+# Seconds a finished session's backlog is kept for late or reconnecting clients
+CLOSED_BACKLOG_TTL = 300
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+
+class EventBroker:
+    """
+    Per-session publish/subscribe of progress and token events, rendered as
+    Server-Sent Events. Every event gets an increasing id so clients can
+    resume with the Last-Event-ID header. A session's backlog is dropped
+    closed_ttl seconds after its 'done' event.
+    """
+
+    def __init__(self, backlog_size=BACKLOG_SIZE, closed_ttl=CLOSED_BACKLOG_TTL):
+        self.backlog_size = backlog_size
+        self.closed_ttl = closed_ttl
+        self._cond = threading.Condition()
+        self._sessions = {}  # session_id -> {'events': deque, 'next_id': int, 'closed': bool}
+        self._closed = {}    # session_id -> time its stream was closed, oldest first
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {'events': deque(maxlen=self.backlog_size), 'next_id': 1, 'closed': False}
+            self._sessions[session_id] = session
+        return session
+
+    def publish(self, session_id, event, data):
+        """Appends an event to the session's stream and wakes up any listeners."""
+        with self._cond:
+            session = self._session(session_id)
+            session['events'].append((session['next_id'], event, data))
+            session['next_id'] += 1
+            self._cond.notify_all()
+
+    def close(self, session_id, data=None):
+        """Publishes the final 'done' event; streams end once they have sent it."""
+        with self._cond:
+            session = self._session(session_id)
+            session['events'].append((session['next_id'], 'done', data or {}))
+            session['next_id'] += 1
+            session['closed'] = True
+            self._closed.pop(session_id, None)
+            self._closed[session_id] = time.monotonic()
+            self._expire()
+            self._cond.notify_all()
+
+    def _expire(self):
+        # Caller must hold self._cond
+        expired = time.monotonic() - self.closed_ttl
+        for session_id, closed_at in list(self._closed.items()):
+            if closed_at >= expired:
+                break
+            del self._closed[session_id]
+            self._sessions.pop(session_id, None)
+
+    def has(self, session_id):
+        """Whether the session's events are still available."""
+        with self._cond:
+            self._expire()
+            return session_id in self._sessions
+
+    def discard(self, session_id):
+        with self._cond:
+            self._sessions.pop(session_id, None)
+            self._closed.pop(session_id, None)
+
+    def _pending(self, session_id, last_id):
+        # Caller must hold self._cond
+        session = self._sessions.get(session_id)
+        if session is None:
+            return [], False
+        return [e for e in session['events'] if e[0] > last_id], session['closed']
+
+    def stream(self, session_id, last_event_id=0):
+        """
+        Generator of SSE-formatted strings for a session, starting after
+        last_event_id. Waits for the session's first event without creating
+        it, so streams of unknown sessions leave nothing behind.
+        """
+        last_id = last_event_id
+        while True:
+            with self._cond:
+                pending, closed = self._pending(session_id, last_id)
+                if not pending and not closed:
+                    self._cond.wait(timeout=KEEPALIVE_INTERVAL)
+                    pending, closed = self._pending(session_id, last_id)
+            if not pending:
+                if closed:
+                    return
+                yield ': keep-alive\n\n'
+                continue
+            for event_id, event, data in pending:
+                last_id = event_id
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+                if event == 'done':
+                    return
+
+
+# Process-wide broker used by the Flask app
+broker = EventBroker()
@@ -0,0 +1,297 @@
+import os
+import re
+import ast
+import json
+
+# Number of follow-up requests made when a persona's output can't be used
+MAX_REASKS = int(os.getenv('MAX_REASKS', '1'))
+
+# Fence info strings that mean the same thing as a file extension
+LANGUAGE_ALIASES = {
+    'py': {'py', 'python', 'python3'},
+    'js': {'js', 'javascript', 'jsx', 'node'},
+    'ts': {'ts', 'typescript', 'tsx'},
+    'java': {'java'},
+    'c': {'c', 'h'},
+    'cpp': {'cpp', 'c++', 'cc', 'cxx', 'hpp'},
+    'cs': {'cs', 'csharp', 'c#'},
+    'sh': {'sh', 'bash', 'shell', 'zsh'},
+    'rb': {'rb', 'ruby'},
+    'go': {'go', 'golang'},
+    'php': {'php'},
+    'html': {'html', 'htm', 'xml'},
+    'css': {'css'},
+    'json': {'json'},
+    'md': {'md', 'markdown'},
+    'txt': {'txt', 'text', 'plaintext'},
+}
+# Files whose content is prose, where a fence inside the answer is part of the file
+DOCUMENT_EXTENSIONS = {'md', 'txt'}
+
+_BLANK_RE = re.compile(r'\s*')
+
+REASK_TEMPLATE = """{prompt}
+
+Your previous answer could not be used: {error}
+Reply again with only {target}, inside a single fenced code block."""
+
+REASK_FILES_TEMPLATE = """{prompt}
+
+Your previous answer could not be used: {error}
+Reply again with the complete contents of each file you change, each in its own fenced code block
+preceded by a line with the file name."""
+
+
+class ExtractionError(ValueError):
+    """Raised when no usable code or JSON can be extracted from a model response."""
+
+
+def _extension(file_name):
+    return file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+
+
+def _scan_fences(text):
+    """
+    One pass over text's lines. Returns [(info_line, body, label)] for every
+    fenced block: the text after the opening fence, the block's contents and
+    the last non-blank line before the block. A block left open at the end
+    of the text runs to the end.
+    """
+    blocks = []
+    fence = None
+    info = ''
+    label = ''
+    previous = ''
+    body = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if fence is None:
+            if stripped.startswith('```') or stripped.startswith('~~~'):
+                marker = stripped[0]
+                width = len(stripped) - len(stripped.lstrip(marker))
+                fence = marker * width
+                info = stripped[width:].strip()
+                label = previous
+                body = []
+            elif stripped:
+                previous = stripped
+        elif stripped.startswith(fence) and not stripped[len(fence):].strip():
+            blocks.append((info, '\n'.join(body), label))
+            fence = None
+            previous = ''
+        else:
+            body.append(line)
+    if fence is not None:
+        blocks.append((info, '\n'.join(body), label))
+    return blocks
+
+
+def fenced_blocks(text):
+    """
+    Splits text into fenced code blocks. Returns [(info, body)] where info
+    is the lowercased word after the opening fence.
+    """
+    return [((info.split() or [''])[0].lower(), body) for info, body, _ in _scan_fences(text)]
+
+
+def extract_code(text, file_name):
+    """
+    The contents of file_name from a model response. The fenced block tagged
+    with the file's language wins, then the longest untagged or other block;
+    an answer without fences is taken as-is. Markdown and text files keep
+    their inner fences unless the whole answer is a single block.
+    """
+    if not text:
+        return ''
+    text = text.strip()
+    ext = _extension(file_name)
+    if ext in DOCUMENT_EXTENSIONS:
+        if text.startswith(('```', '~~~')):
+            blocks = fenced_blocks(text)
+            if len(blocks) == 1:
+                return blocks[0][1].strip('\n') + '\n'
+        return text + '\n'
+    blocks = fenced_blocks(text)
+    if not blocks:
+        return text + '\n'
+    aliases = LANGUAGE_ALIASES.get(ext, {ext})
+    tagged = [body for info, body in blocks if info in aliases]
+    candidates = tagged or [body for _, body in blocks]
+    return max(candidates, key=len).strip('\n') + '\n'
+
+
+def validate_code(code, file_name):
+    """Cheap syntax check of extracted code; returns an error message or None."""
+    if not code.strip():
+        return 'the answer was empty'
+    ext = _extension(file_name)
+    if ext == 'py':
+        try:
+            ast.parse(code, filename=file_name)
+        except SyntaxError as e:
+            return f"{file_name} is not valid Python: {e.msg} (line {e.lineno})"
+        except ValueError as e:
+            return f"{file_name} is not valid Python: {e}"
+    elif ext == 'json':
+        try:
+            json.loads(code)
+        except ValueError as e:
+            return f"{file_name} is not valid JSON: {e}"
+    return None
+
+
+def _mentions(text, file_name):
+    return re.search(rf"(?<![\w./\\-]){re.escape(file_name)}(?![\w.-])", text) is not None
+
+
+def extract_files(text, file_names):
+    """
+    {file_name: contents} for each of file_names that a multi-file response
+    has a fenced block for. A block belongs to the file named in its fence
+    info string, on the last non-blank line before it (a heading, a
+    "File: ..." line) or in a comment on its first line; a later block for
+    the same file wins.
+    """
+    files = {}
+    for info, body, label in _scan_fences(text or ''):
+        first_line = body.strip().split('\n', 1)[0]
+        comment = first_line if first_line.startswith(('#', '//', '/*', '<!--')) else ''
+        for file_name in file_names:
+            if _mentions(info, file_name) or _mentions(label, file_name) or _mentions(comment, file_name):
+                files[file_name] = body.strip('\n') + '\n'
+                break
+    return files
+
+
+def extract_json(text):
+    """
+    The first JSON value in a model response: a ```json block is preferred,
+    then any fenced block, then the raw text with any preamble skipped.
+    """
+    blocks = fenced_blocks(text or '')
+    candidates = [body for info, body in blocks if info == 'json']
+    candidates += [body for info, body in blocks if info != 'json']
+    candidates.append(text or '')
+    decoder = json.JSONDecoder()
+    error = 'no JSON array or object found'
+    for candidate in candidates:
+        start = _next_value(candidate, 0)
+        while start != -1:
+            try:
+                value, _ = decoder.raw_decode(candidate, start)
+                return value
+            except json.JSONDecodeError as e:
+                error = str(e)
+                # A value broken, or cut off, past its opening bracket: a value nested in it is no answer
+                if e.pos > _BLANK_RE.match(candidate, start + 1).end():
+                    break
+            # A '[' in prose such as "[see below]": try the next one
+            start = _next_value(candidate, start + 1)
+    raise ExtractionError(f"invalid JSON: {error}")
+
+
+def _next_value(text, pos):
+    starts = [i for i in (text.find('[', pos), text.find('{', pos)) if i != -1]
+    return min(starts) if starts else -1
+
+
+def validate_tasks(tasks):
+    """
+    Checks a parsed task list against the project manager's schema and
+    returns it, unwrapping {"tasks": [...]}. Raises ExtractionError.
+    """
+    if isinstance(tasks, dict) and len(tasks) == 1 and isinstance(next(iter(tasks.values())), list):
+        tasks = next(iter(tasks.values()))
+    if not isinstance(tasks, list) or not tasks:
+        raise ExtractionError('expected a non-empty JSON array of task objects')
+    problems = []
+    for i, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            problems.append(f"item {i} is not an object")
+            continue
+        if not isinstance(task.get('file_name'), str) or not task['file_name'].strip():
+            problems.append(f"item {i} has no 'file_name' string")
+        if not isinstance(task.get('task_description'), str):
+            problems.append(f"item {i} has no 'task_description' string")
+        depends_on = task.get('depends_on')
+        if depends_on is not None and not isinstance(depends_on, str) and not (
+                isinstance(depends_on, list) and all(isinstance(d, str) for d in depends_on)):
+            problems.append(f"item {i} has a 'depends_on' that is not a list of file names")
+    if problems:
+        raise ExtractionError('invalid task list: ' + '; '.join(problems[:5]))
+    return tasks
+
+
+def extract_tasks(text):
+    """The validated task list from a project manager response. Raises ExtractionError."""
+    return validate_tasks(extract_json(text))
+
+
+def reask_prompt(prompt, error, target):
+    return REASK_TEMPLATE.format(prompt=prompt, error=error, target=target)
+
+
+def request_code(call, prompt, file_name, on_invalid=None, max_reasks=MAX_REASKS):
+    """
+    Asks for the contents of file_name with call(prompt) -> response text,
+    re-asking up to max_reasks times while the extracted code doesn't pass
+    validate_code(). on_invalid(prompt, error) is called for every unusable
+    answer. Returns (code, error) where error is None if the code is valid.
+    """
+    code = extract_code(call(prompt), file_name)
+    error = validate_code(code, file_name)
+    current = prompt
+    for _ in range(max_reasks):
+        if error is None:
+            break
+        if on_invalid:
+            on_invalid(current, error)
+        current = reask_prompt(prompt, error, f"the complete contents of {file_name}")
+        code = extract_code(call(current), file_name)
+        error = validate_code(code, file_name)
+    if error is not None and on_invalid:
+        on_invalid(current, error)
+    return code, error
+
+
+def request_files(call, prompt, file_names, on_invalid=None, max_reasks=MAX_REASKS):
+    """
+    Like request_code() for an answer that may rewrite any of file_names.
+    Files that fail validate_code() are dropped; the request is repeated
+    only while no usable file came back. Returns ({file_name: code}, error)
+    where error describes the files that were dropped, or is None.
+    """
+    current = prompt
+    for attempt in range(max_reasks + 1):
+        files = extract_files(call(current), file_names)
+        checks = {name: validate_code(code, name) for name, code in files.items()}
+        problems = [error for error in checks.values() if error]
+        valid = {name: code for name, code in files.items() if checks[name] is None}
+        error = '; '.join(problems) if problems else (None if valid else 'no file from the list was returned')
+        if error and on_invalid:
+            on_invalid(current, error)
+        if valid or attempt == max_reasks:
+            return valid, error
+        current = REASK_FILES_TEMPLATE.format(prompt=prompt, error=error)
+
+
+def request_tasks(call, prompt, on_invalid=None, max_reasks=MAX_REASKS, response=None):
+    """
+    Like request_code() for the project manager's task list. response, if
+    given, is an answer to prompt that was already received. Returns the
+    validated list; raises ExtractionError carrying the last response.
+    """
+    current = prompt
+    if response is None:
+        response = call(prompt)
+    for attempt in range(max_reasks + 1):
+        try:
+            return extract_tasks(response)
+        except ExtractionError as e:
+            if on_invalid:
+                on_invalid(current, str(e))
+            if attempt == max_reasks:
+                e.response = response
+                raise
+            current = reask_prompt(prompt, str(e), 'the JSON array of tasks')
+            response = call(current)
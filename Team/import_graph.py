@@ -0,0 +1,102 @@
+import os
+import ast
+
+# Calls that import modules by a name computed at run time
+_DYNAMIC_IMPORTS = {'import_module', '__import__'}
+
+
+def module_name(relpath):
+    """Dotted module name of a project file: 'pkg/util.py' -> 'pkg.util', 'pkg/__init__.py' -> 'pkg'."""
+    parts = os.path.splitext(os.path.normpath(relpath))[0].split(os.sep)
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+
+def _imported_names(tree, relpath):
+    """(dotted names a module imports, whether it also imports by computed name)."""
+    package = module_name(relpath).split('.')
+    if os.path.basename(relpath) != '__init__.py':
+        package = package[:-1]
+    names = set()
+    dynamic = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+                base = '.'.join(base + ([node.module] if node.module else []))
+            else:
+                base = node.module or ''
+            if base:
+                names.add(base)
+            # "from pkg import x" may import the submodule pkg.x
+            names.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+            dynamic = dynamic or name in _DYNAMIC_IMPORTS
+    # Importing pkg.util runs pkg/__init__.py first
+    parents = {name.rsplit('.', i)[0] for name in names for i in range(1, name.count('.') + 1)}
+    return names | parents, dynamic
+
+
+def build(project_dir, files):
+    """
+    {file: set of project files it imports directly} for the given project
+    files (paths relative to project_dir). A module is looked up from the
+    project root and from the importing file's own directory, which is
+    where pytest's default import mode puts test directories on sys.path;
+    importing pkg.util also imports pkg/__init__.py. A file that imports by
+    computed name is taken to import every file, and every test file
+    depends on the conftest.py files above it. Files that don't parse have
+    no edges of their own.
+    """
+    by_module = {module_name(path): path for path in files}
+    graph = {}
+    for path in files:
+        try:
+            with open(os.path.join(project_dir, path), 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (OSError, SyntaxError, ValueError):
+            graph[path] = set()
+            continue
+        names, dynamic = _imported_names(tree, path)
+        if dynamic:
+            graph[path] = set(files) - {path}
+            continue
+        directory = module_name(os.path.join(os.path.dirname(path), '__init__.py'))
+        edges = set()
+        for name in names:
+            for candidate in (name, f"{directory}.{name}" if directory else name):
+                target = by_module.get(candidate)
+                if target and target != path:
+                    edges.add(target)
+        graph[path] = edges
+    conftests = [path for path in files if os.path.basename(path) == 'conftest.py']
+    for path in files:
+        name = os.path.basename(path)
+        if not (name.startswith('test_') or name.endswith('_test.py')):
+            continue
+        for conftest in conftests:
+            scope = os.path.dirname(conftest)
+            if conftest != path and (not scope or path.startswith(scope + os.sep)):
+                graph[path].add(conftest)
+    return graph
+
+
+def dependents(graph, changed):
+    """The changed files plus every file in graph that imports one of them, directly or transitively."""
+    importers = {}
+    for path, edges in graph.items():
+        for target in edges:
+            importers.setdefault(target, set()).add(path)
+    found = set(changed)
+    frontier = list(changed)
+    while frontier:
+        for importer in importers.get(frontier.pop(), ()):
+            if importer not in found:
+                found.add(importer)
+                frontier.append(importer)
+    return found
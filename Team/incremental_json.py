@@ -0,0 +1,127 @@
+import json
+import re
+
+# Characters that can follow an array's opening '[': a value or the closing ']'
+_ARRAY_START = set('[{"-0123456789]')
+_LITERALS = ('true', 'false', 'null')
+_FOLLOWING_RE = re.compile(r'\s*(\S{0,5})')
+
+
+def _opens_array(following):
+    """
+    Whether the text after a '[' starts an array's first value, or None if
+    there is too little of it yet to tell.
+    """
+    if not following:
+        return None
+    if following[0] in _ARRAY_START:
+        return True
+    for literal in _LITERALS:
+        if following.startswith(literal):
+            return True
+        if literal.startswith(following):
+            return None
+    return False
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array that arrives in chunks, e.g. streamed
+    model output. feed() returns the elements completed by the new text, so
+    callers can act on each one before the closing bracket has been produced.
+
+    Anything before the opening '[' (a ```json fence, a sentence of preamble,
+    a bracketed "[see below]") and anything after the closing ']' is ignored.
+    Each character is scanned once; only the text of the element being read
+    is kept in memory.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.complete = False
+        self.errors = []
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._start = None   # offset of the element being read, if any
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """Consumes chunk and returns the list of elements it completed."""
+        if self.complete or not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        completed = []
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if c == '[':
+                    opens = _opens_array(_FOLLOWING_RE.match(text, i + 1).group(1))
+                    if opens is None:
+                        # Wait for the next chunk to see what the '[' opens
+                        break
+                    # A '[' in prose such as "[see below]" does not start the array
+                    if opens:
+                        self._depth = 1
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._start is None:
+                    self._start = i
+            elif c in '[{':
+                if self._depth == 1 and self._start is None:
+                    self._start = i
+                self._depth += 1
+            elif c in ']}':
+                self._depth -= 1
+                if self._depth == 0:
+                    # End of the array; a scalar element may still be pending
+                    self._emit(text, i, completed)
+                    self.complete = True
+                    break
+                if self._depth == 1:
+                    self._emit(text, i + 1, completed)
+            elif c == ',':
+                if self._depth == 1:
+                    self._emit(text, i, completed)
+            elif not c.isspace() and self._depth == 1 and self._start is None:
+                self._start = i
+            i += 1
+        # Drop everything that can no longer be part of an element
+        if self.complete:
+            self._text = ''
+            self._pos = 0
+        elif self._depth == 0:
+            # Only a '[' still waiting for the character after it is kept
+            self._text = text[i:]
+            self._pos = 0
+        elif self._start is None:
+            self._text = ''
+            self._pos = 0
+        else:
+            self._text = text[self._start:]
+            self._pos = i - self._start
+            self._start = 0
+        return completed
+
+    def _emit(self, text, end, completed):
+        if self._start is None:
+            return
+        raw = text[self._start:end]
+        self._start = None
+        try:
+            item = json.loads(raw)
+        except ValueError as e:
+            self.errors.append(f"{e}: {raw[:200]}")
+            return
+        self.items.append(item)
+        completed.append(item)
@@ -0,0 +1,103 @@
+import os
+import uuid
+import threading
+from collections import deque
+
+# Number of orchestrator runs allowed to execute at the same time
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+
+
+class Job:
+    def __init__(self, job_id, fn, args):
+        self.id = job_id
+        self.fn = fn
+        self.args = args
+        self.cancel_event = threading.Event()
+        self.state = 'queued'  # queued -> running -> finished | cancelled
+
+
+class JobQueue:
+    """
+    FIFO job queue drained by a fixed number of worker threads. Each job is
+    called as fn(job_id, cancel_event, *args); cancel_event is set when the
+    job is cancelled while running, and the job is expected to stop at its
+    next checkpoint.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = {}
+        self._threads = []
+
+    def submit(self, fn, *args, job_id=None):
+        """Queues a job and returns its id (a fresh uuid unless job_id is given)."""
+        job = Job(job_id or uuid.uuid4().hex, fn, args)
+        with self._cond:
+            if job.id in self._jobs:
+                raise ValueError(f"Duplicate job id: {job.id}")
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._start_workers()
+            self._cond.notify()
+        return job.id
+
+    def position(self, job_id):
+        """1-based position of a queued job, or None if it is not waiting."""
+        with self._cond:
+            for i, job in enumerate(self._queue):
+                if job.id == job_id:
+                    return i + 1
+        return None
+
+    def state(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.state if job else None
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs are dropped immediately; running jobs are
+        signalled through their cancel_event. Returns the job's state before
+        cancelling, or None if the job is unknown or already finished.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in ('finished', 'cancelled'):
+                return None
+            previous = job.state
+            if job.state == 'queued':
+                self._queue.remove(job)
+                job.state = 'cancelled'
+                del self._jobs[job_id]
+            job.cancel_event.set()
+            return previous
+
+    def stats(self):
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.state == 'running')
+            return {'workers': self.workers, 'queued': len(self._queue), 'running': running}
+
+    def _start_workers(self):
+        # Caller must hold self._cond
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{len(self._threads) + 1}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.state = 'running'
+            try:
+                job.fn(job.id, job.cancel_event, *job.args)
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+            finally:
+                with self._cond:
+                    job.state = 'cancelled' if job.cancel_event.is_set() else 'finished'
+                    self._jobs.pop(job.id, None)
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_ENABLED = os.getenv('LLM_CACHE', '1') != '0'
+CACHE_DIR = os.getenv('LLM_CACHE_DIR', '.llm_cache')
+MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '256'))
+DISK_MAX_BYTES = int(os.getenv('LLM_CACHE_DISK_MAX_BYTES', str(200 * 1024 * 1024)))
+
+DAY = 24 * 3600
+
+# Per-persona cache policy. 'ttl' is in seconds (None never expires) and
+# 'bypass' skips the cache entirely for that persona.
+PERSONA_POLICIES = {
+    'product_manager': {'ttl': 7 * DAY, 'bypass': False},
+    'architect': {'ttl': 7 * DAY, 'bypass': False},
+    'project_manager': {'ttl': DAY, 'bypass': False},
+    'engineer': {'ttl': DAY, 'bypass': False},
+    'qa_engineer': {'ttl': DAY, 'bypass': False},
+    # Fixer prompts embed fresh pytest output; a cached fix is never what we want
+    'code_fixer': {'ttl': 0, 'bypass': True},
+}
+DEFAULT_POLICY = {'ttl': DAY, 'bypass': False}
+
+
+def policy_for(persona):
+    """Returns the cache policy for a persona name (or the default for unknown/None)."""
+    return PERSONA_POLICIES.get(persona, DEFAULT_POLICY)
+
+
+def make_key(model, prompt):
+    """Content address of a request: sha256 over the model name and the fully rendered prompt."""
+    h = hashlib.sha256()
+    h.update(model.encode('utf-8'))
+    h.update(b'\0')
+    h.update(prompt.encode('utf-8'))
+    return h.hexdigest()
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) used for savings reporting."""
+    return len(text) // 4
+
+
+class ResponseCache:
+    """
+    Two-tier cache of model responses: an in-memory LRU in front of a
+    size-capped directory of JSON files. Safe to share between threads.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_entries=MEMORY_ENTRIES, disk_max_bytes=DISK_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # computed lazily on first disk write
+        self._stats = {
+            'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+            'stores': 0, 'evictions': 0, 'expired': 0, 'bypassed': 0,
+            'saved_seconds': 0.0, 'saved_tokens': 0,
+        }
+
+    def get(self, model, prompt, persona=None):
+        """Returns the cached response for (model, prompt), or None on a miss."""
+        policy = policy_for(persona)
+        if not CACHE_ENABLED or policy['bypass']:
+            self._count('bypassed')
+            return None
+        key = make_key(model, prompt)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        tier = 'memory_hits'
+        if entry is None:
+            entry = self._read_disk(key)
+            tier = 'disk_hits'
+        if entry is not None and self._expired(entry, policy['ttl']):
+            self.discard(model, prompt)
+            self._count('expired')
+            entry = None
+        if entry is None:
+            self._count('misses')
+            return None
+        if tier == 'disk_hits':
+            self._remember(key, entry)
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats[tier] += 1
+            self._stats['saved_seconds'] += entry.get('latency', 0.0)
+            self._stats['saved_tokens'] += estimate_tokens(prompt) + estimate_tokens(entry['response'])
+        return entry['response']
+
+    def put(self, model, prompt, response, persona=None, latency=0.0):
+        """Stores a response. Empty responses (failed calls) are never cached."""
+        if not CACHE_ENABLED or not response or policy_for(persona)['bypass']:
+            return
+        key = make_key(model, prompt)
+        entry = {
+            'model': model,
+            'persona': persona,
+            'created': time.time(),
+            'latency': latency,
+            'response': response,
+        }
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+        self._count('stores')
+
+    def discard(self, model, prompt):
+        """Removes a cached response, e.g. when it turned out to be unusable."""
+        key = make_key(model, prompt)
+        with self._lock:
+            self._memory.pop(key, None)
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def stats(self):
+        """Snapshot of hit/miss counters and estimated savings."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['memory_entries'] = len(self._memory)
+            snapshot['disk_bytes'] = self._disk_bytes
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _expired(entry, ttl):
+        return ttl is not None and time.time() - entry['created'] > ttl
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # mtime doubles as last-access time for eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Could not write LLM cache entry: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += size
+            over_cap = self._disk_bytes > self.disk_max_bytes
+        if over_cap:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _scan_disk_bytes(self):
+        total = 0
+        for path in self._disk_entries():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _evict_disk(self):
+        """Deletes least recently used files until the disk tier is back under 90% of its cap."""
+        entries = []
+        for path in self._disk_entries():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evictions'] += evicted
+
+
+# Process-wide cache shared by every client module
+response_cache = ResponseCache()
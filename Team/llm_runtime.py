@@ -0,0 +1,88 @@
+import os
+import asyncio
+import threading
+import contextlib
+
+# Process-wide cap on model requests in flight, across every session and thread
+MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '8'))
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_semaphore = None
+_in_flight = 0
+_waiting = 0
+_shared_requests = {}   # key -> Task, only touched on the runtime loop
+_deduplicated = 0
+
+
+def get_loop():
+    """Returns the shared event loop that all model calls run on, starting it on first use."""
+    global _loop, _thread, _semaphore
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=loop.run_forever, name='llm-runtime', daemon=True)
+            _thread.start()
+            _semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+            _loop = loop
+    return _loop
+
+
+@contextlib.asynccontextmanager
+async def slot():
+    """Holds one of the MAX_IN_FLIGHT request slots for the duration of the block."""
+    global _in_flight, _waiting
+    get_loop()
+    _waiting += 1
+    try:
+        await _semaphore.acquire()
+    finally:
+        _waiting -= 1
+    _in_flight += 1
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+        _semaphore.release()
+
+
+async def submit(coro):
+    """Awaits coro on the shared loop, from whichever event loop the caller is running in."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def run_sync(coro):
+    """Runs coro on the shared loop and blocks the calling thread until it finishes."""
+    loop = get_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the LLM runtime loop; await the coroutine instead.")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def single_flight(key, factory):
+    """
+    Awaits factory() on the runtime loop, sharing one run between concurrent
+    callers with the same key. Returns (result, shared) where shared is True
+    for callers that joined a run started by someone else. The run is not
+    cancelled when the caller that started it goes away.
+    """
+    global _deduplicated
+    task = _shared_requests.get(key)
+    if task is not None:
+        _deduplicated += 1
+        return await asyncio.shield(task), True
+    task = asyncio.ensure_future(factory())
+    _shared_requests[key] = task
+    task.add_done_callback(lambda _: _shared_requests.pop(key, None))
+    return await asyncio.shield(task), False
+
+
+def limiter_stats():
+    """Current number of requests holding or waiting for a slot, and how many joined an identical request."""
+    return {'max_in_flight': MAX_IN_FLIGHT, 'in_flight': _in_flight, 'waiting': _waiting,
+            'deduplicated': _deduplicated}
@@ -0,0 +1,233 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Number of finished session traces kept in memory for /trace/<session_id>
+MAX_TRACES = 200
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+CHARS_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # sorted label items -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, series in items:
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_labels(key, le=bound)} {series[i]}")
+            lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {round(series[-1], 6)}")
+        return '\n'.join(lines)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(key)} {value}" for key, value in items)
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key, **extra):
+    items = list(key) + [(k, str(v)) for k, v in extra.items()]
+    if not items:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+PHASE_SECONDS = Histogram('pipeline_phase_seconds', 'Wall time of each pipeline phase.', SECONDS_BUCKETS)
+SESSION_SECONDS = Histogram('pipeline_session_seconds', 'Wall time of a whole orchestrator run.', SECONDS_BUCKETS)
+LLM_SECONDS = Histogram('llm_call_seconds', 'Wall time of invoke_persona calls.', SECONDS_BUCKETS)
+LLM_PROMPT_CHARS = Histogram('llm_prompt_chars', 'Size of rendered prompts sent to personas.', CHARS_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram('llm_response_chars', 'Size of persona responses.', CHARS_BUCKETS)
+PYTEST_SECONDS = Histogram('pytest_run_seconds', 'Wall time of sandboxed pytest runs.', SECONDS_BUCKETS)
+LLM_CALLS = Counter('llm_calls_total', 'invoke_persona calls by persona and cache result.')
+LLM_RETRIES = Counter('llm_retries_total', 'Retried or re-routed model requests.')
+SESSIONS = Counter('pipeline_sessions_total', 'Finished orchestrator runs by final status.')
+
+REGISTRY = [PHASE_SECONDS, SESSION_SECONDS, LLM_SECONDS, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, PYTEST_SECONDS,
+            LLM_CALLS, LLM_RETRIES, SESSIONS]
+
+
+class Span:
+    """One timed operation inside a trace. Attributes can be added while it is open."""
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs.setdefault('error', exc_type.__name__)
+        self.end()
+        return False
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.time() - self.start
+            self.trace._finish_span(self)
+
+    def as_dict(self):
+        return {'name': self.name, 'start': round(self.start, 3), 'duration': round(self.duration or 0.0, 4), **self.attrs}
+
+
+class Trace:
+    """
+    Structured record of one session: a span per phase, per persona call and
+    per pytest run. Finished spans also feed the process-wide histograms.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.start = time.time()
+        self.duration = None
+        self.status = None
+        self._lock = threading.Lock()
+        self._spans = []
+        self._phase = None
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def phase(self, name):
+        """Ends the current phase span (if any) and starts a new one called name."""
+        with self._lock:
+            previous, self._phase = self._phase, Span(self, 'phase', {'phase': name})
+        if previous:
+            previous.end()
+
+    def finish(self, status):
+        with self._lock:
+            previous, self._phase = self._phase, None
+        if previous:
+            previous.end()
+        self.duration = time.time() - self.start
+        self.status = status
+        SESSION_SECONDS.observe(self.duration, status=status)
+        SESSIONS.inc(status=status)
+        _remember(self)
+
+    def _finish_span(self, span):
+        with self._lock:
+            self._spans.append(span)
+        attrs = span.attrs
+        if span.name == 'phase':
+            PHASE_SECONDS.observe(span.duration, phase=attrs['phase'])
+        elif span.name == 'invoke_persona':
+            cache = 'hit' if attrs.get('cache_hit') else 'miss'
+            LLM_SECONDS.observe(span.duration, persona=attrs.get('persona'), cache=cache)
+            LLM_PROMPT_CHARS.observe(attrs.get('prompt_chars', 0), persona=attrs.get('persona'))
+            LLM_RESPONSE_CHARS.observe(attrs.get('response_chars', 0), persona=attrs.get('persona'))
+            LLM_CALLS.inc(persona=attrs.get('persona'), cache=cache)
+            if attrs.get('retries'):
+                LLM_RETRIES.inc(attrs['retries'], persona=attrs.get('persona'))
+        elif span.name == 'run_pytest':
+            PYTEST_SECONDS.observe(span.duration, status=attrs.get('status'))
+
+    def summary(self):
+        """Per-phase and per-persona totals, for quick inspection."""
+        with self._lock:
+            spans = list(self._spans)
+        phases = {}
+        personas = {}
+        for span in spans:
+            if span.name == 'phase':
+                phases[span.attrs['phase']] = round(span.duration, 3)
+            elif span.name == 'invoke_persona':
+                entry = personas.setdefault(span.attrs.get('persona'), {
+                    'calls': 0, 'seconds': 0.0, 'cache_hits': 0, 'prompt_chars': 0, 'response_chars': 0})
+                entry['calls'] += 1
+                entry['seconds'] = round(entry['seconds'] + span.duration, 3)
+                entry['cache_hits'] += int(bool(span.attrs.get('cache_hit')))
+                entry['prompt_chars'] += span.attrs.get('prompt_chars', 0)
+                entry['response_chars'] += span.attrs.get('response_chars', 0)
+        seconds = round(self.duration, 3) if self.duration is not None else None
+        return {'seconds': seconds, 'phases': phases, 'personas': personas}
+
+    def as_dict(self):
+        with self._lock:
+            spans = [span.as_dict() for span in self._spans]
+        return {
+            'session_id': self.session_id,
+            'start': round(self.start, 3),
+            'duration': round(self.duration, 3) if self.duration is not None else None,
+            'status': self.status,
+            'summary': self.summary(),
+            'spans': spans,
+        }
+
+
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def _remember(trace):
+    with _traces_lock:
+        _traces[trace.session_id] = trace
+        _traces.move_to_end(trace.session_id)
+        while len(_traces) > MAX_TRACES:
+            _traces.popitem(last=False)
+
+
+def get_trace(session_id):
+    with _traces_lock:
+        return _traces.get(session_id)
+
+
+def render_prometheus(extra_gauges=None):
+    """All metrics in the Prometheus text exposition format, plus optional {name: value} gauges."""
+    parts = [metric.render() for metric in REGISTRY]
+    for name, value in (extra_gauges or {}).items():
+        parts.append(f"# TYPE {name} gauge\n{name} {value}")
+    return '\n'.join(parts) + '\n'
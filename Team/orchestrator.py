@@ -1,49 +1,116 @@
 import os
 import json
-import subprocess
 import re
-from deepseek_client import configure_api, invoke_persona
+import functools
+import uuid
+from deepseek_client import configure_api, invoke_persona, forget_response
+from scheduler import TaskScheduler
+from incremental_json import JsonArrayStream
+from extractor import request_code, request_files, request_tasks, ExtractionError
+from retrieval import get_index
+from test_runner import summarize, TEST_WORKERS
+from test_worker import TestWorker
+from concurrent.futures import ThreadPoolExecutor
+from checkpoint import Checkpoint, content_hash, file_hash
+from prompt_budget import fit_prompt, PromptStats
+from metrics import Trace
+from session_log import SessionLog
+import prompt_templates
+import task_graph
+import repair
+import import_graph
 
 KNOWLEDGE_BASE_DIR = 'knowledge_base'
-
-# Ensure knowledge base directory exists
-os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
+# Maximum number of engineer/QA persona calls in flight per session
+MAX_CONCURRENT_TASKS = int(os.getenv('MAX_CONCURRENT_TASKS', '4'))
+# Overlap pipeline phases by starting work on partial streamed output
+SPECULATIVE_PIPELINE = os.getenv('SPECULATIVE_PIPELINE', '0') == '1'
+# Heading of the PRD's last section; the architect only needs what comes before it
+OUT_OF_SCOPE_HEADING = re.compile(r'^[ \t#*\d.]*Out[ \t]+of[ \t]+Scope\b', re.IGNORECASE | re.MULTILINE)
 
 def retrieve_context(user_prompt, top_k=2):
-    """Simple keyword search over .txt/.md files in knowledge_base/. Returns top_k most relevant snippets."""
-    files = [f for f in os.listdir(KNOWLEDGE_BASE_DIR) if f.endswith(('.txt', '.md'))]
-    scored = []
-    for fname in files:
-        path = os.path.join(KNOWLEDGE_BASE_DIR, fname)
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        # Score by keyword overlap
-        score = sum(1 for word in user_prompt.lower().split() if word in content.lower())
-        if score > 0:
-            scored.append((score, content[:1500]))  # Limit snippet size
-    scored.sort(reverse=True)
-    return '\n---\n'.join([s[1] for s in scored[:top_k]]) if scored else ''
-
-def augment_prompt(user_prompt):
-    context = retrieve_context(user_prompt)
+    """BM25 search over the chunked .txt/.md files in knowledge_base/. Returns the top_k most relevant snippets."""
+    hits = get_index(KNOWLEDGE_BASE_DIR).search(user_prompt, top_k=top_k)
+    return '\n---\n'.join(text for _, _, text in hits)
+
+def augment_prompt(user_prompt, query=None):
+    """Prefixes user_prompt with knowledge-base context retrieved for query (defaults to the prompt itself)."""
+    context = retrieve_context(query or user_prompt)
     if context:
         return f"Relevant context from knowledge base:\n{context}\n\nUser request: {user_prompt}"
     return user_prompt
 
+def project_name_for(user_idea):
+    """Directory name of the project generated for user_idea."""
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', user_idea.strip().lower())
+
 def read_prompt_template(file_path: str) -> str:
+    """Prompt template text, read once per process and again only after the file changes."""
+    return prompt_templates.load(file_path)
+
+def read_text(file_path: str) -> str:
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def run_pytest_on_file(test_file_path, cwd):
+def test_file_for(file_name):
+    """Name of the test file the QA Engineer writes for file_name."""
+    return f"test_{file_name.replace('.py', '')}.py"
+
+def prd_requirements(prd_text):
+    """The PRD up to its Out of Scope section, or None if that heading has not been written (yet)."""
+    match = OUT_OF_SCOPE_HEADING.search(prd_text)
+    if match is None:
+        return None
+    return prd_text[:match.start()].rstrip()
+
+def _generate_tasks(call_persona, pm_task_prompt, status_log, progress_callback, response=None):
+    """
+    Asks the project manager persona for the task list, re-asking when the
+    answer isn't a valid task array; returns the parsed list or None.
+    response, if given, is an answer to pm_task_prompt already received.
+    """
+    def on_invalid(prompt, error):
+        # Don't let a bad task list be replayed from the cache on the next run
+        forget_response(prompt, 'project_manager')
+        status_log.append(f"Task list rejected: {error}")
     try:
-        result = subprocess.run([
-            'pytest', test_file_path, '--maxfail=1', '--disable-warnings', '-q'
-        ], cwd=cwd, capture_output=True, text=True)
-        return (result.returncode == 0, result.stdout + result.stderr)
-    except Exception as e:
-        return (False, str(e))
-
-def run_orchestrator(user_idea, progress_callback=None):
+        return request_tasks(lambda prompt: call_persona(prompt, 'project_manager'), pm_task_prompt, on_invalid,
+                             response=response)
+    except ExtractionError as e:
+        status_log.append("Failed to parse task JSON. Output was:\n" + e.response)
+        if progress_callback:
+            progress_callback('Failed to parse task JSON.')
+        return None
+
+class PipelineCancelled(Exception):
+    """Raised between LLM calls once a run has been asked to stop."""
+
+def run_orchestrator(user_idea, progress_callback=None, max_workers=None, token_callback=None, cancel_event=None,
+                     resume=False, session_id=None, speculative=None, project_dir=None):
+    """
+    Runs the full persona pipeline for one idea. progress_callback receives
+    phase/status strings; token_callback, if given, receives
+    (persona, file_name, text) for every chunk of streamed model output.
+    Setting cancel_event stops the run before its next LLM call. With
+    resume=True, steps recorded in the project's checkpoint manifest whose
+    inputs are unchanged are skipped instead of re-generated. Every phase,
+    persona call and pytest run is recorded as a span in the session's
+    trace, which is saved as trace.json in the project directory. Status
+    messages go to the log file of session_id, if given (see session_log);
+    the result's 'log' only holds the latest of them.
+
+    With speculative=True (default: SPECULATIVE_PIPELINE) phases overlap: the
+    architect starts as soon as the PRD's requirement sections have streamed
+    in, designing against everything before Out of Scope, and each task
+    starts code generation as soon as its entry in the project manager's
+    JSON array has been parsed.
+
+    project_dir defaults to a directory named after the idea; pass the
+    directory of an earlier run (with resume=True) to refine that project.
+    Files are then regenerated only when their task description or the
+    PRD/design sections relevant to them changed, and the result's
+    'changes' lists what was added, changed and removed.
+    """
     try:
         configure_api()
     except ValueError as e:
@@ -51,90 +118,255 @@ def run_orchestrator(user_idea, progress_callback=None):
             progress_callback(f"Error: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
-    # Sanitize project name for directory
-    project_name = re.sub(r'[^a-zA-Z0-9_-]', '_', user_idea.strip().lower())
-    project_dir = os.path.join('.', project_name)
+    trace = Trace(session_id or uuid.uuid4().hex)
+    # Written to the session's log file as it grows (only for a named session,
+    # which the app deletes with it); the result only carries the latest messages
+    status_log = SessionLog(session_id)
+    try:
+        if speculative is None:
+            speculative = SPECULATIVE_PIPELINE
+        result = _run_pipeline(user_idea, status_log, progress_callback, max_workers, token_callback, cancel_event,
+                               resume, trace, speculative, project_dir)
+    except PipelineCancelled:
+        status_log.append("Project generation cancelled.")
+        if progress_callback:
+            progress_callback('Project generation cancelled.')
+        result = {'status': 'cancelled', 'log': status_log}
+    except Exception:
+        trace.finish('error')
+        raise
+    finally:
+        status_log.close()
+    result['log'] = status_log.tail()
+    trace.finish(result['status'])
+    result['trace'] = trace.summary()
+    if 'project_dir' in result:
+        _save_trace(trace, result['project_dir'])
+    return result
+
+def _save_trace(trace, project_dir):
+    try:
+        with open(os.path.join(project_dir, 'trace.json'), 'w', encoding='utf-8') as f:
+            json.dump(trace.as_dict(), f, indent=1)
+    except OSError as e:
+        print(f"Could not save trace: {e}")
+
+def resume_orchestrator(user_idea, **kwargs):
+    """Re-runs the pipeline for user_idea, regenerating only what changed since the last checkpoint."""
+    return run_orchestrator(user_idea, resume=True, **kwargs)
+
+def refine_orchestrator(user_idea, project_dir, **kwargs):
+    """Runs a revised idea against the project an earlier run generated in project_dir."""
+    return run_orchestrator(user_idea, resume=True, project_dir=project_dir, **kwargs)
+
+def _run_pipeline(user_idea, status_log, progress_callback, max_workers, token_callback, cancel_event, resume, trace,
+                  speculative, project_dir=None):
+    project_dir = project_dir or os.path.join('.', project_name_for(user_idea))
     os.makedirs(project_dir, exist_ok=True)
-    status_log = []
+    checkpoint = Checkpoint(project_dir)
+    if not resume:
+        checkpoint.reset()
+    previous_graph = checkpoint.data('graph').get('nodes', {})
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled()
+
+    def call_persona(prompt, persona, file_name=None, on_text=None, on_restart=None):
+        """
+        on_text receives the response as it streams in. When the router falls
+        back to another model mid-stream, on_restart() is called before the
+        new model's first chunk; the text before it came from the failed one.
+        """
+        check_cancelled()
+        info = {}
+        on_token = None
+        if token_callback or on_text:
+            attempt = [0]
+            def on_token(text):
+                if on_restart and info.get('retries', 0) != attempt[0]:
+                    attempt[0] = info.get('retries', 0)
+                    on_restart()
+                if on_text:
+                    on_text(text)
+                if token_callback:
+                    token_callback(persona, file_name, text)
+        with trace.span('invoke_persona', persona=persona, file_name=file_name, prompt_chars=len(prompt)) as span:
+            response = invoke_persona(prompt, persona=persona, on_token=on_token, info=info)
+            span.set(response_chars=len(response), **info)
+        return response
+
+    def ask_for_file(prompt, persona, file_name, target=None):
+        """
+        Calls persona for the contents of target (default file_name), re-asking
+        when the answer doesn't parse. Returns (code, error), see request_code().
+        """
+        target = target or file_name
+        def on_invalid(rejected_prompt, error):
+            forget_response(rejected_prompt, persona)
+            status_log.append(f"Rejected {persona} output for {target}: {error}")
+        return request_code(lambda p: call_persona(p, persona, file_name), prompt, target, on_invalid)
+
+    test_worker = TestWorker(project_dir)
+
+    def run_tests(test_file_names):
+        """{test_file: record} for one pytest session over test_file_names."""
+        with trace.span('run_pytest', test_files=len(test_file_names)) as span:
+            records = test_worker.run(test_file_names)
+            passed = all(record['passed'] for record in records.values())
+            span.set(status='passed' if passed else 'failed',
+                     failed=sum(not record['passed'] for record in records.values()))
+        return records
+
+    prompt_stats = PromptStats()
+
+    def budgeted_prompt(template, persona, focus_file, focus_task='', **fields):
+        prompt, report = fit_prompt(template, persona, focus_file, focus_task, **fields)
+        prompt_stats.add(report)
+        if report['over_budget']:
+            status_log.append(f"Warning: {persona} prompt for {focus_file} is ~{report['tokens']} tokens, "
+                              f"over the {report['budget']} token budget.")
+        else:
+            status_log.append(f"{persona} prompt for {focus_file}: ~{report['tokens']} tokens "
+                              f"(~{report['full_tokens']} before compaction).")
+        return prompt
+
     # PHASE 1: PLANNING & DESIGN
+    trace.phase('planning')
     if progress_callback:
         progress_callback('Generating PRD...')
     pm_prompt_template = read_prompt_template('prompts/product_manager.txt')
-    pm_prompt = pm_prompt_template.format(user_idea=user_idea)
-    prd_text = invoke_persona(pm_prompt)
+    pm_prompt = augment_prompt(pm_prompt_template.format(user_idea=user_idea), query=user_idea)
     prd_file_path = os.path.join(project_dir, 'prd.md')
-    with open(prd_file_path, 'w', encoding='utf-8') as f:
-        f.write(prd_text)
-    status_log.append(f"PRD saved to '{prd_file_path}'")
-
-    if progress_callback:
-        progress_callback('Generating System Design...')
     architect_prompt_template = read_prompt_template('prompts/architect.txt')
-    architect_prompt = architect_prompt_template.format(prd_content=prd_text)
-    system_design = invoke_persona(architect_prompt)
     system_design_path = os.path.join(project_dir, 'system_design.md')
-    with open(system_design_path, 'w', encoding='utf-8') as f:
-        f.write(system_design)
-    status_log.append(f"System Design saved to '{system_design_path}'")
 
-    # PHASE 2: TASK BREAKDOWN
-    if progress_callback:
-        progress_callback('Breaking down tasks...')
-    pm_task_prompt_template = read_prompt_template('prompts/project_manager.txt')
-    pm_task_prompt = pm_task_prompt_template.format(prd_content=prd_text, system_design=system_design)
-    task_json = invoke_persona(pm_task_prompt)
-    try:
-        task_json_clean = task_json.strip()
-        task_json_clean = re.sub(r'^(json|```json|```)', '', task_json_clean, flags=re.IGNORECASE).strip()
-        task_json_clean = re.sub(r'```$', '', task_json_clean).strip()
-        tasks = json.loads(task_json_clean)
-    except Exception as e:
-        status_log.append("Failed to parse task JSON. Output was:\n" + task_json)
+    def design_system(prd_content):
+        architect_prompt = augment_prompt(architect_prompt_template.format(prd_content=prd_content), query=user_idea)
+        if checkpoint.reuse('system_design', content_hash(architect_prompt)):
+            status_log.append(f"System Design reused from '{system_design_path}'")
+            return read_text(system_design_path)
+        system_design = call_persona(architect_prompt, 'architect')
+        if not system_design.strip():
+            # Every provider failed; leave the step unrecorded so the next run asks again
+            return ''
+        with open(system_design_path, 'w', encoding='utf-8') as f:
+            f.write(system_design)
+        checkpoint.record('system_design', content_hash(architect_prompt), ['system_design.md'])
+        status_log.append(f"System Design saved to '{system_design_path}'")
+        return system_design
+
+    # In speculative mode the architect is started from the PRD stream and
+    # only sees the requirement sections, also when the PRD is reused
+    speculation = {}
+    design_pool = ThreadPoolExecutor(max_workers=1) if speculative else None
+    prd_chunks = []
+
+    def on_prd_text(text):
+        prd_chunks.append(text)
+        if 'future' in speculation:
+            return
+        requirements = prd_requirements(''.join(prd_chunks).strip())
+        if requirements:
+            speculation['prd'] = requirements
+            speculation['future'] = design_pool.submit(speculative_design, requirements)
+
+    def speculative_design(requirements):
         if progress_callback:
-            progress_callback('Failed to parse task JSON.')
-        return {'status': 'error', 'log': status_log}
-    status_log.append(f"Parsed {len(tasks)} tasks.")
+            progress_callback('Generating System Design (speculative)...')
+        return design_system(requirements)
 
-    # PHASE 3: CODE GENERATION
-    if progress_callback:
-        progress_callback('Generating code files...')
+    try:
+        if checkpoint.reuse('prd', content_hash(pm_prompt)):
+            prd_text = read_text(prd_file_path)
+            status_log.append(f"PRD reused from '{prd_file_path}'")
+        else:
+            prd_text = call_persona(pm_prompt, 'product_manager', on_text=on_prd_text if speculative else None)
+            if not prd_text.strip():
+                status_log.append("The Product Manager returned no PRD.")
+                return {'status': 'error', 'log': status_log}
+            with open(prd_file_path, 'w', encoding='utf-8') as f:
+                f.write(prd_text)
+            checkpoint.record('prd', content_hash(pm_prompt), ['prd.md'])
+            status_log.append(f"PRD saved to '{prd_file_path}'")
+
+        prd_for_design = (prd_requirements(prd_text) or prd_text) if speculative else prd_text
+        system_design = None
+        if 'future' in speculation:
+            # Always wait, so a discarded speculation can't overwrite the real design
+            speculated = speculation['future'].result()
+            if speculation['prd'] == prd_for_design:
+                system_design = speculated
+                status_log.append("System Design was generated speculatively from the streamed PRD.")
+            else:
+                status_log.append("Speculative System Design discarded: the final PRD differs from the streamed one.")
+        if system_design is None:
+            if progress_callback:
+                progress_callback('Generating System Design...')
+            system_design = design_system(prd_for_design)
+        if not system_design.strip():
+            status_log.append("The Architect returned no System Design.")
+            return {'status': 'error', 'log': status_log}
+    finally:
+        if design_pool:
+            design_pool.shutdown(wait=True)
+
+    # Engineer and QA steps, scheduled per task as soon as each task is known.
+    # Each file is generated as soon as the files it depends on exist, and its
+    # unit tests are generated as soon as the file itself has been written.
     engineer_prompt_template = read_prompt_template('prompts/engineer.txt')
-    generated_files = []
-    for i, task in enumerate(tasks):
+    qa_prompt_template = read_prompt_template('prompts/qa_engineer.txt')
+
+    # Keyed on the file's graph node rather than on the whole prompt, so an
+    # edit to a PRD or design section the file doesn't use keeps it
+    graph = {}
+
+    def generate_file(task):
         file_name = task['file_name']
         task_description = task['task_description']
-        if progress_callback:
-            progress_callback(f"Generating {file_name}...")
-        engineer_prompt = engineer_prompt_template.format(
+        code_inputs = content_hash(engineer_prompt_template, graph[file_name]['inputs'])
+        if checkpoint.reuse(f"code:{file_name}", code_inputs):
+            status_log.append(f"{file_name} reused from checkpoint.")
+            return file_name
+        engineer_prompt = budgeted_prompt(
+            engineer_prompt_template, 'engineer', file_name, task_description,
             file_name=file_name,
             task_description=task_description,
             prd_content=prd_text,
             system_design=system_design
         )
+        if progress_callback:
+            progress_callback(f"Generating {file_name}...")
         os.makedirs(os.path.dirname(os.path.join(project_dir, file_name)), exist_ok=True)
-        code = invoke_persona(engineer_prompt)
-        # Clean code for any file type
-        code = clean_code(code, file_name)
+        code, error = ask_for_file(engineer_prompt, 'engineer', file_name)
         file_path = os.path.join(project_dir, file_name)
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(code)
-        generated_files.append(file_name)
-        status_log.append(f"{file_name} generated.")
+        if error is None:
+            checkpoint.record(f"code:{file_name}", code_inputs, [file_name])
+            status_log.append(f"{file_name} generated.")
+        else:
+            status_log.append(f"{file_name} written as returned, to be generated again next run: {error}")
+        return file_name
 
-    # PHASE 4: QUALITY ASSURANCE
-    if progress_callback:
-        progress_callback('Generating unit tests...')
-    qa_prompt_template = read_prompt_template('prompts/qa_engineer.txt')
-    test_files = []
-    for file_name in generated_files:
+    def generate_test(file_name, task_description=''):
         file_path = os.path.join(project_dir, file_name)
+        test_file_name = test_file_for(file_name)
+        # Keyed on the code as the engineer wrote it, so later Code Fixer
+        # edits to the file don't invalidate its tests
+        qa_inputs = content_hash(qa_prompt_template, graph[file_name]['inputs'],
+                                 checkpoint.output_hash(f"code:{file_name}", file_name))
+        if checkpoint.reuse(f"test:{file_name}", qa_inputs):
+            status_log.append(f"{test_file_name} reused from checkpoint.")
+            return (file_name, test_file_name)
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 file_code = f.read()
         except Exception as e:
             status_log.append(f"Could not read {file_name}: {e}")
-            continue
-        qa_prompt = qa_prompt_template.format(
+            return None
+        qa_prompt = budgeted_prompt(
+            qa_prompt_template, 'qa_engineer', file_name, task_description,
             file_name=file_name,
             prd_content=prd_text,
             system_design=system_design,
@@ -142,84 +374,282 @@ def run_orchestrator(user_idea, progress_callback=None):
         )
         if progress_callback:
             progress_callback(f"Generating test for {file_name}...")
-        test_code = invoke_persona(qa_prompt)
-        test_file_name = f"test_{file_name.replace('.py', '')}.py"
+        test_code, error = ask_for_file(qa_prompt, 'qa_engineer', file_name, test_file_name)
         test_file_path = os.path.join(project_dir, test_file_name)
         os.makedirs(os.path.dirname(test_file_path), exist_ok=True)
         with open(test_file_path, 'w', encoding='utf-8') as f:
             f.write(test_code)
-        test_files.append((file_name, test_file_name))
-        status_log.append(f"{test_file_name} generated.")
+        if error is None:
+            checkpoint.record(f"test:{file_name}", qa_inputs, [test_file_name])
+            status_log.append(f"{test_file_name} generated.")
+        else:
+            status_log.append(f"{test_file_name} written as returned, to be generated again next run: {error}")
+        return (file_name, test_file_name)
+
+    scheduler = TaskScheduler(max_workers=max_workers or MAX_CONCURRENT_TASKS)
+    scheduled = {}  # file name -> the task its code and test are generated for
+
+    def schedule(task):
+        # Task ids are file names, so a dependency on a task that hasn't been
+        # parsed yet simply waits for it (or is dropped at close())
+        if not isinstance(task, dict) or not isinstance(task.get('file_name'), str) or 'task_description' not in task:
+            status_log.append(f"Ignoring malformed task: {str(task)[:200]}")
+            return
+        file_name = task['file_name']
+        if file_name in scheduled:
+            status_log.append(f"Ignoring duplicate task for {file_name}.")
+            return
+        scheduled[file_name] = task
+        graph[file_name] = task_graph.task_node(task, prd_text, system_design)
+        depends_on = task.get('depends_on') or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        code_deps = [('code', d) for d in depends_on if isinstance(d, str)]
+        scheduler.submit(('code', file_name), functools.partial(generate_file, task), code_deps)
+        scheduler.submit(('test', file_name), functools.partial(generate_test, file_name, task['task_description']),
+                         [('code', file_name)])
+
+    # PHASE 2: TASK BREAKDOWN
+    trace.phase('task_breakdown')
+    if progress_callback:
+        progress_callback('Breaking down tasks...')
+    pm_task_prompt_template = read_prompt_template('prompts/project_manager.txt')
+    pm_task_prompt = pm_task_prompt_template.format(prd_content=prd_text, system_design=system_design)
+    tasks_path = os.path.join(project_dir, 'tasks.json')
+    tasks = None
+    tasks_reused = False
+    if checkpoint.reuse('tasks', content_hash(pm_task_prompt)):
+        try:
+            tasks = json.loads(read_text(tasks_path))
+            tasks_reused = True
+            status_log.append(f"Task list reused from '{tasks_path}'")
+        except ValueError:
+            tasks = None
+    if tasks is None and speculative:
+        # Start each task as soon as its array element has streamed in
+        stream = {'parser': JsonArrayStream()}
+        def on_task_text(text):
+            for task in stream['parser'].feed(text):
+                schedule(task)
+        def on_restart():
+            stream['parser'] = JsonArrayStream()
+        if progress_callback:
+            progress_callback('Breaking down tasks and generating code files...')
+        task_json = call_persona(pm_task_prompt, 'project_manager', on_text=on_task_text, on_restart=on_restart)
+        # Validates the whole list, re-asking if the stream didn't hold one
+        tasks = _generate_tasks(call_persona, pm_task_prompt, status_log, progress_callback, response=task_json)
+        if tasks is None:
+            # Let the files that were already started finish before giving up
+            scheduler.wait()
+            return {'status': 'error', 'log': status_log}
+    elif tasks is None:
+        tasks = _generate_tasks(call_persona, pm_task_prompt, status_log, progress_callback)
+        if tasks is None:
+            return {'status': 'error', 'log': status_log}
+    if not tasks_reused:
+        with open(tasks_path, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f, indent=2)
+        checkpoint.record('tasks', content_hash(pm_task_prompt), ['tasks.json'])
+    status_log.append(f"Parsed {len(tasks)} tasks.")
+
+    # PHASE 3 & 4: CODE GENERATION AND QUALITY ASSURANCE
+    trace.phase('code_and_tests')
+    if progress_callback:
+        progress_callback('Generating code files...')
+    final_tasks = {task['file_name']: task for task in tasks
+                   if isinstance(task, dict) and isinstance(task.get('file_name'), str)}
+    # Started from a streamed answer that was then rejected, or from a model
+    # that failed mid-stream, and not in the final list as they were
+    stale = [file_name for file_name, task in scheduled.items() if final_tasks.get(file_name) != task]
+    for task in tasks:
+        # Tasks parsed from the stream are already running
+        if not (isinstance(task, dict) and task.get('file_name') in scheduled):
+            schedule(task)
+    task_results = scheduler.wait()
+    check_cancelled()
+    if stale:
+        scheduler = TaskScheduler(max_workers=max_workers or MAX_CONCURRENT_TASKS)
+        for file_name in stale:
+            del scheduled[file_name]
+            del graph[file_name]
+            if file_name in final_tasks:
+                status_log.append(f"Regenerating {file_name}: its final task differs from the streamed one.")
+                schedule(final_tasks[file_name])
+            else:
+                _discard_task_outputs(checkpoint, file_name, status_log)
+        task_results.update(scheduler.wait())
+        check_cancelled()
+    changes = task_graph.diff_graphs(previous_graph, graph)
+    if previous_graph:
+        _log_changes(changes, status_log)
+        for file_name in changes['removed']:
+            _remove_task_outputs(checkpoint, file_name, status_log)
+    checkpoint.record('graph', content_hash(json.dumps(graph, sort_keys=True)), nodes=graph)
+
+    test_files = []
+    for file_name in scheduled:
+        code_result = task_results.get(('code', file_name))
+        if isinstance(code_result, Exception):
+            status_log.append(f"Failed to generate {file_name}: {code_result}")
+        test_result = task_results.get(('test', file_name))
+        if isinstance(test_result, Exception):
+            status_log.append(f"Failed to generate test for {file_name}: {test_result}")
+        elif test_result:
+            test_files.append(test_result)
 
     # PHASE 5: CODE FIXER / DEBUGGER LOOP
+    # Each round runs the pending test files in one session of the project's
+    # sandboxed pytest worker, groups the failures by signature and makes one
+    # Code Fixer call per group, covering every file the group implicates.
+    # Groups that share no files are fixed concurrently. The next round only
+    # re-runs the tests that import a rewritten file, directly or not.
+    trace.phase('test_and_fix')
     if progress_callback:
         progress_callback('Running tests and fixing code if needed...')
-    code_fixer_prompt_template = read_prompt_template('prompts/code_fixer.txt')
+    code_fixer_prompt_template = read_prompt_template('prompts/code_fixer_batch.txt')
+    source_for = {test_file_name: file_name for file_name, test_file_name in test_files}
+    attempts = {test_file_name: [] for _, test_file_name in test_files}
+    outcomes = {}  # test file -> 'passed' or its latest repair.Failure
+
+    def sources_hash():
+        # A test can import any generated file, so a pass only stays valid
+        # while none of them has changed
+        return content_hash(*(file_hash(os.path.join(project_dir, name))
+                              for pair in test_files for name in pair))
+
+    def fix_group(group):
+        """One Code Fixer call for a failure group; returns the files it rewrote."""
+        names = ', '.join(group.files)
+        def on_invalid(rejected_prompt, error):
+            forget_response(rejected_prompt, 'code_fixer')
+            status_log.append(f"Rejected code_fixer output for {names}: {error}")
+        prompt = budgeted_prompt(code_fixer_prompt_template, 'code_fixer', group.files[0],
+                                 **repair.fixer_fields(group, project_dir))
+        if progress_callback:
+            progress_callback(f"Fixing {names}...")
+        try:
+            fixed, _ = request_files(lambda p: call_persona(p, 'code_fixer', group.files[0]), prompt, group.files,
+                                     on_invalid)
+        except PipelineCancelled:
+            raise
+        except Exception as e:
+            status_log.append(f"Code Fixer failed for {names}: {e}")
+            return []
+        for name, code in fixed.items():
+            with open(os.path.join(project_dir, name), 'w', encoding='utf-8') as f:
+                f.write(code)
+        if fixed:
+            status_log.append(f"{', '.join(fixed)} updated by Code Fixer "
+                              f"({len(group.failures)} failing test file(s): {group.signature[:200]}).")
+        return list(fixed)
+
+    pending = []
     for file_name, test_file_name in test_files:
-        test_file_path = os.path.join(project_dir, test_file_name)
-        file_path = os.path.join(project_dir, file_name)
-        for attempt in range(2):
+        fix_step = f"fix:{file_name}"
+        if checkpoint.reuse(fix_step, sources_hash()) and checkpoint.data(fix_step).get('status') == 'passed':
+            status_log.append(f"Tests passed for {file_name} (unchanged since last run).")
+            outcomes[test_file_name] = 'passed'
+        else:
+            pending.append(test_file_name)
+
+    budget = repair.RepairBudget()
+    try:
+        while pending:
+            check_cancelled()
             if progress_callback:
-                progress_callback(f"Testing {file_name} (attempt {attempt+1})...")
-            success, output = run_pytest_on_file(test_file_path, cwd=project_dir)
-            if success:
-                status_log.append(f"Tests passed for {file_name}!")
+                progress_callback(f"Testing {len(pending)} file(s)...")
+            records = run_tests(pending)
+            files = repair.project_files(project_dir)
+            for test_file_name in pending:
+                record = records[test_file_name]
+                file_name = source_for[test_file_name]
+                attempts[test_file_name].append(summarize(record))
+                if record['passed']:
+                    outcomes[test_file_name] = 'passed'
+                    status_log.append(f"Tests passed for {file_name}!")
+                    checkpoint.record(f"fix:{file_name}", sources_hash(), [file_name, test_file_name],
+                                      status='passed')
+                    continue
+                if record['status'] == 'timeout':
+                    status_log.append(f"Tests for {file_name} timed out after {record['duration']}s.")
+                outcomes[test_file_name] = repair.parse_failure(record, project_dir, file_name, files)
+            # Tests that were not re-run still fail the way they did, which
+            # tells the budget whether their signature's last fix helped
+            failures = [outcome for outcome in outcomes.values() if isinstance(outcome, repair.Failure)]
+            groups, given_up = budget.select(repair.group_failures(failures))
+            for group in given_up:
+                status_log.append(f"Giving up on {', '.join(group.test_files)}: {group.signature[:200]}")
+            if not groups:
                 break
-            else:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        file_code = f.read()
-                    with open(test_file_path, 'r', encoding='utf-8') as f:
-                        test_code = f.read()
-                except Exception as e:
-                    status_log.append(f"Could not read code or test for fixer: {e}")
-                    break
-                fixer_prompt = code_fixer_prompt_template.format(
-                    file_name=file_name,
-                    file_code=file_code,
-                    test_code=test_code,
-                    error_message=output
-                )
-                if progress_callback:
-                    progress_callback(f"Fixing {file_name}...")
-                fixed_code = invoke_persona(fixer_prompt)
-                # Clean code for any file type
-                fixed_code = clean_code(fixed_code, file_name)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(fixed_code)
-                status_log.append(f"{file_name} updated by Code Fixer.")
+            check_cancelled()
+            changed = set()
+            for wave in repair.disjoint_waves(groups):
+                with ThreadPoolExecutor(max_workers=min(TEST_WORKERS, len(wave))) as pool:
+                    for written in pool.map(fix_group, wave):
+                        changed.update(written)
+            if not changed:
+                status_log.append("The Code Fixer changed no files; stopping.")
+                break
+            impacted = import_graph.dependents(import_graph.build(project_dir, repair.project_files(project_dir)),
+                                               changed)
+            pending = [name for name in attempts if os.path.normpath(name) in impacted]
+            skipped = len(attempts) - len(pending)
+            if skipped:
+                status_log.append(f"Re-running {len(pending)} test file(s) affected by the fix; "
+                                  f"{skipped} import none of {', '.join(sorted(changed))}.")
+    finally:
+        test_worker.close()
+
+    test_results = []
+    for file_name, test_file_name in test_files:
+        result = {'file_name': file_name, 'test_file': test_file_name, 'attempts': attempts[test_file_name]}
+        outcome = outcomes.get(test_file_name)
+        if outcome == 'passed':
+            result['status'] = 'passed'
         else:
-            status_log.append(f"Could not fix {file_name} after 2 attempts.")
+            result['status'] = 'failed'
+            if outcome is not None:
+                result['signature'] = outcome.signature
+            status_log.append(f"Could not fix {file_name}.")
+        test_results.append(result)
 
     if progress_callback:
         progress_callback('Project generation complete!')
     status_log.append("Project generation complete!")
-    return {'status': 'success', 'log': status_log, 'project_dir': project_dir}
+    status_log.append("Estimated prompt tokens: {tokens} sent, {saved_tokens} saved by context compaction.".format(
+        **prompt_stats.as_dict()))
+    return {'status': 'success', 'log': status_log, 'project_dir': project_dir, 'test_results': test_results,
+            'prompt_tokens': prompt_stats.as_dict(), 'changes': changes}
 
-def clean_code(code, file_name):
-    """
-    Remove any non-code text after the last code block for any file type.
-    For .js, .ts, .java, .c, .cpp, .cs: after last '}'.
-    For .py, .sh, .rb, .go, .php, .html, .css, .json, .md, .txt: after last non-empty, non-comment line.
-    Otherwise, just return the code as is.
-    """
-    if not code:
-        return code
-    ext = file_name.split('.')[-1].lower()
-    if ext in ['js', 'ts', 'java', 'c', 'cpp', 'cs']:
-        last_brace = code.rfind('}')
-        if last_brace != -1:
-            return code[:last_brace+1]
-        return code
-    elif ext in ['py', 'sh', 'rb', 'go', 'php', 'html', 'css', 'json', 'md', 'txt']:
-        lines = code.splitlines()
-        last_code_idx = -1
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped and not stripped.startswith('#') and not stripped.startswith('"""') and not stripped.startswith("'''"):
-                last_code_idx = i
-        if last_code_idx != -1:
-            return '\n'.join(lines[:last_code_idx+1])
-        return code
-    else:
-        return code 
\ No newline at end of file
+def _log_changes(changes, status_log):
+    status_log.append("Changes since the last run: {} added, {} changed, {} removed, {} unchanged.".format(
+        len(changes['added']), len(changes['changed']), len(changes['removed']), len(changes['unchanged'])))
+    for file_name, reasons in changes['changed'].items():
+        status_log.append(f"{file_name} changed: {', '.join(reasons)}.")
+
+def _discard_task_outputs(checkpoint, file_name, status_log):
+    """Deletes the code and test generated for a streamed task that is not in the final task list."""
+    for relpath in (file_name, test_file_for(file_name)):
+        path = os.path.join(checkpoint.project_dir, relpath)
+        if os.path.exists(path):
+            os.remove(path)
+    for step in (f"code:{file_name}", f"test:{file_name}"):
+        checkpoint.forget(step)
+    status_log.append(f"Discarded {file_name}: it is not in the final task list.")
+
+def _remove_task_outputs(checkpoint, file_name, status_log):
+    """Deletes the code and test of a task that is no longer in the task list, unless they were edited since."""
+    fix_step = f"fix:{file_name}"
+    for step in (f"code:{file_name}", f"test:{file_name}"):
+        for relpath in checkpoint.outputs(step):
+            path = os.path.join(checkpoint.project_dir, relpath)
+            if not os.path.exists(path):
+                continue
+            # As generated, or as the Code Fixer last left it
+            if file_hash(path) not in (checkpoint.output_hash(step, relpath), checkpoint.output_hash(fix_step, relpath)):
+                status_log.append(f"Kept {relpath}: its task was removed, but the file was edited.")
+                continue
+            os.remove(path)
+            status_log.append(f"Removed {relpath}: its task is no longer in the task list.")
+    for step in (f"code:{file_name}", f"test:{file_name}", f"fix:{file_name}"):
+        checkpoint.forget(step)
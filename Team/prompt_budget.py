@@ -0,0 +1,157 @@
+import os
+import re
+import threading
+from llm_cache import estimate_tokens
+
+# Largest prompt (in estimated tokens) we are willing to send for one call
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '16000'))
+
+# Tokens of an error message's tail kept however far over budget the rest of the prompt is
+MIN_ERROR_TOKENS = 100
+
+# Design sections every file needs regardless of what it implements
+ALWAYS_KEEP = re.compile(r'technology|tech stack|stack|file structure|directory|overview', re.IGNORECASE)
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+_WORD_RE = re.compile(r'[a-z0-9_]+')
+_TRIMMED = '[... earlier output trimmed ...]\n'
+_COMMON_WORDS = frozenset('the and for with from that this will file code class module function should into'.split())
+
+
+def split_sections(markdown):
+    """Splits markdown into [(level, heading_line, body_lines)]; text before the first heading has level 0."""
+    sections = [(0, None, [])]
+    for line in markdown.splitlines():
+        match = _HEADING_RE.match(line.strip())
+        if match:
+            sections.append((len(match.group(1)), line, []))
+        else:
+            sections[-1][2].append(line)
+    return sections
+
+
+def _focus_terms(focus):
+    return {w for w in _WORD_RE.findall(focus.lower()) if len(w) > 2 and w not in _COMMON_WORDS}
+
+
+def relevant_sections(markdown, file_name, task_description='', fallback=True):
+    """
+    Returns only the parts of a markdown design document that matter for
+    file_name: sections that mention the file (or its module name), overlap
+    with the task description, or describe the stack and file layout. Falls
+    back to the whole document when it has no headings or nothing matches,
+    or returns '' in that case when fallback is False.
+    """
+    sections = split_sections(markdown)
+    if len(sections) <= 1:
+        return markdown if fallback else ''
+    stem = os.path.splitext(os.path.basename(file_name))[0].lower()
+    terms = _focus_terms(task_description)
+    keep = []
+    matched = False
+    for index, (level, heading, body) in enumerate(sections):
+        text = '\n'.join([heading or ''] + body).lower()
+        if file_name.lower() in text or (len(stem) > 2 and re.search(rf'\b{re.escape(stem)}\b', text)):
+            keep.append(index)
+            matched = True
+        elif heading and ALWAYS_KEEP.search(heading):
+            keep.append(index)
+        elif terms and len(terms & set(_WORD_RE.findall(text))) >= max(2, len(terms) // 3):
+            keep.append(index)
+            matched = True
+    if not matched:
+        return markdown if fallback else ''
+    # Emit kept sections in document order, with the headings of their parents for context
+    lines = []
+    emitted = set()
+    for index in keep:
+        level = sections[index][0]
+        parents = []
+        for j in range(index - 1, 0, -1):
+            if 0 < sections[j][0] < level:
+                parents.append(j)
+                level = sections[j][0]
+        for j in reversed(parents):
+            if j not in emitted:
+                lines.append(sections[j][1])
+                emitted.add(j)
+        _, heading, body = sections[index]
+        if heading:
+            lines.append(heading)
+        lines.extend(body)
+        emitted.add(index)
+    return '\n'.join(lines).strip()
+
+
+def _trim_tail(text, max_tokens):
+    """
+    Keeps the end of text (where tracebacks and summaries are) within
+    max_tokens, marker included, but never less than MIN_ERROR_TOKENS of it.
+    Text that trimming would not make shorter is returned as it is.
+    """
+    keep = max(MIN_ERROR_TOKENS * 4, max_tokens * 4 - len(_TRIMMED))
+    if len(text) <= keep + len(_TRIMMED):
+        return text
+    return _TRIMMED + text[-keep:]
+
+
+class PromptStats:
+    """Running totals of estimated prompt tokens for one pipeline run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tokens = 0
+        self.full_tokens = 0
+        self.over_budget = 0
+
+    def add(self, report):
+        with self._lock:
+            self.calls += 1
+            self.tokens += report['tokens']
+            self.full_tokens += report['full_tokens']
+            self.over_budget += int(report['over_budget'])
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'tokens': self.tokens,
+                'uncompacted_tokens': self.full_tokens,
+                'saved_tokens': self.full_tokens - self.tokens,
+                'over_budget_calls': self.over_budget,
+            }
+
+
+def fit_prompt(template, persona, focus_file='', focus_task='', budget=None, **fields):
+    """
+    Renders a prompt template, shrinking its context to fit the token budget.
+
+    The system design is always cut down to the sections relevant to
+    focus_file and its task description (focus_task). If the prompt is
+    still over budget the PRD gets the same treatment, and then any
+    error_message is trimmed to its tail. Returns
+    (prompt, report), where report holds the estimated token counts and an
+    over_budget flag so the caller can flag the call before sending it.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    full_tokens = estimate_tokens(template.format(**fields))
+    if focus_file and 'system_design' in fields:
+        fields['system_design'] = relevant_sections(fields['system_design'], focus_file, focus_task)
+    prompt = template.format(**fields)
+    if estimate_tokens(prompt) > budget and focus_file and 'prd_content' in fields:
+        fields['prd_content'] = relevant_sections(fields['prd_content'], focus_file, focus_task)
+        prompt = template.format(**fields)
+    overflow = estimate_tokens(prompt) - budget
+    if overflow > 0 and fields.get('error_message'):
+        fields['error_message'] = _trim_tail(fields['error_message'], estimate_tokens(fields['error_message']) - overflow)
+        prompt = template.format(**fields)
+    tokens = estimate_tokens(prompt)
+    report = {
+        'persona': persona,
+        'file_name': focus_file,
+        'tokens': tokens,
+        'full_tokens': full_tokens,
+        'budget': budget,
+        'over_budget': tokens > budget,
+    }
+    return prompt, report
@@ -0,0 +1,61 @@
+import os
+import time
+import threading
+
+PROMPTS_DIR = 'prompts'
+# Seconds between checks of a template file for edits
+RELOAD_INTERVAL = float(os.getenv('PROMPT_RELOAD_INTERVAL', '1'))
+
+
+class PromptTemplate:
+    def __init__(self, path, text, mtime_ns):
+        self.path = path
+        self.text = text
+        self.mtime_ns = mtime_ns
+
+
+class PromptRegistry:
+    """
+    Process-wide cache of prompt templates. A template is read from disk the
+    first time it is used and then re-read only when its mtime changes,
+    which is checked at most every RELOAD_INTERVAL seconds per file.
+    """
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._templates = {}   # path -> PromptTemplate
+        self._checked = {}     # path -> time.monotonic() of the last mtime check
+
+    def get(self, path):
+        now = time.monotonic()
+        with self._lock:
+            template = self._templates.get(path)
+            if template is not None and now - self._checked.get(path, 0) < self.reload_interval:
+                return template
+            self._checked[path] = now
+        mtime_ns = os.stat(path).st_mtime_ns
+        if template is not None and template.mtime_ns == mtime_ns:
+            return template
+        with open(path, 'r', encoding='utf-8') as f:
+            template = PromptTemplate(path, f.read(), mtime_ns)
+        with self._lock:
+            self._templates[path] = template
+        return template
+
+    def preload(self, directory=PROMPTS_DIR):
+        """Reads every .txt template in directory; returns how many were loaded."""
+        if not os.path.isdir(directory):
+            return 0
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+        for name in names:
+            self.get(os.path.join(directory, name))
+        return len(names)
+
+
+registry = PromptRegistry()
+
+
+def load(path):
+    """Text of the prompt template at path, from the registry."""
+    return registry.get(path).text
@@ -0,0 +1,410 @@
+import os
+import re
+import time
+import asyncio
+import threading
+
+# Seconds a model call may take in total before the next route is tried
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '180'))
+# Lower bound of the latency-derived first-token deadline
+LLM_MIN_TIMEOUT = float(os.getenv('LLM_MIN_TIMEOUT', '20'))
+# A route that has fallbacks left is abandoned once it is this many times slower than usual to respond
+LLM_SLOW_FACTOR = float(os.getenv('LLM_SLOW_FACTOR', '4'))
+# Seconds a target is moved to the back of every route after a timeout or rate limit
+LLM_COOLDOWN = float(os.getenv('LLM_COOLDOWN', '30'))
+# Latency samples needed before a target gets a latency-derived deadline
+MIN_LATENCY_SAMPLES = 3
+
+GEMINI_PRO = 'gemini:models/gemini-1.5-pro-latest'
+GEMINI_FLASH = 'gemini:models/gemini-1.5-flash-latest'
+
+# Ordered 'provider:model' targets per persona (prompt file stem). Override
+# one with LLM_ROUTE_<PERSONA>, e.g. LLM_ROUTE_CODE_FIXER=deepseek:deepseek-chat,gemini:models/gemini-1.5-flash-latest
+DEFAULT_ROUTES = {
+    'product_manager': [GEMINI_PRO, GEMINI_FLASH],
+    'architect': [GEMINI_PRO, GEMINI_FLASH],
+    'project_manager': [GEMINI_PRO, GEMINI_FLASH],
+    'engineer': [GEMINI_PRO, GEMINI_FLASH],
+    # High-volume personas whose prompts are narrow enough for the fast model
+    'qa_engineer': [GEMINI_FLASH, GEMINI_PRO],
+    'code_fixer': [GEMINI_FLASH, GEMINI_PRO],
+}
+# Route of any other persona; override with LLM_ROUTE_DEFAULT
+DEFAULT_ROUTE = [GEMINI_PRO, GEMINI_FLASH]
+# Appended to every route when the provider has credentials
+EXTRA_FALLBACKS = ['deepseek:deepseek-chat']
+
+
+class ProviderError(RuntimeError):
+    """Raised when every target of a route failed."""
+
+
+class Provider:
+    """
+    A model API. generate() returns the complete response text and, when
+    on_token is given, streams it chunk by chunk as it arrives.
+    """
+
+    name = None
+    key_env = None
+
+    def available(self):
+        return not self.key_env or bool(os.getenv(self.key_env))
+
+    def configure(self):
+        pass
+
+    async def generate(self, model, prompt, on_token=None, persona=None):
+        raise NotImplementedError
+
+
+class GeminiProvider(Provider):
+    name = 'gemini'
+    key_env = 'GOOGLE_API_KEY'
+
+    def __init__(self):
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def configure(self):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv(self.key_env))
+        self._genai = genai
+
+    def get_model(self, model_name):
+        """Returns the long-lived GenerativeModel for model_name so its connection is reused across calls."""
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    async def generate(self, model, prompt, on_token=None, persona=None):
+        gen_model = self.get_model(model)
+        if not on_token:
+            response = await gen_model.generate_content_async(prompt)
+            return response.text
+        chunks = []
+        response = await gen_model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = chunk.text
+            chunks.append(text)
+            on_token(text)
+        return ''.join(chunks)
+
+
+class OpenAICompatibleProvider(Provider):
+    """Chat-completions API (OpenAI, DeepSeek and compatible servers) through the openai package."""
+
+    def __init__(self, name, key_env, base_url=None):
+        self.name = name
+        self.key_env = key_env
+        self.base_url = base_url
+        self._client = None
+
+    def configure(self):
+        from openai import AsyncOpenAI
+        self._client = AsyncOpenAI(api_key=os.getenv(self.key_env), base_url=self.base_url)
+
+    async def generate(self, model, prompt, on_token=None, persona=None):
+        messages = [{'role': 'user', 'content': prompt}]
+        if not on_token:
+            response = await self._client.chat.completions.create(model=model, messages=messages)
+            return response.choices[0].message.content or ''
+        chunks = []
+        stream = await self._client.chat.completions.create(model=model, messages=messages, stream=True)
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                chunks.append(text)
+                on_token(text)
+        return ''.join(chunks)
+
+
+class StubProvider(Provider):
+    """
+    Offline provider returning small, deterministic answers that take the
+    pipeline from PRD to passing tests. STUB_LATENCY adds seconds per call.
+    """
+
+    name = 'stub'
+    CHUNK_CHARS = 64
+
+    def respond(self, persona, prompt):
+        return stub_response(persona, prompt)
+
+    async def generate(self, model, prompt, on_token=None, persona=None):
+        text = self.respond(persona, prompt)
+        latency = float(os.getenv('STUB_LATENCY', '0'))
+        if latency:
+            await asyncio.sleep(latency)
+        if on_token:
+            for i in range(0, len(text), self.CHUNK_CHARS):
+                on_token(text[i:i + self.CHUNK_CHARS])
+                await asyncio.sleep(0)
+        return text
+
+
+_STUB_PRD = """# Product Requirement Document
+
+## 1. Objective
+Build a small Python application that implements the requested idea.
+
+## 2. User Stories
+- As a user, I can run the application so that I get its result.
+
+## 3. Core Features
+- A `run()` function in every module that returns the module's name.
+
+## 4. Technical Requirements
+- Python 3 standard library only; pytest for tests.
+
+## 5. Out of Scope
+- Persistence, networking and graphical user interfaces.
+"""
+
+_STUB_DESIGN = """# System Design
+
+## 1. Technology Stack
+Python 3, pytest.
+
+## 2. System Architecture
+A core module with the application logic and a command-line entry point.
+
+## 3. Class and Module Design
+- `core.py`: `run()` returns the result.
+- `main.py`: `run()` entry point.
+
+## 4. File Structure
+- core.py
+- main.py
+"""
+
+_STUB_TASKS = """```json
+[
+  {"file_name": "core.py", "task_description": "Implement run() returning the module name."},
+  {"file_name": "main.py", "task_description": "Implement the run() entry point.", "depends_on": ["core.py"]}
+]
+```"""
+
+
+def _stub_module(prompt, pattern):
+    match = re.search(pattern, prompt)
+    file_name = match.group(1) if match else 'main.py'
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def stub_fix_targets(prompt):
+    """Source files listed in a batched Code Fixer prompt (prompts/code_fixer_batch.txt), test files excluded."""
+    names = re.findall(r'^### (\S+\.py)$', prompt, re.MULTILINE)
+    return [name for name in names if not os.path.basename(name).startswith('test_')]
+
+
+def _stub_code(module):
+    return f'```python\ndef run():\n    """Returns the name of this module."""\n    return "{module}"\n```'
+
+
+def stub_response(persona, prompt):
+    """The StubProvider's answer for persona, derived only from the prompt."""
+    if persona == 'product_manager':
+        return _STUB_PRD
+    if persona == 'architect':
+        return _STUB_DESIGN
+    if persona == 'project_manager':
+        return _STUB_TASKS
+    if persona == 'engineer':
+        return _stub_code(_stub_module(prompt, r"code for '([^']+)'"))
+    if persona == 'code_fixer':
+        targets = stub_fix_targets(prompt)
+        if targets:
+            return '\n\n'.join(f"### {name}\n{_stub_code(os.path.splitext(os.path.basename(name))[0])}"
+                               for name in targets)
+        return _stub_code(_stub_module(prompt, r"Original code for (\S+?):"))
+    if persona == 'qa_engineer':
+        module = _stub_module(prompt, r"source code for '([^']+)'")
+        return f'```python\nfrom {module} import run\n\n\ndef test_run():\n    assert run() == "{module}"\n```'
+    return 'OK'
+
+
+PROVIDERS = {
+    provider.name: provider for provider in (
+        GeminiProvider(),
+        OpenAICompatibleProvider('openai', 'OPENAI_API_KEY'),
+        OpenAICompatibleProvider('deepseek', 'DEEPSEEK_API_KEY', 'https://api.deepseek.com'),
+        StubProvider(),
+    )
+}
+
+
+def _split(target):
+    provider, _, model = target.partition(':')
+    return provider, model
+
+
+def route_for(persona):
+    """Configured 'provider:model' targets for persona, in order of preference."""
+    # LLM_PROVIDER sends every persona to one target, e.g. LLM_PROVIDER=stub for offline runs
+    forced = os.getenv('LLM_PROVIDER')
+    if forced:
+        return [forced if ':' in forced else f"{forced}:default"]
+    override = os.getenv(f"LLM_ROUTE_{(persona or 'default').upper()}")
+    if override:
+        return [target.strip() for target in override.split(',') if target.strip()]
+    route = list(DEFAULT_ROUTES.get(persona, DEFAULT_ROUTE))
+    for target in EXTRA_FALLBACKS:
+        provider = PROVIDERS.get(_split(target)[0])
+        if target not in route and provider and provider.available():
+            route.append(target)
+    return route
+
+
+def cache_namespace(persona):
+    """Model name used in response cache keys: the persona's preferred target, whichever one answered."""
+    return route_for(persona)[0]
+
+
+class Router:
+    """
+    Sends each request down its persona's route. A target that times out,
+    is rate limited or errors hands the request to the next one; targets
+    that timed out or were rate limited go to the back of every route for
+    LLM_COOLDOWN seconds. Each target's usual time to first output is
+    tracked, and while fallbacks remain a target gets LLM_SLOW_FACTOR times
+    that long to start answering. Streamed calls (first token) and whole
+    responses are timed separately, as they differ by the length of the
+    answer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured = set()
+        self._latency = {}         # (target, streamed) -> (ewma seconds to first output, samples)
+        self._cooldown_until = {}  # target -> time.time() after which it is preferred again
+
+    def configure(self):
+        """Configures every provider a persona routes to; raises ValueError if a persona has no usable target."""
+        for persona in DEFAULT_ROUTES:
+            usable = []
+            for target in route_for(persona):
+                provider = PROVIDERS.get(_split(target)[0])
+                if provider is None:
+                    raise ValueError(f"Unknown model provider in route: {target}")
+                if not provider.available():
+                    continue
+                if provider.name not in self._configured:
+                    provider.configure()
+                    self._configured.add(provider.name)
+                usable.append(target)
+            if not usable:
+                first = PROVIDERS[_split(route_for(persona)[0])[0]]
+                raise ValueError(f"{first.key_env} not found in .env file.")
+
+    def targets(self, persona):
+        now = time.time()
+        with self._lock:
+            usable = [target for target in route_for(persona) if _split(target)[0] in self._configured]
+            cooling = [target for target in usable if self._cooldown_until.get(target, 0) > now]
+        return [target for target in usable if target not in cooling] + cooling
+
+    def _deadline(self, target, streamed, last):
+        if last:
+            return LLM_TIMEOUT
+        with self._lock:
+            ewma, samples = self._latency.get((target, streamed), (0.0, 0))
+        if samples < MIN_LATENCY_SAMPLES:
+            return LLM_TIMEOUT
+        return min(LLM_TIMEOUT, max(LLM_MIN_TIMEOUT, LLM_SLOW_FACTOR * ewma))
+
+    def _succeeded(self, target, streamed, first_output_seconds):
+        with self._lock:
+            ewma, samples = self._latency.get((target, streamed), (first_output_seconds, 0))
+            self._latency[(target, streamed)] = (0.8 * ewma + 0.2 * first_output_seconds, samples + 1)
+            self._cooldown_until.pop(target, None)
+
+    def _failed(self, target, error):
+        if _is_throttled(error):
+            with self._lock:
+                self._cooldown_until[target] = time.time() + LLM_COOLDOWN
+
+    async def generate(self, prompt, persona=None, on_token=None, info=None):
+        """Returns the first successful response along persona's route; raises ProviderError if all fail."""
+        info = info if info is not None else {}
+        targets = self.targets(persona)
+        if not targets:
+            raise ProviderError(f"No configured model provider for persona {persona!r}")
+        errors = []
+        streamed = on_token is not None
+        for i, target in enumerate(targets):
+            provider_name, model = _split(target)
+            deadline = self._deadline(target, streamed, last=i == len(targets) - 1)
+            try:
+                text, first_output = await _attempt(PROVIDERS[provider_name], model, prompt, on_token, persona, deadline)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed(target, e)
+                errors.append(f"{target}: {type(e).__name__}: {e}")
+                info['retries'] = len(errors)
+                info['fallback_errors'] = errors
+                continue
+            self._succeeded(target, streamed, first_output)
+            info['model'] = target
+            return text
+        raise ProviderError('; '.join(errors))
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                'cooling_down': sum(1 for until in self._cooldown_until.values() if until > now),
+                'tracked_targets': len({target for target, _ in self._latency}),
+            }
+
+
+async def _attempt(provider, model, prompt, on_token, persona, first_output_timeout):
+    """One call to provider; fails if no output has arrived within first_output_timeout seconds."""
+    loop = asyncio.get_running_loop()
+    start = time.time()
+    first_output = loop.create_future()
+
+    def mark_output(*_):
+        if not first_output.done():
+            first_output.set_result(time.time() - start)
+
+    def forward(text):
+        mark_output()
+        on_token(text)
+
+    task = asyncio.ensure_future(provider.generate(model, prompt, forward if on_token else None, persona))
+    task.add_done_callback(mark_output)
+    try:
+        try:
+            await asyncio.wait_for(asyncio.shield(first_output), first_output_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no output after {first_output_timeout:.1f}s")
+        remaining = max(1.0, LLM_TIMEOUT - (time.time() - start))
+        text = await asyncio.wait_for(asyncio.shield(task), remaining)
+        return text, first_output.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def _is_throttled(error):
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ('429', 'rate limit', 'ratelimit', 'resourceexhausted', 'quota'))
+
+
+router = Router()
+
+
+def configure():
+    router.configure()
+
+
+async def generate(prompt, persona=None, on_token=None, info=None):
+    return await router.generate(prompt, persona, on_token, info)
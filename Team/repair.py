@@ -0,0 +1,287 @@
+import os
+import re
+from collections import OrderedDict
+
+# Test/fix rounds per pipeline run; every round re-runs the tests still failing
+REPAIR_MAX_ROUNDS = int(os.getenv('REPAIR_MAX_ROUNDS', '3'))
+# Fixer calls for one failure signature, as long as each call leaves fewer tests failing with it
+REPAIR_SIGNATURE_ATTEMPTS = int(os.getenv('REPAIR_SIGNATURE_ATTEMPTS', '2'))
+# Characters of trimmed pytest output quoted per failing test file
+REPAIR_OUTPUT_CHARS = int(os.getenv('REPAIR_OUTPUT_CHARS', '3000'))
+# Failing test files quoted in one fixer prompt; the rest of a group is only listed
+MAX_QUOTED_FAILURES = 3
+
+_SECTION_RE = re.compile(r'^=+ (FAILURES|ERRORS) =+$')
+_SECTION_END_RE = re.compile(r'^(=+ .* =+|!+ .* !+)$')
+_HEADER_RE = re.compile(r'^_+ (.+?) _+$')
+# "path.py:12: in func" (--tb=short) or "path.py:12: KeyError" (--tb=long)
+_FRAME_RE = re.compile(r'^(\S[^:]*?\.py):(\d+):(?: in (.+)| (\w+))?\s*$')
+_ERROR_LINE_RE = re.compile(r'^E(?: {1,}(.*))?$')
+_EXCEPTION_RE = re.compile(r'^((?:\w+\.)*\w+(?:Error|Exception|Exit|Failed|Interrupt|Timeout)):?\s*(.*)$')
+_SUMMARY_RE = re.compile(r'^(?:FAILED|ERROR) (\S+)(?: - (.*))?$')
+_MODULE_RE = re.compile(r"(?:No module named|cannot import name \S+ from) '([\w.]+)'")
+_FILE_REF_RE = re.compile(r'File "([^"]+\.py)"')
+_ADDRESS_RE = re.compile(r'0x[0-9a-fA-F]+')
+_IMPORT_ERRORS = ('ImportError', 'ModuleNotFoundError')
+
+
+class Failure:
+    """
+    How one test file failed: a signature identifying the underlying error,
+    the project files implicated in it (sources first, then tests), the
+    failing test ids and a trimmed excerpt of the pytest output.
+    """
+
+    def __init__(self, test_file, signature, files, excerpt, tests=()):
+        self.test_file = test_file
+        self.signature = signature
+        self.files = files
+        self.excerpt = excerpt
+        self.tests = list(tests)
+
+
+class FailureGroup:
+    """Failures sharing a signature, repaired together by one fixer call."""
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.failures = []
+        self.files = []
+
+    def add(self, failure):
+        self.failures.append(failure)
+        for name in failure.files:
+            if name not in self.files:
+                self.files.append(name)
+        self.files.sort(key=is_test_file)
+
+    @property
+    def test_files(self):
+        return [failure.test_file for failure in self.failures]
+
+
+def is_test_file(path):
+    name = os.path.basename(path)
+    return name.startswith('test_') or name.endswith('_test.py') or name == 'conftest.py'
+
+
+def project_files(project_dir):
+    """Relative paths of the Python files in a project."""
+    found = set()
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__pycache__']
+        for name in files:
+            if name.endswith('.py'):
+                found.add(os.path.normpath(os.path.relpath(os.path.join(root, name), project_dir)))
+    return found
+
+
+def failure_lines(output):
+    """Lines of pytest output inside its FAILURES and ERRORS sections."""
+    lines = []
+    inside = False
+    for line in output.splitlines():
+        if _SECTION_RE.match(line):
+            inside = True
+        elif _SECTION_END_RE.match(line):
+            inside = False
+        elif inside:
+            lines.append(line)
+    return lines
+
+
+def trim_output(output, files, max_chars=REPAIR_OUTPUT_CHARS):
+    """
+    The parts of a pytest report a fixer needs: failure headers, traceback
+    frames in the project's own files with their source lines, and the
+    error lines. Frames in the standard library and site-packages are
+    dropped. Falls back to the tail of the output when it has no failure
+    section (a crash or a timeout).
+    """
+    kept = []
+    in_project_frame = False
+    for line in failure_lines(output):
+        frame = _FRAME_RE.match(line)
+        if frame:
+            in_project_frame = os.path.normpath(frame.group(1)) in files
+            if in_project_frame:
+                kept.append(line)
+        elif _HEADER_RE.match(line) or _ERROR_LINE_RE.match(line):
+            kept.append(line.rstrip())
+            in_project_frame = False
+        elif in_project_frame and line[:1].isspace() and line.strip(' \t^~'):
+            kept.append(line.rstrip())
+    text = '\n'.join(kept) if kept else output.strip()
+    if len(text) > max_chars:
+        text = '[... earlier output trimmed ...]\n' + text[-max_chars:]
+    return text
+
+
+def _normalize(message, project_dir):
+    message = message.replace(os.path.abspath(project_dir) + os.sep, '')
+    message = _ADDRESS_RE.sub('0x?', message)
+    return ' '.join(message.split())[:300]
+
+
+def _exception(error_lines, summary_messages, output):
+    """(exception type, message) of the first error in a report."""
+    for line in error_lines:
+        match = _EXCEPTION_RE.match(line)
+        if match:
+            return match.group(1), match.group(2)
+    for line in error_lines:
+        if line.startswith('assert '):
+            return 'AssertionError', line
+    for message in summary_messages:
+        match = _EXCEPTION_RE.match(message)
+        if match:
+            return match.group(1), match.group(2)
+    lines = [line for line in error_lines + output.strip().splitlines()[-1:] if line.strip()]
+    return 'Error', lines[0] if lines else 'no output'
+
+
+def parse_failure(record, project_dir, source_file, files):
+    """
+    Reads a failed test record (see test_runner.run_test_file) into a
+    Failure. files is the set of the project's Python files; source_file
+    is the file the test file was written for.
+
+    The signature is the exception type and message, located at the
+    innermost frame outside the test files. Import errors are not located,
+    since their message already names the broken module, so every test
+    file broken by the same bad import shares one signature.
+    """
+    test_file = os.path.normpath(record['test_file'])
+    output = record.get('output') or ''
+    implicated = [name for name in (source_file, test_file) if name in files]
+    if record['status'] == 'timeout':
+        return Failure(test_file, f"Timeout: {test_file} did not finish", implicated,
+                       trim_output(output, files))
+    lines = failure_lines(output)
+    frames = []
+    error_lines = []
+    for line in lines:
+        frame = _FRAME_RE.match(line)
+        if frame:
+            path = os.path.normpath(frame.group(1))
+            if path in files:
+                frames.append((path, frame.group(3) or ''))
+            continue
+        error = _ERROR_LINE_RE.match(line)
+        if error and error.group(1):
+            error_lines.append(error.group(1).strip())
+    summaries = [match for match in map(_SUMMARY_RE.match, output.splitlines()) if match]
+    exc_type, message = _exception(error_lines, [m.group(2) or '' for m in summaries], output)
+    message = _normalize(message, project_dir)
+
+    # Files named by the error itself, e.g. the module a SyntaxError is in
+    error_files = [os.path.normpath(os.path.relpath(path, project_dir) if os.path.isabs(path) else path)
+                   for path in _FILE_REF_RE.findall('\n'.join(error_lines))]
+    error_files = [path for path in error_files if path in files]
+    source_frames = [frame for frame in frames if not is_test_file(frame[0])]
+    if exc_type.rsplit('.', 1)[-1] in _IMPORT_ERRORS:
+        location = ''
+    elif error_files:
+        location = error_files[-1]
+    elif source_frames:
+        location = ':'.join(filter(None, source_frames[-1]))
+    else:
+        location = '::'.join(filter(None, (test_file, frames[-1][1] if frames else '')))
+    signature = f"{exc_type}: {message}" + (f" ({location})" if location else '')
+
+    referenced = [path for path, _ in frames] + error_files
+    for module in _MODULE_RE.findall(message):
+        base = module.replace('.', '/')
+        referenced += [base + '.py', base + '/__init__.py']
+    for path in map(os.path.normpath, referenced):
+        if path in files and path not in implicated:
+            implicated.append(path)
+    implicated.sort(key=is_test_file)
+    tests = [m.group(1) for m in summaries if os.path.normpath(m.group(1)) != test_file]
+    return Failure(test_file, signature, implicated, trim_output(output, files), tests)
+
+
+def group_failures(failures):
+    """FailureGroups of failures with the same signature, in order of first appearance."""
+    groups = OrderedDict()
+    for failure in failures:
+        if failure.signature not in groups:
+            groups[failure.signature] = FailureGroup(failure.signature)
+        groups[failure.signature].add(failure)
+    return list(groups.values())
+
+
+def disjoint_waves(groups):
+    """
+    Splits groups into waves in which no two groups share a file. Groups in
+    one wave can be fixed concurrently; waves run one after another so a
+    fix always starts from the current contents of its files.
+    """
+    waves = []
+    for group in groups:
+        for wave in waves:
+            if not any(set(group.files) & set(other.files) for other in wave):
+                wave.append(group)
+                break
+        else:
+            waves.append([group])
+    return waves
+
+
+class RepairBudget:
+    """
+    Decides which failure groups get a fixer call in each round. A new
+    signature always gets one. It gets another (up to signature_attempts)
+    only if the previous call left fewer test files failing with it, and is
+    given up as soon as a call made no progress. At most max_rounds rounds
+    of fixes are made.
+    """
+
+    def __init__(self, max_rounds=REPAIR_MAX_ROUNDS, signature_attempts=REPAIR_SIGNATURE_ATTEMPTS):
+        self.max_rounds = max_rounds
+        self.signature_attempts = signature_attempts
+        self.rounds = 0
+        self._tried = {}  # signature -> (fixer calls, test files failing at the last call)
+
+    def select(self, groups):
+        """Returns (groups to fix this round, groups given up)."""
+        if self.rounds >= self.max_rounds:
+            return [], list(groups)
+        fix = []
+        give_up = []
+        for group in groups:
+            calls, failing = self._tried.get(group.signature, (0, None))
+            current = set(group.test_files)
+            if calls == 0 or (calls < self.signature_attempts and current < failing):
+                self._tried[group.signature] = (calls + 1, current)
+                fix.append(group)
+            else:
+                give_up.append(group)
+        if fix:
+            self.rounds += 1
+        return fix, give_up
+
+
+def fixer_fields(group, project_dir):
+    """Template fields of prompts/code_fixer_batch.txt for one failure group."""
+    failing = []
+    for failure in group.failures:
+        tests = f" ({', '.join(failure.tests)})" if failure.tests else ''
+        failing.append(f"- {failure.test_file}{tests}")
+    quoted = [f"{failure.test_file}:\n{failure.excerpt}" for failure in group.failures[:MAX_QUOTED_FAILURES]]
+    if len(group.failures) > MAX_QUOTED_FAILURES:
+        quoted.append(f"({len(group.failures) - MAX_QUOTED_FAILURES} more test files fail with the same error.)")
+    blocks = []
+    for name in group.files:
+        try:
+            with open(os.path.join(project_dir, name), 'r', encoding='utf-8') as f:
+                code = f.read()
+        except OSError as e:
+            code = f"# Could not read {name}: {e}"
+        blocks.append(f"### {name}\n```python\n{code.rstrip()}\n```")
+    return {
+        'signature': group.signature,
+        'failing_tests': '\n'.join(failing),
+        'error_message': '\n\n'.join(quoted),
+        'files': '\n\n'.join(blocks),
+    }
@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+# Target chunk size in characters; documents are split on blank lines
+CHUNK_SIZE = 1500
+# Minimum seconds between re-scans of the knowledge base for changed files
+REFRESH_INTERVAL = 2.0
+INDEX_FILE_NAME = '.index.json'
+INDEX_VERSION = 1
+DOCUMENT_EXTENSIONS = ('.txt', '.md')
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have i in is it its of on or that the this to was were will with'
+    ' you your we our can should would into about'.split()
+)
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _stem(token):
+    # Light suffix stripping so "tests"/"testing"/"tested" share a term
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE):
+    """Splits text into chunks of roughly chunk_size characters on paragraph boundaries."""
+    chunks = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            current = ''
+        # A single oversized paragraph is hard-split
+        while len(paragraph) > chunk_size:
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class KnowledgeIndex:
+    """
+    BM25 index over chunked knowledge-base documents. The chunk table is
+    persisted next to the documents and only files whose mtime or size
+    changed are re-read on refresh; postings are rebuilt in memory on load.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._docs = {}       # relpath -> {'mtime': int, 'size': int, 'chunks': [chunk_id]}
+        self._chunks = {}     # chunk_id -> {'doc': relpath, 'text': str, 'length': int, 'tf': {term: count}}
+        self._postings = defaultdict(dict)  # term -> {chunk_id: tf}
+        self._total_length = 0
+        self._next_id = 0
+
+    def search(self, query, top_k=2):
+        """Returns up to top_k (score, source, text) tuples for query, best first."""
+        terms = tokenize(query)
+        with self._lock:
+            self._refresh()
+            n = len(self._chunks)
+            if not terms or not n:
+                return []
+            avg_length = self._total_length / n
+            scores = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    length = self._chunks[chunk_id]['length']
+                    scores[chunk_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [(score, self._chunks[cid]['doc'], self._chunks[cid]['text']) for cid, score in best]
+
+    def refresh(self, force=False):
+        with self._lock:
+            self._refresh(force)
+
+    def _refresh(self, force=False):
+        # Caller must hold self._lock
+        if not self._loaded:
+            self._load()
+        now = time.monotonic()
+        if not force and now - self._last_refresh < REFRESH_INTERVAL:
+            return
+        self._last_refresh = now
+        seen = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, files in os.walk(self.root):
+                for name in files:
+                    if not name.endswith(DOCUMENT_EXTENSIONS):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    seen[os.path.relpath(path, self.root)] = (st.st_mtime_ns, st.st_size)
+        changed = False
+        for relpath in list(self._docs):
+            if relpath not in seen:
+                self._remove_doc(relpath)
+                changed = True
+        for relpath, (mtime, size) in seen.items():
+            doc = self._docs.get(relpath)
+            if doc and doc['mtime'] == mtime and doc['size'] == size:
+                continue
+            if doc:
+                self._remove_doc(relpath)
+            self._add_doc(relpath, mtime, size)
+            changed = True
+        if changed:
+            self._save()
+
+    def _add_doc(self, relpath, mtime, size):
+        try:
+            with open(os.path.join(self.root, relpath), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return
+        chunk_ids = []
+        for text in chunk_text(content):
+            tokens = tokenize(text)
+            chunk = {'doc': relpath, 'text': text, 'length': len(tokens), 'tf': dict(Counter(tokens))}
+            chunk_id = self._next_id
+            self._next_id += 1
+            self._add_chunk(chunk_id, chunk)
+            chunk_ids.append(chunk_id)
+        self._docs[relpath] = {'mtime': mtime, 'size': size, 'chunks': chunk_ids}
+
+    def _add_chunk(self, chunk_id, chunk):
+        self._chunks[chunk_id] = chunk
+        self._total_length += chunk['length']
+        for term, tf in chunk['tf'].items():
+            self._postings[term][chunk_id] = tf
+
+    def _remove_doc(self, relpath):
+        for chunk_id in self._docs.pop(relpath)['chunks']:
+            chunk = self._chunks.pop(chunk_id)
+            self._total_length -= chunk['length']
+            for term in chunk['tf']:
+                postings = self._postings[term]
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        self._docs = data['docs']
+        for chunk_id, chunk in data['chunks'].items():
+            self._add_chunk(int(chunk_id), chunk)
+        self._next_id = max(self._chunks, default=-1) + 1
+
+    def _save(self):
+        if not os.path.isdir(self.root):
+            return
+        data = {'version': INDEX_VERSION, 'docs': self._docs, 'chunks': self._chunks}
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Could not save knowledge base index: {e}")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root):
+    """Returns the shared KnowledgeIndex for a knowledge base directory."""
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = KnowledgeIndex(root)
+        return index
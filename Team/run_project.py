@@ -1,27 +1,34 @@
 import os
+import sys
 import json
-import subprocess
-from deepseek_client import configure_api, invoke_persona
-from flask import Flask, render_template, request, jsonify
-import threading
+from deepseek_client import configure_api, invoke_persona, forget_response
+from concurrent.futures import ThreadPoolExecutor
+from test_runner import run_test_file, TEST_WORKERS
+from checkpoint import Checkpoint, content_hash
+from extractor import request_code, request_tasks, ExtractionError
+import prompt_templates
 
 def read_prompt_template(file_path: str) -> str:
-    """Reads a prompt template from the given file path."""
-    with open(file_path, 'r') as f:
+    """Reads a prompt template from the given file path (cached until the file changes)."""
+    return prompt_templates.load(file_path)
+
+def read_text(file_path: str) -> str:
+    with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def run_pytest_on_file(test_file_path, cwd):
-    """Runs pytest on a specific test file and returns (success, output)."""
-    try:
-        result = subprocess.run([
-            'pytest', test_file_path, '--maxfail=1', '--disable-warnings', '-q'
-        ], cwd=cwd, capture_output=True, text=True)
-        return (result.returncode == 0, result.stdout + result.stderr)
-    except Exception as e:
-        return (False, str(e))
-
-def main():
-    """Main function to run the Gemini-Team workflow."""
+def reject_output(persona, target):
+    """on_invalid callback for the extractor: reports the answer and drops it from the response cache."""
+    def on_invalid(prompt, error):
+        forget_response(prompt, persona)
+        print(f"    ⚠️ Rejected {persona} output for {target}: {error}")
+    return on_invalid
+
+def main(resume=False):
+    """
+    Main function to run the Gemini-Team workflow. With resume=True, steps
+    recorded in the project's checkpoint manifest whose inputs are unchanged
+    are skipped.
+    """
     # 1. Configure the API
     try:
         configure_api()
@@ -39,6 +46,9 @@ def main():
     project_dir = os.path.join('.', project_name)
     os.makedirs(project_dir, exist_ok=True)
     print(f"Project directory '{project_dir}' created.")
+    checkpoint = Checkpoint(project_dir)
+    if not resume:
+        checkpoint.reset()
 
     # --- PHASE 1: PLANNING & DESIGN ---
 
@@ -46,33 +56,56 @@ def main():
     print("\n[Phase 1.1] 🧑‍💼 Calling Product Manager...")
     pm_prompt_template = read_prompt_template('prompts/product_manager.txt')
     pm_prompt = pm_prompt_template.format(user_idea=user_idea)
-    prd_text = invoke_persona(pm_prompt)
-    
     prd_file_path = os.path.join(project_dir, 'prd.md')
-    with open(prd_file_path, 'w') as f:
-        f.write(prd_text)
-    print(f"✅ PRD saved to '{prd_file_path}'")
+    if checkpoint.reuse('prd', content_hash(pm_prompt)):
+        prd_text = read_text(prd_file_path)
+        print(f"♻️ PRD reused from '{prd_file_path}'")
+    else:
+        prd_text = invoke_persona(pm_prompt, persona='product_manager')
+        if not prd_text.strip():
+            print("❌ The Product Manager returned no PRD.")
+            return
+        with open(prd_file_path, 'w') as f:
+            f.write(prd_text)
+        checkpoint.record('prd', content_hash(pm_prompt), ['prd.md'])
+        print(f"✅ PRD saved to '{prd_file_path}'")
 
     # 4. Run Architect Persona
     print("[Phase 1.2] 🏗️ Calling Architect...")
     architect_prompt_template = read_prompt_template('prompts/architect.txt')
     architect_prompt = architect_prompt_template.format(prd_content=prd_text)
-    system_design = invoke_persona(architect_prompt)
     system_design_path = os.path.join(project_dir, 'system_design.md')
-    with open(system_design_path, 'w') as f:
-        f.write(system_design)
-    print(f"✅ System Design saved to '{system_design_path}'")
+    if checkpoint.reuse('system_design', content_hash(architect_prompt)):
+        system_design = read_text(system_design_path)
+        print(f"♻️ System Design reused from '{system_design_path}'")
+    else:
+        system_design = invoke_persona(architect_prompt, persona='architect')
+        if not system_design.strip():
+            print("❌ The Architect returned no System Design.")
+            return
+        with open(system_design_path, 'w') as f:
+            f.write(system_design)
+        checkpoint.record('system_design', content_hash(architect_prompt), ['system_design.md'])
+        print(f"✅ System Design saved to '{system_design_path}'")
 
     # --- PHASE 2: TASK BREAKDOWN ---
     print("[Phase 2] 📋 Calling Project Manager for task breakdown...")
     pm_task_prompt_template = read_prompt_template('prompts/project_manager.txt')
     pm_task_prompt = pm_task_prompt_template.format(prd_content=prd_text, system_design=system_design)
-    task_json = invoke_persona(pm_task_prompt)
-    try:
-        tasks = json.loads(task_json)
-    except Exception as e:
-        print("❌ Failed to parse task JSON. Output was:\n", task_json)
-        return
+    tasks_path = os.path.join(project_dir, 'tasks.json')
+    if checkpoint.reuse('tasks', content_hash(pm_task_prompt)):
+        tasks = json.loads(read_text(tasks_path))
+        print(f"♻️ Task list reused from '{tasks_path}'")
+    else:
+        try:
+            tasks = request_tasks(lambda prompt: invoke_persona(prompt, persona='project_manager'), pm_task_prompt,
+                                  on_invalid=reject_output('project_manager', 'the task list'))
+        except ExtractionError as e:
+            print("❌ Failed to parse task JSON. Output was:\n", e.response)
+            return
+        with open(tasks_path, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f, indent=2)
+        checkpoint.record('tasks', content_hash(pm_task_prompt), ['tasks.json'])
     print(f"✅ Parsed {len(tasks)} tasks.")
 
     # --- PHASE 3: CODE GENERATION ---
@@ -82,19 +115,28 @@ def main():
     for i, task in enumerate(tasks):
         file_name = task['file_name']
         task_description = task['task_description']
-        print(f"  [Task {i+1}/{len(tasks)}] Generating {file_name}...")
         engineer_prompt = engineer_prompt_template.format(
             file_name=file_name,
             task_description=task_description,
             prd_content=prd_text,
             system_design=system_design
         )
-        code = invoke_persona(engineer_prompt)
+        if checkpoint.reuse(f"code:{file_name}", content_hash(engineer_prompt)):
+            print(f"  [Task {i+1}/{len(tasks)}] ♻️ {file_name} reused from checkpoint.")
+            generated_files.append(file_name)
+            continue
+        print(f"  [Task {i+1}/{len(tasks)}] Generating {file_name}...")
+        code, error = request_code(lambda prompt: invoke_persona(prompt, persona='engineer'), engineer_prompt,
+                                   file_name, on_invalid=reject_output('engineer', file_name))
         file_path = os.path.join(project_dir, file_name)
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(code)
-        print(f"    ✅ {file_name} generated.")
+        if error is None:
+            checkpoint.record(f"code:{file_name}", content_hash(engineer_prompt), [file_name])
+            print(f"    ✅ {file_name} generated.")
+        else:
+            print(f"    ⚠️ {file_name} written as returned, to be generated again next run: {error}")
         generated_files.append(file_name)
 
     # --- PHASE 4: QUALITY ASSURANCE ---
@@ -103,6 +145,13 @@ def main():
     test_files = []
     for file_name in generated_files:
         file_path = os.path.join(project_dir, file_name)
+        test_file_name = f"test_{file_name.replace('.py', '')}.py"
+        qa_inputs = content_hash(qa_prompt_template, prd_text, system_design, file_name,
+                                 checkpoint.output_hash(f"code:{file_name}", file_name))
+        if checkpoint.reuse(f"test:{file_name}", qa_inputs):
+            print(f"    ♻️ {test_file_name} reused from checkpoint.")
+            test_files.append((file_name, test_file_name))
+            continue
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 file_code = f.read()
@@ -115,28 +164,35 @@ def main():
             system_design=system_design,
             file_code=file_code
         )
-        test_code = invoke_persona(qa_prompt)
-        test_file_name = f"test_{file_name.replace('.py', '')}.py"
+        test_code, error = request_code(lambda prompt: invoke_persona(prompt, persona='qa_engineer'), qa_prompt,
+                                        test_file_name, on_invalid=reject_output('qa_engineer', test_file_name))
         test_file_path = os.path.join(project_dir, test_file_name)
         with open(test_file_path, 'w', encoding='utf-8') as f:
             f.write(test_code)
-        print(f"    ✅ {test_file_name} generated.")
+        if error is None:
+            checkpoint.record(f"test:{file_name}", qa_inputs, [test_file_name])
+            print(f"    ✅ {test_file_name} generated.")
+        else:
+            print(f"    ⚠️ {test_file_name} written as returned, to be generated again next run: {error}")
         test_files.append((file_name, test_file_name))
 
     # --- PHASE 5: CODE FIXER / DEBUGGER LOOP ---
     print("[Phase 5] 🐞 Running tests and attempting self-correction if needed...")
     code_fixer_prompt_template = read_prompt_template('prompts/code_fixer.txt')
-    for file_name, test_file_name in test_files:
+
+    def test_and_fix(file_name, test_file_name):
         test_file_path = os.path.join(project_dir, test_file_name)
         file_path = os.path.join(project_dir, file_name)
+        records = []
         for attempt in range(2):
             print(f"    ▶️ Running {test_file_name} (attempt {attempt+1})...")
-            success, output = run_pytest_on_file(test_file_path, cwd=project_dir)
-            if success:
-                print(f"      ✅ Tests passed for {file_name}!")
-                break
+            record = run_test_file(test_file_name, cwd=project_dir)
+            records.append(record)
+            if record['passed']:
+                print(f"      ✅ Tests passed for {file_name} in {record['duration']}s!")
+                return records
             else:
-                print(f"      ❌ Test failed for {file_name}. Attempting to fix...")
+                print(f"      ❌ Test {record['status']} for {file_name}. Attempting to fix...")
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f:
                         file_code = f.read()
@@ -149,16 +205,31 @@ def main():
                     file_name=file_name,
                     file_code=file_code,
                     test_code=test_code,
-                    error_message=output
+                    error_message=record['output']
                 )
-                fixed_code = invoke_persona(fixer_prompt)
+                fixed_code, _ = request_code(lambda prompt: invoke_persona(prompt, persona='code_fixer'), fixer_prompt,
+                                             file_name, on_invalid=reject_output('code_fixer', file_name))
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write(fixed_code)
                 print(f"      🔄 {file_name} updated by Code Fixer.")
         else:
             print(f"      🚫 Could not fix {file_name} after 2 attempts.")
+        return records
+
+    if test_files:
+        with ThreadPoolExecutor(max_workers=min(TEST_WORKERS, len(test_files))) as pool:
+            all_records = list(pool.map(lambda pair: test_and_fix(*pair), test_files))
+        passed = sum(1 for records in all_records if records and records[-1]['passed'])
+        print(f"\n📊 {passed}/{len(test_files)} files passing.")
 
     print("\n🎉 Project generation complete!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    if '--batch' in sys.argv[1:]:
+        # python run_project.py --batch ideas.jsonl: generate every idea in the file, see batch.py
+        import batch
+        args = sys.argv[sys.argv.index('--batch') + 1:]
+        if not args:
+            sys.exit("Usage: python run_project.py --batch <ideas.jsonl>")
+        sys.exit(batch.main(args[0]))
+    main(resume='--resume' in sys.argv[1:])
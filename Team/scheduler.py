@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskScheduler:
+    """
+    Runs callables on a bounded thread pool, starting each one only once the
+    tasks it depends on have finished.
+
+    Tasks may be submitted while others are already running. Dependencies on
+    ids that were never submitted are dropped once close() is called, and a
+    dependency cycle is broken by releasing the earliest waiting task rather
+    than deadlocking.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._cond = threading.Condition()
+        self._pending = {}   # task_id -> (fn, set of unmet dependency ids)
+        self._known = set()
+        self._results = {}
+        self._running = 0
+        self._closed = False
+
+    def submit(self, task_id, fn, depends_on=()):
+        """Queue fn() to run once every id in depends_on has completed."""
+        with self._cond:
+            if task_id in self._known:
+                raise ValueError(f"Duplicate task id: {task_id!r}")
+            self._known.add(task_id)
+            self._pending[task_id] = (fn, set(depends_on) - {task_id})
+            self._dispatch_ready()
+
+    def close(self):
+        """Signal that no more tasks will be submitted."""
+        with self._cond:
+            self._closed = True
+            self._dispatch_ready()
+
+    def wait(self):
+        """Close the scheduler, block until all tasks finish and return {task_id: result or exception}."""
+        self.close()
+        with self._cond:
+            while self._pending or self._running:
+                self._cond.wait()
+        self._executor.shutdown(wait=True)
+        return dict(self._results)
+
+    def _is_met(self, dep):
+        if dep in self._results:
+            return True
+        # Once closed, a dependency that was never submitted can never complete
+        return self._closed and dep not in self._known
+
+    def _dispatch_ready(self):
+        # Caller must hold self._cond
+        ready = [task_id for task_id, (_, deps) in self._pending.items()
+                 if all(self._is_met(d) for d in deps)]
+        if not ready and self._closed and self._pending and not self._running:
+            # Nothing can make progress: break the dependency cycle
+            ready = [next(iter(self._pending))]
+        for task_id in ready:
+            fn, _ = self._pending.pop(task_id)
+            self._running += 1
+            self._executor.submit(self._run, task_id, fn)
+
+    def _run(self, task_id, fn):
+        try:
+            result = fn()
+        except Exception as e:
+            result = e
+        with self._cond:
+            self._results[task_id] = result
+            self._running -= 1
+            self._dispatch_ready()
+            self._cond.notify_all()
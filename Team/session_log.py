@@ -0,0 +1,164 @@
+import os
+import re
+import shutil
+import threading
+from collections import deque
+
+# One subdirectory of log segments per session
+SESSION_LOG_DIR = os.getenv('SESSION_LOG_DIR', 'session_logs')
+# Bytes written to a log segment before the next one is started
+LOG_SEGMENT_BYTES = int(os.getenv('LOG_SEGMENT_BYTES', str(1024 * 1024)))
+# Segments kept per session; the oldest are deleted
+LOG_SEGMENTS = int(os.getenv('LOG_SEGMENTS', '5'))
+# Latest messages kept in memory and returned as the session result's 'log'
+LOG_TAIL_LINES = int(os.getenv('LOG_TAIL_LINES', '200'))
+# Characters of a message kept in memory; the whole message is only in the log file
+LOG_MESSAGE_CHARS = 2000
+# Most bytes returned by one read()
+MAX_READ_BYTES = 256 * 1024
+
+_SEGMENT_RE = re.compile(r'^(\d+)\.log$')
+_SESSION_ID_RE = re.compile(r'^[\w-]+$')
+
+
+def session_dir(session_id, root=SESSION_LOG_DIR):
+    if not _SESSION_ID_RE.match(session_id):
+        raise ValueError(f"Invalid session id: {session_id!r}")
+    return os.path.join(root, session_id)
+
+
+def _segments(directory):
+    """Start offsets of the log segments in directory, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(int(match.group(1)) for match in map(_SEGMENT_RE.match, names) if match)
+
+
+def _segment_path(directory, start):
+    return os.path.join(directory, f"{start:012d}.log")
+
+
+class SessionLog:
+    """
+    Status messages of one session, appended to log segments under
+    SESSION_LOG_DIR/<session_id>/. Each segment is named by the byte offset
+    of the log it starts at, so offsets handed to readers stay valid after
+    the oldest segments are deleted. Only the last tail_lines messages, cut
+    to LOG_MESSAGE_CHARS, are kept in memory. Without a session_id nothing
+    is written to disk. Used where the orchestrator used a list; append() is
+    thread-safe.
+    """
+
+    def __init__(self, session_id, root=SESSION_LOG_DIR, segment_bytes=LOG_SEGMENT_BYTES, segments=LOG_SEGMENTS,
+                 tail_lines=LOG_TAIL_LINES):
+        self.directory = session_dir(session_id, root) if session_id else None
+        self.segment_bytes = segment_bytes
+        self.segments = max(1, segments)
+        self._tail = deque(maxlen=tail_lines)
+        self._lock = threading.Lock()
+        self._file = None
+        self._start = self._offset = 0
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # A resumed session keeps appending to its existing log
+        starts = _segments(self.directory)
+        self._start = starts[-1] if starts else 0
+        self._offset = self._start + (os.path.getsize(_segment_path(self.directory, self._start)) if starts else 0)
+
+    def append(self, message):
+        message = str(message)
+        data = (message + '\n').encode('utf-8')
+        if len(message) > LOG_MESSAGE_CHARS:
+            message = (message[:LOG_MESSAGE_CHARS]
+                       + f" [... {len(message) - LOG_MESSAGE_CHARS} more characters in the session log]")
+        with self._lock:
+            self._tail.append(message)
+            if self.directory is None:
+                return
+            try:
+                if self._file is None or (self._offset > self._start and
+                                          self._offset - self._start + len(data) > self.segment_bytes):
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self._offset += len(data)
+            except OSError as e:
+                print(f"Could not write session log: {e}")
+
+    def _rotate(self):
+        # Caller must hold self._lock
+        if self._file is not None:
+            self._file.close()
+            self._start = self._offset
+        self._file = open(_segment_path(self.directory, self._start), 'ab')
+        for start in _segments(self.directory)[:-self.segments]:
+            try:
+                os.remove(_segment_path(self.directory, start))
+            except OSError:
+                pass
+
+    def tail(self):
+        """The latest messages, oldest first."""
+        with self._lock:
+            return list(self._tail)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read(session_id, offset=0, max_bytes=MAX_READ_BYTES, root=SESSION_LOG_DIR):
+    """
+    Up to max_bytes of a session's log from byte offset on, cut after the
+    last complete line. Returns {'text', 'offset', 'next_offset', 'skipped'}
+    where skipped counts the bytes before offset's text that were deleted
+    with old segments, or None if the session has no log. An offset past
+    the end of the log reads from its end.
+    """
+    directory = session_dir(session_id, root)
+    starts = _segments(directory)
+    if not starts:
+        return None
+    try:
+        end = starts[-1] + os.path.getsize(_segment_path(directory, starts[-1]))
+    except OSError:
+        end = starts[-1]
+    # An offset past the end would skip what is written up to it
+    offset = min(max(0, offset), end)
+    skipped = max(0, starts[0] - offset)
+    position = offset + skipped
+    data = b''
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else None
+        if (end is not None and position >= end) or len(data) >= max_bytes:
+            continue
+        try:
+            with open(_segment_path(directory, start), 'rb') as f:
+                f.seek(max(0, position - start))
+                chunk = f.read(max_bytes - len(data))
+        except OSError:
+            break
+        data += chunk
+        position += len(chunk)
+    if len(data) >= max_bytes and b'\n' in data:
+        data = data[:data.rindex(b'\n') + 1]
+    return {
+        'text': data.decode('utf-8', errors='replace'),
+        'offset': offset + skipped,
+        'next_offset': offset + skipped + len(data),
+        'skipped': skipped,
+    }
+
+
+def remove(session_id, root=SESSION_LOG_DIR):
+    """Deletes a session's log, if it has one."""
+    try:
+        directory = session_dir(session_id, root)
+    except ValueError:
+        return
+    shutil.rmtree(directory, ignore_errors=True)
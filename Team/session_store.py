@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import session_log
+
+SESSION_DB = os.getenv('SESSION_DB', 'sessions.db')
+# Finished results kept in memory for fast /status and /download lookups
+MAX_CACHED_RESULTS = int(os.getenv('MAX_CACHED_RESULTS', '100'))
+# Seconds a finished result stays in memory after it was last read; then it is read from the database again
+RESULT_TTL = int(os.getenv('RESULT_TTL', '600'))
+# Legacy history file imported into the database on first use
+LEGACY_HISTORY_FILE = 'history.json'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions (timestamp);
+"""
+
+
+class SessionStore:
+    """
+    SQLite-backed store of session history and results. Running sessions
+    keep their latest status in memory; every status change is a single-row
+    UPDATE, and finished results live in the database with at most
+    MAX_CACHED_RESULTS of them, each read within the last RESULT_TTL
+    seconds, kept in memory.
+    """
+
+    def __init__(self, path=SESSION_DB, max_cached_results=MAX_CACHED_RESULTS, result_ttl=RESULT_TTL):
+        self.path = path
+        self.max_cached_results = max_cached_results
+        self.result_ttl = result_ttl
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._mem_lock = threading.Lock()
+        self._live = {}                # session_id -> status dict of running sessions
+        self._finished = OrderedDict()  # session_id -> (last read, result dict), LRU
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            conn.commit()
+        self._import_legacy_history()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params=()):
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(sql, params)
+            conn.commit()
+
+    def _import_legacy_history(self):
+        if not os.path.exists(LEGACY_HISTORY_FILE):
+            return
+        if self._conn().execute('SELECT 1 FROM sessions LIMIT 1').fetchone():
+            return
+        try:
+            with open(LEGACY_HISTORY_FILE, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return
+        rows = [(h['session_id'], h.get('prompt', ''), h.get('timestamp', 0), h.get('status', 'Unknown'))
+                for h in history if 'session_id' in h]
+        if not rows:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            conn.executemany(
+                'INSERT OR IGNORE INTO sessions (session_id, prompt, timestamp, status, finished) VALUES (?, ?, ?, ?, 1)',
+                rows)
+            conn.commit()
+
+    def create(self, session_id, prompt, status='Queued'):
+        with self._mem_lock:
+            self._live[session_id] = {'status': status}
+        self._write('INSERT OR REPLACE INTO sessions (session_id, prompt, timestamp, status) VALUES (?, ?, ?, ?)',
+                    (session_id, prompt, int(time.time()), status))
+
+    def set_status(self, session_id, status):
+        """Records the latest progress status of a running session."""
+        with self._mem_lock:
+            self._live[session_id] = {'status': status}
+        self._write('UPDATE sessions SET status = ? WHERE session_id = ?', (status, session_id))
+
+    def finish(self, session_id, result):
+        """Stores a session's final result and moves it out of the live set."""
+        status = result.get('status', 'Unknown')
+        self._write('UPDATE sessions SET status = ?, finished = 1, result = ? WHERE session_id = ?',
+                    (status, json.dumps(result, ensure_ascii=False), session_id))
+        with self._mem_lock:
+            self._live.pop(session_id, None)
+            self._finished[session_id] = (time.monotonic(), result)
+            self._finished.move_to_end(session_id)
+            self._evict()
+
+    def _evict(self):
+        # Caller must hold self._mem_lock
+        while len(self._finished) > self.max_cached_results:
+            self._finished.popitem(last=False)
+        expired = time.monotonic() - self.result_ttl
+        while self._finished and next(iter(self._finished.values()))[0] < expired:
+            self._finished.popitem(last=False)
+
+    def get(self, session_id):
+        """Latest status or final result of a session, or None if unknown."""
+        with self._mem_lock:
+            if session_id in self._live:
+                return dict(self._live[session_id])
+            self._evict()
+            if session_id in self._finished:
+                _, result = self._finished[session_id]
+                self._finished[session_id] = (time.monotonic(), result)
+                self._finished.move_to_end(session_id)
+                return result
+        row = self._conn().execute('SELECT status, result FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        if row is None:
+            return None
+        if row['result']:
+            return json.loads(row['result'])
+        return {'status': row['status']}
+
+    def is_finished(self, session_id):
+        with self._mem_lock:
+            if session_id in self._live:
+                return False
+            if session_id in self._finished:
+                return True
+        row = self._conn().execute('SELECT finished FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return bool(row and row['finished'])
+
+    def history(self, page=1, per_page=50):
+        """One page of history entries, newest first, plus the total count."""
+        page = max(1, page)
+        per_page = max(1, min(per_page, 500))
+        conn = self._conn()
+        total = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        rows = conn.execute(
+            'SELECT session_id, prompt, timestamp, status FROM sessions ORDER BY timestamp DESC, rowid DESC '
+            'LIMIT ? OFFSET ?', (per_page, (page - 1) * per_page)).fetchall()
+        return [dict(row) for row in rows], total
+
+    def delete(self, session_id):
+        with self._mem_lock:
+            self._finished.pop(session_id, None)
+            running = session_id in self._live
+        self._write('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+        if not running:
+            session_log.remove(session_id)
+
+    def clear(self):
+        """Deletes all finished sessions and their logs; running ones stay tracked."""
+        with self._mem_lock:
+            self._finished.clear()
+        rows = self._conn().execute('SELECT session_id FROM sessions WHERE finished = 1').fetchall()
+        self._write('DELETE FROM sessions WHERE finished = 1')
+        for row in rows:
+            session_log.remove(row['session_id'])
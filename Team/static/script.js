@@ -5,6 +5,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const timeline = document.getElementById('status-timeline');
     const downloadBtn = document.getElementById('download-btn');
     const generateBtn = form.querySelector('button[type="submit"]');
+    const cancelBtn = document.getElementById('cancel-btn');
+    const liveCard = document.getElementById('live-output-card');
+    const liveLabel = document.getElementById('live-output-label');
+    const liveOutput = document.getElementById('live-output');
+    const MAX_LIVE_CHARS = 20000;
     let interval = null;
 
     function resetUI() {
@@ -15,6 +20,10 @@ document.addEventListener('DOMContentLoaded', function() {
         spinner.classList.add('d-none');
         downloadBtn.style.display = 'none';
         generateBtn.disabled = false;
+        cancelBtn.classList.add('d-none');
+        liveCard.classList.add('d-none');
+        liveOutput.textContent = '';
+        clearInterval(interval);
     }
 
     function showLatestStatus(message, type) {
@@ -50,11 +59,85 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function statusType(status) {
         if (/saved to|generated|updated by Code Fixer|Tests passed/i.test(status)) return 'success';
-        if (/Could not fix|Failed|error/i.test(status)) return 'error';
+        if (/Could not fix|Failed|error|cancel/i.test(status)) return 'error';
         if (/complete/i.test(status)) return 'complete';
         return 'info';
     }
 
+    function isFinished(status) {
+        return /complete|error|Could not fix|Failed|success|cancel/i.test(status);
+    }
+
+    function finish() {
+        spinner.classList.add('d-none');
+        generateBtn.disabled = false;
+        cancelBtn.classList.add('d-none');
+    }
+
+    function handleStatus(statusData) {
+        let status = statusData.status || 'Processing...';
+        let type = statusType(status);
+        showLatestStatus(status, type);
+        updateProgressBar(status, type);
+        if (statusData.download_url) {
+            downloadBtn.href = statusData.download_url;
+            downloadBtn.style.display = 'block';
+        }
+        return isFinished(status);
+    }
+
+    // Fallback for browsers or proxies where the event stream is unavailable
+    function pollStatus(sessionId) {
+        interval = setInterval(() => {
+            fetch('/status/' + sessionId)
+                .then(res => res.json())
+                .then(statusData => {
+                    if (handleStatus(statusData)) {
+                        clearInterval(interval);
+                        finish();
+                    }
+                });
+        }, 2000);
+    }
+
+    function streamStatus(sessionId) {
+        if (!window.EventSource) {
+            pollStatus(sessionId);
+            return;
+        }
+        const source = new EventSource('/events/' + sessionId);
+        let currentStream = null;
+        source.addEventListener('phase', e => {
+            handleStatus(JSON.parse(e.data));
+        });
+        source.addEventListener('token', e => {
+            const data = JSON.parse(e.data);
+            const label = data.persona + (data.file_name ? ' · ' + data.file_name : '');
+            let text = data.text;
+            if (label !== currentStream) {
+                // Concurrent personas interleave, so mark every switch of speaker
+                currentStream = label;
+                liveLabel.textContent = label;
+                liveCard.classList.remove('d-none');
+                text = '\n── ' + label + ' ──\n' + text;
+            }
+            liveOutput.textContent = (liveOutput.textContent + text).slice(-MAX_LIVE_CHARS);
+            liveOutput.scrollTop = liveOutput.scrollHeight;
+        });
+        source.addEventListener('done', e => {
+            source.close();
+            handleStatus(JSON.parse(e.data));
+            finish();
+        });
+        source.onerror = () => {
+            // EventSource retries on its own while the stream is open; if it
+            // was closed outright, switch to polling
+            if (source.readyState === EventSource.CLOSED) {
+                pollStatus(sessionId);
+            }
+        };
+    }
+
     form.onsubmit = function(e) {
         e.preventDefault();
         resetUI();
@@ -68,26 +151,9 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(res => res.json())
         .then(data => {
-            const sessionId = data.session_id;
-            interval = setInterval(() => {
-                fetch('/status/' + sessionId)
-                    .then(res => res.json())
-                    .then(statusData => {
-                        let status = statusData.status || 'Processing...';
-                        let type = statusType(status);
-                        showLatestStatus(status, type);
-                        updateProgressBar(status, type);
-                        if (statusData.download_url) {
-                            downloadBtn.href = statusData.download_url;
-                            downloadBtn.style.display = 'block';
-                        }
-                        if (/complete|error|Could not fix|Failed|success/i.test(status)) {
-                            spinner.classList.add('d-none');
-                            clearInterval(interval);
-                            generateBtn.disabled = false;
-                        }
-                    });
-            }, 2000);
+            cancelBtn.onclick = () => fetch('/cancel/' + data.session_id, { method: 'POST' });
+            cancelBtn.classList.remove('d-none');
+            streamStatus(data.session_id);
         });
     };
 
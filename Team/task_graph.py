@@ -0,0 +1,78 @@
+from checkpoint import content_hash
+from prompt_budget import relevant_sections, split_sections
+
+
+def _normalized(text):
+    # Re-flowed whitespace doesn't change what a section says
+    return ' '.join(text.split())
+
+
+def section_hashes(markdown):
+    """{heading: hash of the section body} for each section of a markdown document ('' for the preamble)."""
+    hashes = {}
+    for _, heading, body in split_sections(markdown):
+        text = _normalized('\n'.join(body))
+        if heading is None and not text:
+            continue
+        key = _normalized(heading or '')
+        # Repeated headings get a counter so each one is tracked separately
+        name, n = key, 2
+        while name in hashes:
+            name, n = f"{key} ({n})", n + 1
+        hashes[name] = content_hash(text)
+    return hashes
+
+
+def task_node(task, prd_text, system_design):
+    """
+    The inputs a generated file depends on: its task description, the
+    design sections relevant to it (selected the same way as for the
+    engineer's prompt) and the PRD sections that mention it or its task.
+    The rest of the PRD reaches the file only through the design and the
+    task description. 'inputs' hashes all of them, so it only changes when
+    something this file depends on has changed.
+    """
+    file_name = task['file_name']
+    description = str(task.get('task_description', ''))
+    depends_on = task.get('depends_on') or []
+    if isinstance(depends_on, str):
+        depends_on = [depends_on]
+    node = {
+        'task': content_hash(_normalized(description)),
+        'depends_on': sorted(d for d in depends_on if isinstance(d, str)),
+        'prd_sections': section_hashes(relevant_sections(prd_text, file_name, description, fallback=False)),
+        'design_sections': section_hashes(relevant_sections(system_design, file_name, description)),
+    }
+    node['inputs'] = content_hash(file_name, node['task'], sorted(node['prd_sections'].items()),
+                                  sorted(node['design_sections'].items()))
+    return node
+
+
+def _changed_keys(old, new):
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+def diff_graphs(previous, current):
+    """
+    Compares two {file_name: node} graphs. Returns {'added', 'removed',
+    'unchanged': [file_name], 'changed': {file_name: [reason]}}, where the
+    reasons name the task description or the PRD/design sections that
+    differ.
+    """
+    changes = {'added': sorted(set(current) - set(previous)), 'removed': sorted(set(previous) - set(current)),
+               'changed': {}, 'unchanged': []}
+    for file_name in sorted(set(current) & set(previous)):
+        old, new = previous[file_name], current[file_name]
+        if old.get('inputs') == new['inputs']:
+            changes['unchanged'].append(file_name)
+            continue
+        reasons = []
+        if old.get('task') != new['task']:
+            reasons.append('task description')
+        reasons += [f"PRD section '{s or '(preamble)'}'"
+                    for s in _changed_keys(old.get('prd_sections', {}), new['prd_sections'])]
+        reasons += [f"design section '{s or '(preamble)'}'"
+                    for s in _changed_keys(old.get('design_sections', {}), new['design_sections'])]
+        changes['changed'][file_name] = reasons or ['inputs']
+    return changes
+
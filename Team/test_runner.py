@@ -0,0 +1,101 @@
+import os
+import re
+import sys
+import time
+import signal
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; tests then run without rlimits
+    resource = None
+
+# Wall-clock limit for one pytest run, in seconds
+PYTEST_TIMEOUT = int(os.getenv('PYTEST_TIMEOUT', '60'))
+# CPU-time and address-space caps applied to the pytest process
+PYTEST_CPU_SECONDS = int(os.getenv('PYTEST_CPU_SECONDS', '60'))
+PYTEST_MEMORY_MB = int(os.getenv('PYTEST_MEMORY_MB', '1024'))
+# Number of per-file test/fix loops run at the same time
+TEST_WORKERS = int(os.getenv('TEST_WORKERS', str(min(8, os.cpu_count() or 2))))
+# Characters of pytest output kept per run (the tail holds the failure summary)
+MAX_OUTPUT_CHARS = 20000
+
+_SUMMARY_RE = re.compile(r'(\d+) (passed|failed|error|errors|skipped)')
+
+
+# Entry point of the sandboxed test process: applies the rlimits to itself,
+# then runs pytest in-process. Doing this in the child's own interpreter
+# avoids preexec_fn, which is unsafe while other threads are running.
+_SANDBOX = (
+    "import sys, resource\n"
+    "cpu, memory = int(sys.argv[1]), int(sys.argv[2])\n"
+    "resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "import pytest\n"
+    "sys.exit(pytest.main(sys.argv[3:]))\n"
+)
+
+
+def _pytest_command(args):
+    if resource is None:
+        return [sys.executable, '-m', 'pytest'] + args
+    memory = PYTEST_MEMORY_MB * 1024 * 1024
+    return [sys.executable, '-c', _SANDBOX, str(PYTEST_CPU_SECONDS), str(memory)] + args
+
+
+def _parse_counts(output):
+    counts = {'passed': 0, 'failed': 0, 'error': 0, 'skipped': 0}
+    for number, kind in _SUMMARY_RE.findall(output):
+        counts['error' if kind == 'errors' else kind] = int(number)
+    return counts
+
+
+def run_test_file(test_file_path, cwd, timeout=None):
+    """
+    Runs pytest on one test file in a resource-limited subprocess and returns
+    a record: {'test_file', 'status' ('passed'|'failed'|'timeout'|'error'),
+    'passed', 'returncode', 'duration', 'counts', 'output'}.
+    """
+    timeout = timeout or PYTEST_TIMEOUT
+    cmd = _pytest_command([test_file_path, '--maxfail=1', '--disable-warnings', '-q', '--tb=short',
+                           '-p', 'no:cacheprovider', '--rootdir', '.'])
+    record = {'test_file': test_file_path, 'returncode': None, 'counts': {}}
+    start = time.time()
+    try:
+        proc = subprocess.Popen(
+            cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+            start_new_session=(os.name == 'posix')
+        )
+    except Exception as e:
+        record.update(status='error', passed=False, duration=time.time() - start, output=str(e))
+        return record
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+        record['returncode'] = proc.returncode
+        record['status'] = 'passed' if proc.returncode == 0 else 'failed'
+    except subprocess.TimeoutExpired:
+        kill_process(proc)
+        output, _ = proc.communicate()
+        output = (output or '') + f"\nTimed out after {timeout}s."
+        record['status'] = 'timeout'
+    record['duration'] = round(time.time() - start, 3)
+    record['passed'] = record['status'] == 'passed'
+    record['counts'] = _parse_counts(output or '')
+    record['output'] = (output or '')[-MAX_OUTPUT_CHARS:]
+    return record
+
+
+def kill_process(proc):
+    """Kills a test process started in its own session together with anything it spawned."""
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+
+
+def summarize(record):
+    """Copy of a test record without the captured output, for logs and API responses."""
+    return {key: value for key, value in record.items() if key != 'output'}
@@ -0,0 +1,370 @@
+"""
+A warm pytest process per generated project.
+
+The parent side (TestWorker) keeps one sandboxed worker process per
+project directory. The worker imports pytest once, then runs each batch of
+test files it is sent in a single pytest session and streams one JSON line
+per collected file and per test report back. The parent turns those into
+the same per-file records as test_runner.run_test_file().
+
+Run as a script, this file is the worker itself.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import weakref
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; the worker then runs without rlimits
+    resource = None
+
+from test_runner import (run_test_file, kill_process, PYTEST_TIMEOUT, PYTEST_CPU_SECONDS, PYTEST_MEMORY_MB,
+                         MAX_OUTPUT_CHARS, TEST_WORKERS)
+
+# Run test files in one warm pytest process (0: one subprocess per test file, as test_runner does)
+PERSISTENT_TEST_WORKER = os.getenv('PERSISTENT_TEST_WORKER', '1') == '1'
+# Pytest sessions one worker process runs before it is replaced by a fresh one
+WORKER_MAX_RUNS = int(os.getenv('TEST_WORKER_MAX_RUNS', '20'))
+
+# Test ids are relative to the project even when a directory above it has a pytest config
+PYTEST_ARGS = ['--disable-warnings', '-q', '--tb=short', '-p', 'no:cacheprovider', '--continue-on-collection-errors',
+               '--rootdir', '.']
+_EVENT_PREFIX = '@@pytest-worker '
+
+
+class TestWorker:
+    """
+    Runs test files of one project in a persistent pytest worker. Each run
+    is one pytest session over all the files; a file that hangs or crashes
+    the worker is reported as 'timeout' or 'error', the worker is replaced
+    and the files after it are run again in the new one. The worker forgets
+    the project's modules between runs and is recycled every max_runs runs.
+    """
+
+    def __init__(self, project_dir, timeout=None, max_runs=WORKER_MAX_RUNS, persistent=None):
+        self.project_dir = project_dir
+        self.timeout = timeout or PYTEST_TIMEOUT
+        self.max_runs = max_runs
+        self.persistent = PERSISTENT_TEST_WORKER if persistent is None else persistent
+        self._lock = threading.Lock()
+        self._proc = None
+        self._events = None
+        self._runs = 0
+        self._finalizer = None
+
+    def close(self):
+        with self._lock:
+            self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, test_files):
+        """{test_file: record} for test_files (paths relative to the project), see run_test_file()."""
+        if not test_files:
+            return {}
+        if not self.persistent:
+            with ThreadPoolExecutor(max_workers=min(TEST_WORKERS, len(test_files))) as pool:
+                return dict(zip(test_files, pool.map(lambda name: run_test_file(name, cwd=self.project_dir),
+                                                     test_files)))
+        records = {}
+        # pytest stops the whole session over a missing path, so those are reported here
+        for name in test_files:
+            if not os.path.isfile(os.path.join(self.project_dir, name)):
+                records[name] = _record(name, _FileResult(), status='error', note=f"{name} does not exist.")
+        with self._lock:
+            remaining = [name for name in test_files if name not in records]
+            while remaining:
+                results, stuck, reason = self._run_session(remaining)
+                for name in remaining:
+                    if name in results:
+                        records[name] = _record(name, results[name])
+                if stuck is None:
+                    break
+                self._stop()
+                partial = results.get(stuck)
+                records[stuck] = _record(stuck, partial or _FileResult(), status=reason,
+                                         note=(f"Timed out after {self.timeout}s." if reason == 'timeout'
+                                               else 'The test process exited unexpectedly.'))
+                remaining = [name for name in remaining if name not in records]
+            # A file with no tests in it reports nothing; _record() makes that a 'no tests ran' failure
+            for name in test_files:
+                if name not in records:
+                    records[name] = _record(name, _FileResult())
+            self._runs += 1
+            if self._runs >= self.max_runs:
+                self._stop()
+            return records
+
+    def _ensure_started(self):
+        # Caller must hold self._lock
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        self._stop()
+        cpu = PYTEST_CPU_SECONDS
+        memory = PYTEST_MEMORY_MB * 1024 * 1024
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        self._proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(cpu), str(memory), str(self.max_runs)],
+            cwd=self.project_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, env=env, start_new_session=(os.name == 'posix')
+        )
+        self._events = queue.Queue()
+        threading.Thread(target=_read_events, args=(self._proc.stdout, self._events), daemon=True).start()
+        self._finalizer = weakref.finalize(self, _stop_process, self._proc)
+        self._runs = 0
+
+    def _stop(self):
+        # Caller must hold self._lock
+        if self._finalizer is not None:
+            self._finalizer()
+        self._proc = None
+        self._events = None
+        self._finalizer = None
+
+    def _run_session(self, test_files):
+        """
+        One pytest session over test_files. Returns (results, stuck, reason):
+        {test_file: _FileResult} for every file that got results, and the
+        file being collected or run when the worker timed out or died (None
+        when the session finished).
+        """
+        self._ensure_started()
+        results = {}
+        current = None
+        try:
+            self._proc.stdin.write(json.dumps({'args': list(test_files)}) + '\n')
+            self._proc.stdin.flush()
+        except OSError:
+            return results, test_files[0], 'error'
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                event = self._events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return results, current or test_files[0], 'timeout'
+            if event is None:
+                return results, current or test_files[0], 'error'
+            kind = event.get('event')
+            if kind == 'done':
+                return results, None, None
+            name = _relative(event.get('file') or '', self.project_dir)
+            if kind == 'start':
+                # Each file gets the full timeout, as with one process per file
+                if name != current:
+                    deadline = time.monotonic() + self.timeout
+                current = name
+            elif kind == 'report':
+                results.setdefault(name, _FileResult()).add(event)
+
+
+class _FileResult:
+    """Test reports received for one file."""
+
+    def __init__(self):
+        self.counts = {'passed': 0, 'failed': 0, 'error': 0, 'skipped': 0}
+        self.failures = []  # report events of failed collections and tests
+        self.duration = 0.0
+        self.ran = False  # whether a test got to run; a module skipped as a whole runs none
+
+    def add(self, event):
+        self.duration += event.get('duration', 0.0)
+        self.ran = self.ran or event['when'] != 'collect'
+        outcome = event['outcome']
+        if outcome == 'failed':
+            # Failures outside the test body (collection, fixtures) are errors, as in pytest's summary
+            self.counts['failed' if event['when'] == 'call' else 'error'] += 1
+            self.failures.append(event)
+        elif event['when'] == 'call' or outcome == 'skipped':
+            self.counts[outcome] += 1
+
+
+def _record(test_file, result, status=None, note=None):
+    """A run_test_file()-style record for one file, with its part of the session's report as output."""
+    counts = dict(result.counts)
+    if status is None:
+        # As with pytest's exit code, a file in which no test ran failed
+        status = 'failed' if counts['failed'] or counts['error'] or not result.ran else 'passed'
+    # Laid out like pytest's own report, which is what repair.parse_failure() reads
+    lines = []
+    for section, errors in (('FAILURES', False), ('ERRORS', True)):
+        failures = [event for event in result.failures if (event['when'] != 'call') == errors]
+        if failures:
+            lines.append(f" {section} ".center(80, '='))
+        for event in failures:
+            title = event.get('head_line') or event['nodeid']
+            if event['when'] == 'collect':
+                title = f"ERROR collecting {title}"
+            elif errors:
+                title = f"ERROR at {event['when']} of {title}"
+            lines.append(f" {title} ".center(80, '_'))
+            lines.append(event.get('longrepr', '').rstrip())
+    if result.failures:
+        lines.append(' short test summary info '.center(80, '='))
+        for event in result.failures:
+            kind = 'FAILED' if event['when'] == 'call' else 'ERROR'
+            lines.append(f"{kind} {event['nodeid']}" + (f" - {event['message']}" if event.get('message') else ''))
+    summary = ', '.join(f"{n} {kind}" for kind, n in counts.items() if n) or 'no tests ran'
+    lines.append(f"{summary} in {result.duration:.2f}s")
+    if note:
+        lines.append(note)
+    output = '\n'.join(lines) + '\n'
+    return {
+        'test_file': test_file,
+        'status': status,
+        'passed': status == 'passed',
+        'returncode': None,
+        'duration': round(result.duration, 3),
+        'counts': counts,
+        'output': output[-MAX_OUTPUT_CHARS:],
+    }
+
+
+def _relative(path, project_dir):
+    if os.path.isabs(path):
+        path = os.path.relpath(path, os.path.abspath(project_dir))
+    return os.path.normpath(path)
+
+
+def _read_events(stream, events):
+    try:
+        for line in stream:
+            if line.startswith(_EVENT_PREFIX):
+                try:
+                    events.put(json.loads(line[len(_EVENT_PREFIX):]))
+                except ValueError:
+                    pass
+    except (OSError, ValueError):
+        pass
+    events.put(None)
+
+
+def _stop_process(proc):
+    """Stops a worker process together with anything its tests spawned."""
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    kill_process(proc)
+    proc.wait()
+
+
+# --- Worker process -------------------------------------------------------
+
+class _Reporter:
+    """pytest plugin that streams failed or skipped collections and test reports to the parent."""
+
+    def __init__(self, emit):
+        self.emit = emit
+
+    def pytest_collectstart(self, collector):
+        path = getattr(collector, 'path', None)
+        if path is not None and str(path).endswith('.py'):
+            self.emit({'event': 'start', 'file': str(path)})
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.emit({'event': 'report', 'file': report.fspath, 'nodeid': report.nodeid, 'when': 'collect',
+                       'outcome': 'failed', 'head_line': report.nodeid, 'longrepr': report.longreprtext,
+                       'message': _crash_message(report)})
+        elif report.skipped:
+            # A module-level pytest.skip()
+            self.emit({'event': 'report', 'file': report.fspath, 'nodeid': report.nodeid, 'when': 'collect',
+                       'outcome': 'skipped', 'head_line': report.nodeid, 'longrepr': ''})
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        self.emit({'event': 'start', 'file': location[0]})
+
+    def pytest_runtest_logreport(self, report):
+        self.emit({'event': 'report', 'file': report.location[0], 'nodeid': report.nodeid, 'when': report.when,
+                   'outcome': report.outcome, 'duration': report.duration, 'head_line': report.head_line,
+                   'longrepr': report.longreprtext if report.failed else '',
+                   'message': _crash_message(report) if report.failed else ''})
+
+
+def _crash_message(report):
+    crash = getattr(report.longrepr, 'reprcrash', None)
+    message = getattr(crash, 'message', None)
+    if message:
+        return message.splitlines()[0]
+    text = report.longreprtext.strip().splitlines()
+    return text[-1] if text else ''
+
+
+def _forget_modules(directory):
+    """Drops every imported module loaded from directory, so the next import reads the files again."""
+    root = os.path.abspath(directory) + os.sep
+    for name, module in list(sys.modules.items()):
+        if name == '__main__':  # The worker script itself; inspect needs it to find source lines
+            continue
+        paths = [getattr(module, '__file__', None)] + list(getattr(module, '__path__', None) or ())
+        if any(path and os.path.abspath(path).startswith(root) for path in paths):
+            del sys.modules[name]
+
+
+def _reset(baseline_path, baseline_environ, cwd):
+    """Forgets everything a pytest session left behind that could leak into the next one."""
+    _forget_modules(cwd)
+    sys.path[:] = baseline_path
+    os.environ.clear()
+    os.environ.update(baseline_environ)
+    os.chdir(cwd)
+
+
+def serve(cpu_seconds, memory_bytes, max_runs):
+    """Worker loop: one JSON request per stdin line, one pytest session per request."""
+    # Generated modules are imported from the project directory, never from this script's directory,
+    # and a generated test_runner.py must not find this app's module of that name already imported
+    _forget_modules(sys.path[0])
+    sys.path[0] = os.getcwd()
+    sys.dont_write_bytecode = True
+    if resource is not None:
+        # The CPU limit is raised by cpu_seconds before every session, up to this hard cap
+        hard = cpu_seconds * (max_runs + 1)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, hard))
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    import io
+    import contextlib
+    import pytest
+
+    # Events go out on the original stdout; anything the tests print goes nowhere
+    channel = os.fdopen(os.dup(1), 'w', buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    def emit(event):
+        channel.write(_EVENT_PREFIX + json.dumps(event) + '\n')
+
+    cwd = os.getcwd()
+    baseline_path = list(sys.path)
+    baseline_environ = dict(os.environ)
+    for line in sys.stdin:
+        request = json.loads(line)
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime) + 1
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (min(used + cpu_seconds, hard), hard))
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                exit_code = int(pytest.main(PYTEST_ARGS + request['args'], plugins=[_Reporter(emit)]))
+            except BaseException as e:  # pytest.main itself failed; report it rather than die silently
+                emit({'event': 'report', 'file': request['args'][0], 'nodeid': request['args'][0],
+                      'when': 'collect', 'outcome': 'failed', 'head_line': request['args'][0],
+                      'longrepr': f"E   {type(e).__name__}: {e}", 'message': str(e)})
+                exit_code = -1
+        _reset(baseline_path, baseline_environ, cwd)
+        emit({'event': 'done', 'exit_code': exit_code})
+
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
@@ -0,0 +1,86 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+import archive
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache')
+    monkeypatch.setattr(archive, 'ARCHIVE_CACHE_DIR', path)
+    return path
+
+
+def make_project(root, name, files):
+    project_dir = os.path.join(root, name)
+    for path, content in files.items():
+        full = os.path.join(project_dir, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, 'w') as f:
+            f.write(content)
+    return project_dir
+
+
+def build(project_dir):
+    files = archive.list_files(project_dir)
+    digest = archive.tree_hash(files)
+    data = b''.join(archive.stream_archive(project_dir, files, digest))
+    return archive.cached_archive_path(project_dir, digest), data
+
+
+def test_archive_contents(tmp_path, cache_dir):
+    project_dir = make_project(str(tmp_path), 'todo', {
+        'main.py': 'print(1)\n', 'pkg/util.py': 'x = 1\n', '.checkpoint.json': '{}', 'trace.json': '[]',
+        'pkg/trace.json': '[]', '__pycache__/main.pyc': '', '.pytest_cache/v': ''})
+    path, data = build(project_dir)
+    names = sorted(zipfile.ZipFile(io.BytesIO(data)).namelist())
+    assert names == ['main.py', 'pkg/trace.json', 'pkg/util.py']
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert [name for name in os.listdir(cache_dir) if name.endswith('.tmp')] == []
+
+
+@pytest.mark.parametrize('names', [
+    ('todo', 'todo-app'),
+    ('todo-app', 'todo'),
+    ('app', 'my-app'),
+    ('a-b', 'a-b-c'),
+])
+def test_prune_keeps_other_projects(tmp_path, cache_dir, names):
+    first, second = (make_project(str(tmp_path), name, {'main.py': f'# {name}\n'}) for name in names)
+    second_path, _ = build(second)
+    first_path, _ = build(first)
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(p) for p in (first_path, second_path))
+
+
+def test_same_name_in_other_directory(tmp_path, cache_dir):
+    first = make_project(str(tmp_path / 'one'), 'todo', {'main.py': '1\n'})
+    second = make_project(str(tmp_path / 'two'), 'todo', {'main.py': '1\n'})
+    assert archive.cached_archive_path(first, 'f' * 64) != archive.cached_archive_path(second, 'f' * 64)
+    first_path, _ = build(first)
+    second_path, _ = build(second)
+    assert os.path.exists(first_path) and os.path.exists(second_path)
+
+
+def test_rebuild_replaces_stale_archive(tmp_path, cache_dir):
+    project_dir = make_project(str(tmp_path), 'todo', {'main.py': '1\n'})
+    old_path, _ = build(project_dir)
+    with open(os.path.join(project_dir, 'main.py'), 'w') as f:
+        f.write('22\n')
+    new_path, _ = build(project_dir)
+    assert new_path != old_path
+    assert os.listdir(cache_dir) == [os.path.basename(new_path)]
+
+
+def test_prune_trims_cache(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_CACHE_MAX_FILES', 2)
+    paths = []
+    for i in range(4):
+        path, _ = build(make_project(str(tmp_path), f"p{i}", {'main.py': f'{i}\n'}))
+        os.utime(path, (i, i))
+        paths.append(path)
+    archive.prune(os.path.join(str(tmp_path), 'p3'), keep=paths[3])
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(p) for p in paths[2:])
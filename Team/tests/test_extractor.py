@@ -0,0 +1,115 @@
+import pytest
+
+from extractor import ExtractionError, extract_code, extract_files, extract_json, extract_tasks
+
+FENCE = '```'
+
+
+@pytest.mark.parametrize('text, file_name, code', [
+    ('', 'a.py', ''),
+    ('print(1)', 'a.py', 'print(1)\n'),
+    ('  \nprint(1)\n\n', 'a.py', 'print(1)\n'),
+    (f'Here it is:\n{FENCE}python\nprint(1)\n{FENCE}\nDone.', 'a.py', 'print(1)\n'),
+    (f'{FENCE}py\nprint(1)\n{FENCE}', 'a.py', 'print(1)\n'),
+    (f'{FENCE}\nprint(1)\n{FENCE}', 'a.py', 'print(1)\n'),
+    (f'~~~python\nprint(1)\n~~~', 'a.py', 'print(1)\n'),
+    # The block tagged with the file's language wins over a longer one
+    (f'{FENCE}bash\npip install something-long\n{FENCE}\n{FENCE}python\nx = 1\n{FENCE}', 'a.py', 'x = 1\n'),
+    # Without a tagged block the longest one is taken
+    (f'{FENCE}\nx\n{FENCE}\n{FENCE}\nx = 1\ny = 2\n{FENCE}', 'a.py', 'x = 1\ny = 2\n'),
+    (f'{FENCE}javascript\nlet a = 1;\n{FENCE}', 'a.js', 'let a = 1;\n'),
+    # A block left open at the end of a truncated answer runs to the end
+    (f'{FENCE}python\nx = 1\ny = 2', 'a.py', 'x = 1\ny = 2\n'),
+    # Indented code is kept as it is
+    (f'{FENCE}python\ndef f():\n    return 1\n{FENCE}', 'a.py', 'def f():\n    return 1\n'),
+    # A longer fence can contain a shorter one
+    (f'````python\ns = """\n{FENCE}\n"""\n````', 'a.py', f's = """\n{FENCE}\n"""\n'),
+])
+def test_extract_code(text, file_name, code):
+    assert extract_code(text, file_name) == code
+
+
+@pytest.mark.parametrize('text, code', [
+    ('# Title\n\nSome text.', '# Title\n\nSome text.\n'),
+    (f'# Usage\n\n{FENCE}bash\nrun\n{FENCE}\n\nMore text.', f'# Usage\n\n{FENCE}bash\nrun\n{FENCE}\n\nMore text.\n'),
+    (f'{FENCE}markdown\n# Title\n\nText.\n{FENCE}', '# Title\n\nText.\n'),
+])
+def test_extract_code_document(text, code):
+    assert extract_code(text, 'README.md') == code
+
+
+@pytest.mark.parametrize('text, value', [
+    ('[{"a": 1}]', [{"a": 1}]),
+    ('{"tasks": []}', {"tasks": []}),
+    ('Here is the plan:\n[{"a": 1}]', [{"a": 1}]),
+    ('The tasks [see below] are ordered:\n[{"a": 1}]', [{"a": 1}]),
+    ('The tasks [see below] are ordered:\n```json\n[{"a": 1}]\n```', [{"a": 1}]),
+    ('[1]\n```json\n[{"a": 1}]\n```', [{"a": 1}]),
+    ('```\n[{"a": 1}]\n```', [{"a": 1}]),
+    ('```python\nx = [1]\n```\n```json\n[{"a": 1}]\n```', [{"a": 1}]),
+    ('[{"a": 1}] and then {"b": 2}', [{"a": 1}]),
+    ('[{"a": "x]"}]', [{"a": "x]"}]),
+    ('Use { and } or [ see ]:\n[{"a": 1}]', [{"a": 1}]),
+    # A broken block is passed over for a later one
+    ('```python\nx = [1\n```\n```json\n[{"a": 1}]\n```', [{"a": 1}]),
+])
+def test_extract_json(text, value):
+    assert extract_json(text) == value
+
+
+@pytest.mark.parametrize('text', [
+    None,
+    '',
+    'No JSON here.',
+    'Only [prose] in {braces}.',
+    '[{"a": 1}, {"b": ',
+    '```json\n[{"a": 1}, {"b": \n```',
+    'Tasks [see below]:\n[{"a": 1},',
+])
+def test_extract_json_error(text):
+    with pytest.raises(ExtractionError):
+        extract_json(text)
+
+
+@pytest.mark.parametrize('text, tasks', [
+    ('[{"file_name": "a.py", "task_description": "A"}]', [{"file_name": "a.py", "task_description": "A"}]),
+    ('{"tasks": [{"file_name": "a.py", "task_description": "A", "depends_on": ["b.py"]}]}',
+     [{"file_name": "a.py", "task_description": "A", "depends_on": ["b.py"]}]),
+])
+def test_extract_tasks(text, tasks):
+    assert extract_tasks(text) == tasks
+
+
+@pytest.mark.parametrize('text', [
+    '[]',
+    '[1]',
+    '[{"task_description": "A"}]',
+    '[{"file_name": "a.py"}]',
+    '[{"file_name": "a.py", "task_description": "A", "depends_on": [1]}]',
+])
+def test_extract_tasks_error(text):
+    with pytest.raises(ExtractionError):
+        extract_tasks(text)
+
+
+@pytest.mark.parametrize('text, files', [
+    ('No code.', {}),
+    (f'### a.py\n{FENCE}python\nx = 1\n{FENCE}\n### b.js\n{FENCE}js\nlet b;\n{FENCE}',
+     {'a.py': 'x = 1\n', 'b.js': 'let b;\n'}),
+    (f'File: pkg/a.py\n\n{FENCE}python\nx = 1\n{FENCE}', {'pkg/a.py': 'x = 1\n'}),
+    (f'{FENCE}python a.py\nx = 1\n{FENCE}', {'a.py': 'x = 1\n'}),
+    (f'{FENCE}python\n# a.py\nx = 1\n{FENCE}', {'a.py': '# a.py\nx = 1\n'}),
+    (f'{FENCE}js\n// b.js\nlet b;\n{FENCE}', {'b.js': '// b.js\nlet b;\n'}),
+    # A block that names no file from the list is ignored
+    (f'### c.py\n{FENCE}python\nz = 3\n{FENCE}', {}),
+    (f'{FENCE}python\nx = 1\n{FENCE}', {}),
+    # A later block for the same file wins
+    (f'a.py:\n{FENCE}\nx = 1\n{FENCE}\na.py again:\n{FENCE}\nx = 2\n{FENCE}', {'a.py': 'x = 2\n'}),
+    # A name only matches as a whole path
+    (f'### test_a.py\n{FENCE}python\nt = 1\n{FENCE}', {}),
+    (f'### old_a.py.bak\n{FENCE}python\nt = 1\n{FENCE}', {}),
+    # The label is the line right before the block, not an earlier one
+    (f'### a.py\nChanges:\n{FENCE}python\nx = 1\n{FENCE}', {}),
+])
+def test_extract_files(text, files):
+    assert extract_files(text, ['a.py', 'b.js', 'pkg/a.py']) == files
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from import_graph import build, dependents, module_name
+
+P = os.path.join
+
+
+@pytest.mark.parametrize('path, name', [
+    ('util.py', 'util'),
+    (P('pkg', 'util.py'), 'pkg.util'),
+    (P('pkg', '__init__.py'), 'pkg'),
+    (P('pkg', 'sub', 'mod.py'), 'pkg.sub.mod'),
+    (P('.', 'pkg', 'util.py'), 'pkg.util'),
+])
+def test_module_name(path, name):
+    assert module_name(path) == name
+
+
+def write_project(root, files):
+    for path, source in files.items():
+        os.makedirs(os.path.dirname(os.path.join(root, path)) or root, exist_ok=True)
+        with open(os.path.join(root, path), 'w', encoding='utf-8') as f:
+            f.write(source)
+    return sorted(files)
+
+
+PROJECT = {
+    'main.py': 'import pkg.core\nfrom pkg.util import helper\n',
+    P('pkg', '__init__.py'): '',
+    P('pkg', 'core.py'): 'from . import util\nfrom .sub import mod\n',
+    P('pkg', 'util.py'): 'import json\n',
+    P('pkg', 'sub', '__init__.py'): 'from .mod import thing\n',
+    P('pkg', 'sub', 'mod.py'): 'from ..util import helper\nthing = 1\n',
+    P('pkg', 'sub', 'leaf.py'): 'from .. import core\n',
+    'test_main.py': 'import main\n',
+    'test_util.py': 'from pkg import util\n',
+    P('tests', 'conftest.py'): 'import pytest\n',
+    P('tests', 'helpers.py'): 'VALUE = 1\n',
+    # pytest puts a test's own directory on sys.path
+    P('tests', 'test_mod.py'): 'import helpers\nfrom pkg.sub.mod import thing\n',
+    P('tests', 'test_broken.py'): 'def broken(:\n',
+    'plugins.py': 'import importlib\nplugin = importlib.import_module(name)\n',
+}
+
+
+@pytest.mark.parametrize('path, edges', [
+    ('main.py', {P('pkg', '__init__.py'), P('pkg', 'core.py'), P('pkg', 'util.py')}),
+    (P('pkg', '__init__.py'), set()),
+    (P('pkg', 'core.py'), {P('pkg', '__init__.py'), P('pkg', 'util.py'), P('pkg', 'sub', '__init__.py'),
+                           P('pkg', 'sub', 'mod.py')}),
+    (P('pkg', 'util.py'), set()),
+    (P('pkg', 'sub', '__init__.py'), {P('pkg', '__init__.py'), P('pkg', 'sub', 'mod.py')}),
+    (P('pkg', 'sub', 'mod.py'), {P('pkg', '__init__.py'), P('pkg', 'util.py')}),
+    (P('pkg', 'sub', 'leaf.py'), {P('pkg', '__init__.py'), P('pkg', 'core.py')}),
+    ('test_main.py', {'main.py'}),
+    ('test_util.py', {P('pkg', '__init__.py'), P('pkg', 'util.py')}),
+    (P('tests', 'conftest.py'), set()),
+    (P('tests', 'test_mod.py'), {P('tests', 'conftest.py'), P('tests', 'helpers.py'), P('pkg', '__init__.py'),
+                                 P('pkg', 'sub', '__init__.py'), P('pkg', 'sub', 'mod.py')}),
+    # A file that doesn't parse has no imports of its own, but still its conftest
+    (P('tests', 'test_broken.py'), {P('tests', 'conftest.py')}),
+    # An import by computed name may import anything
+    ('plugins.py', set(PROJECT) - {'plugins.py'}),
+])
+def test_build(tmp_path, path, edges):
+    graph = build(str(tmp_path), write_project(str(tmp_path), PROJECT))
+    assert set(graph) == set(PROJECT)
+    assert graph[path] == edges
+
+
+@pytest.mark.parametrize('changed, found', [
+    ([], set()),
+    (['test_main.py'], {'test_main.py', 'plugins.py'}),
+    ([P('pkg', 'util.py')], {P('pkg', 'util.py'), P('pkg', 'core.py'), P('pkg', 'sub', 'mod.py'),
+                             P('pkg', 'sub', '__init__.py'), P('pkg', 'sub', 'leaf.py'), 'main.py', 'test_main.py',
+                             'test_util.py', P('tests', 'test_mod.py'), 'plugins.py'}),
+    ([P('tests', 'helpers.py')], {P('tests', 'helpers.py'), P('tests', 'test_mod.py'), 'plugins.py'}),
+    ([P('tests', 'conftest.py')], {P('tests', 'conftest.py'), P('tests', 'test_mod.py'),
+                                   P('tests', 'test_broken.py'), 'plugins.py'}),
+])
+def test_dependents(tmp_path, changed, found):
+    graph = build(str(tmp_path), write_project(str(tmp_path), PROJECT))
+    assert dependents(graph, changed) == found
+
+
+@pytest.mark.parametrize('graph, changed, found', [
+    ({'a': {'b'}, 'b': {'c'}, 'c': set()}, ['c'], {'a', 'b', 'c'}),
+    ({'a': {'b'}, 'b': {'a'}}, ['a'], {'a', 'b'}),
+    ({'a': {'b'}, 'b': set()}, ['gone.py'], {'gone.py'}),
+])
+def test_dependents_of_graph(graph, changed, found):
+    assert dependents(graph, changed) == found
@@ -0,0 +1,93 @@
+import pytest
+
+from incremental_json import JsonArrayStream
+
+TASKS = [{"file_name": "a.py", "task_description": "A"}, {"file_name": "b.py", "task_description": "B"}]
+TASKS_JSON = '[{"file_name": "a.py", "task_description": "A"}, {"file_name": "b.py", "task_description": "B"}]'
+
+
+def feed_all(chunks):
+    stream = JsonArrayStream()
+    completed = []
+    for chunk in chunks:
+        completed.extend(stream.feed(chunk))
+    return stream, completed
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('text', [
+    TASKS_JSON,
+    'Here is the task list:\n' + TASKS_JSON,
+    '```json\n' + TASKS_JSON + '\n```',
+    'The tasks [see below] are ordered by dependency:\n```json\n' + TASKS_JSON + '\n```',
+    'See [the design] and [ notes ]:\n' + TASKS_JSON + '\nLet me know [if] anything is missing.',
+    TASKS_JSON + '\nTrailing text with [brackets] and {braces}.',
+])
+@pytest.mark.parametrize('size', [1, 2, 7, 1000])
+def test_complete_array(text, size):
+    stream, completed = feed_all(chunked(text, size))
+    assert completed == TASKS
+    assert stream.items == TASKS
+    assert stream.complete
+    assert stream.errors == []
+
+
+@pytest.mark.parametrize('text, items', [
+    ('[]', []),
+    ('[1, 2.5, -3]', [1, 2.5, -3]),
+    ('[true, false, null]', [True, False, None]),
+    ('See [the notes] first: [null, 1]', [None, 1]),
+    ('["a", "b"]', ['a', 'b']),
+    ('[[1, [2]], {"k": [3]}]', [[1, [2]], {"k": [3]}]),
+    ('["quote \\" inside", "bracket ] inside", "brace } inside"]', ['quote " inside', 'bracket ] inside',
+                                                                    'brace } inside']),
+    ('["escaped \\\\", "next"]', ['escaped \\', 'next']),
+    ('[\n  {"a": 1},\n  {"b": 2}\n]', [{"a": 1}, {"b": 2}]),
+])
+@pytest.mark.parametrize('size', [1, 3, 1000])
+def test_elements(text, items, size):
+    stream, completed = feed_all(chunked(text, size))
+    assert completed == items
+    assert stream.complete
+    assert stream.errors == []
+
+
+@pytest.mark.parametrize('text, items', [
+    ('', []),
+    ('Working on it', []),
+    ('[see below', []),
+    ('[', []),
+    ('[{"file_name": "a.py"', []),
+    ('[{"file_name": "a.py"}', [{"file_name": "a.py"}]),
+    ('[{"file_name": "a.py"}, {"file_name": "b', [{"file_name": "a.py"}]),
+    ('[{"file_name": "a.py"}, "unterminated \\"', [{"file_name": "a.py"}]),
+    # A scalar is only complete once the ',' or ']' after it arrives
+    ('[1, 2', [1]),
+])
+def test_truncated_stream(text, items):
+    stream, completed = feed_all(chunked(text, 1))
+    assert completed == items
+    assert stream.items == items
+    assert not stream.complete
+    assert stream.errors == []
+
+
+def test_elements_are_returned_as_they_complete():
+    stream = JsonArrayStream()
+    assert stream.feed('Tasks [see below]:\n[{"a": ') == []
+    assert stream.feed('1}, {"b"') == [{"a": 1}]
+    assert stream.feed(': 2}') == [{"b": 2}]
+    assert stream.feed(', 3') == []
+    assert stream.feed(']') == [3]
+    assert stream.feed('[{"c": 3}]') == []
+    assert stream.items == [{"a": 1}, {"b": 2}, 3]
+
+
+def test_invalid_element_is_reported_and_skipped():
+    stream, completed = feed_all(['[{"a": 1}, {bad}, {"b": 2}]'])
+    assert completed == [{"a": 1}, {"b": 2}]
+    assert len(stream.errors) == 1
+    assert '{bad}' in stream.errors[0]
@@ -0,0 +1,50 @@
+import pytest
+
+from llm_cache import estimate_tokens
+from prompt_budget import MIN_ERROR_TOKENS, _trim_tail, fit_prompt
+
+MARKER = '[... earlier output trimmed ...]\n'
+TEMPLATE = 'Files:\n{files}\nError:\n{error_message}\n'
+
+
+@pytest.mark.parametrize('text, max_tokens, expected', [
+    ('short error', 1000, 'short error'),
+    ('e' * 2000, 500, 'e' * 2000),
+    ('e' * 2000, 300, MARKER + 'e' * (1200 - len(MARKER))),
+    # However far over budget, the tail of the error is kept
+    ('e' * 2000, 0, MARKER + 'e' * (MIN_ERROR_TOKENS * 4)),
+    ('e' * 2000, -500, MARKER + 'e' * (MIN_ERROR_TOKENS * 4)),
+    # Trimming that would not make the text shorter leaves it alone
+    ('e' * (MIN_ERROR_TOKENS * 4 + 10), -500, 'e' * (MIN_ERROR_TOKENS * 4 + 10)),
+    ('', -500, ''),
+    ('head\n' + 'e' * 2000 + '\nE   ValueError: bad', 0, MARKER + ('e' * 2000 + '\nE   ValueError: bad')[-400:]),
+])
+def test_trim_tail(text, max_tokens, expected):
+    trimmed = _trim_tail(text, max_tokens)
+    assert trimmed == expected
+    assert len(trimmed) <= len(text)
+
+
+@pytest.mark.parametrize('files, error, budget, error_chars', [
+    # Within budget: nothing is trimmed
+    ('y' * 100, 'e' * 400, 1000, 400),
+    # The error is trimmed to what the budget leaves (None: checked against the budget)
+    ('y' * 100, 'e' * 4000, 600, None),
+    # The rest of the prompt alone is over budget: only the error's tail is kept
+    ('y' * 2000, 'e' * 400, 100, 400),
+    ('y' * 2000, 'e' * 4000, 100, MIN_ERROR_TOKENS * 4),
+], ids=['within-budget', 'trimmed-to-budget', 'short-error-over-budget', 'long-error-over-budget'])
+def test_fit_prompt_trims_error(files, error, budget, error_chars):
+    prompt, report = fit_prompt(TEMPLATE, 'code_fixer', budget=budget, files=files, error_message=error)
+    untrimmed = TEMPLATE.format(files=files, error_message=error)
+    kept = prompt.split('Error:\n', 1)[1][:-1]
+    if error_chars is None:
+        assert kept.startswith(MARKER)
+        assert report['tokens'] <= budget
+    else:
+        assert kept.replace(MARKER, '') == error[-error_chars:]
+    assert error.endswith(kept.replace(MARKER, ''))
+    assert len(prompt) <= len(untrimmed)
+    assert report['tokens'] == estimate_tokens(prompt)
+    assert report['full_tokens'] == estimate_tokens(untrimmed)
+    assert report['over_budget'] == (report['tokens'] > budget)
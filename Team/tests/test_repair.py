@@ -0,0 +1,185 @@
+import pytest
+
+from repair import group_failures, parse_failure, trim_output
+
+PROJECT = '/proj'
+FILES = {'calc.py', 'pkg/__init__.py', 'pkg/broken.py', 'pkg/helpers.py', 'test_calc.py', 'test_import.py',
+         'test_syntax.py', 'test_assert.py'}
+
+# pytest -q --tb=short output, as test_runner and test_worker run it
+TYPE_ERROR = """FF                                                                       [100%]
+=================================== FAILURES ===================================
+___________________________________ test_add ___________________________________
+test_calc.py:5: in test_add
+    assert add(1, 2) == 3
+           ^^^^^^^^^
+calc.py:2: in add
+    return helper(a) + b
+           ^^^^^^^^^
+calc.py:6: in helper
+    return a["x"]
+           ^^^^^^
+E   TypeError: 'int' object is not subscriptable
+__________________________________ test_equal __________________________________
+test_calc.py:9: in test_equal
+    assert 1 + 1 == 3
+E   assert (1 + 1) == 3
+=========================== short test summary info ============================
+FAILED test_calc.py::test_add - TypeError: 'int' object is not subscriptable
+FAILED test_calc.py::test_equal - assert (1 + 1) == 3
+2 failed in 0.04s
+"""
+
+IMPORT_ERROR = """
+==================================== ERRORS ====================================
+_______________________ ERROR collecting test_import.py ________________________
+ImportError while importing test module '/proj/test_import.py'.
+Hint: make sure your test modules/packages have valid Python names.
+Traceback:
+/usr/lib/python3.11/importlib/__init__.py:126: in import_module
+    return _bootstrap._gcd_import(name[level:], package, level)
+           ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+test_import.py:1: in <module>
+    from missing_mod import thing
+E   ModuleNotFoundError: No module named 'missing_mod'
+=========================== short test summary info ============================
+ERROR test_import.py
+!!!!!!!!!!!!!!!!!!!! Interrupted: 1 error during collection !!!!!!!!!!!!!!!!!!!!
+1 error in 0.20s
+"""
+
+PROJECT_IMPORT_ERROR = """
+==================================== ERRORS ====================================
+_______________________ ERROR collecting test_calc.py __________________________
+test_calc.py:1: in <module>
+    from calc import add
+calc.py:1: in <module>
+    from pkg.helpers import helper
+E   ImportError: cannot import name 'helper' from 'pkg.helpers' (/proj/pkg/helpers.py)
+=========================== short test summary info ============================
+ERROR test_calc.py
+1 error in 0.20s
+"""
+
+SYNTAX_ERROR = """
+==================================== ERRORS ====================================
+_______________________ ERROR collecting test_syntax.py ________________________
+/usr/lib/python3.11/site-packages/_pytest/python.py:508: in importtestmodule
+    mod = import_path(
+<frozen importlib._bootstrap>:1204: in _gcd_import
+    ???
+/usr/lib/python3.11/site-packages/_pytest/assertion/rewrite.py:188: in exec_module
+    exec(co, module.__dict__)
+test_syntax.py:1: in <module>
+    from pkg.broken import f
+E     File "/proj/pkg/broken.py", line 1
+E       def f(:
+E             ^
+E   SyntaxError: invalid syntax
+=========================== short test summary info ============================
+ERROR test_syntax.py
+!!!!!!!!!!!!!!!!!!!! Interrupted: 1 error during collection !!!!!!!!!!!!!!!!!!!!
+1 error in 0.31s
+"""
+
+ASSERTION = """F                                                                        [100%]
+=================================== FAILURES ===================================
+_________________________________ test_values __________________________________
+test_assert.py:3: in test_values
+    assert values == [1, 3]
+E   assert [1, 2] == [1, 3]
+E     
+E     At index 1 diff: 2 != 3
+E     Use -v to get more diff
+=========================== short test summary info ============================
+FAILED test_assert.py::test_values - assert [1, 2] == [1, 3]
+1 failed in 0.03s
+"""
+
+ADDRESS = """F                                                                        [100%]
+=================================== FAILURES ===================================
+_________________________________ test_add ___________________________________
+test_calc.py:5: in test_add
+    assert add(1, 2) == 3
+E   AssertionError: assert <calc.Num object at 0x7f3a2c1d9e50> == 3
+=========================== short test summary info ============================
+FAILED test_calc.py::test_add - AssertionError: assert <calc.Num object at 0x7f3a2c1d9e50> == 3
+1 failed in 0.03s
+"""
+
+
+@pytest.mark.parametrize('test_file, source_file, output, signature, files, tests', [
+    # Located at the innermost frame outside the test files
+    ('test_calc.py', 'calc.py', TYPE_ERROR, "TypeError: 'int' object is not subscriptable (calc.py:helper)",
+     ['calc.py', 'test_calc.py'], ['test_calc.py::test_add', 'test_calc.py::test_equal']),
+    # Import errors are not located, so every test file they break shares the signature
+    ('test_import.py', 'import.py', IMPORT_ERROR, "ModuleNotFoundError: No module named 'missing_mod'",
+     ['test_import.py'], []),
+    ('test_calc.py', 'calc.py', PROJECT_IMPORT_ERROR,
+     "ImportError: cannot import name 'helper' from 'pkg.helpers' (pkg/helpers.py)",
+     ['calc.py', 'pkg/helpers.py', 'test_calc.py'], []),
+    # A SyntaxError is located in the file it names
+    ('test_syntax.py', 'syntax.py', SYNTAX_ERROR, 'SyntaxError: invalid syntax (pkg/broken.py)',
+     ['pkg/broken.py', 'test_syntax.py'], []),
+    # A failed assertion in the test itself is located at the test function
+    ('test_assert.py', 'assert.py', ASSERTION, 'AssertionError: assert [1, 2] == [1, 3] (test_assert.py::test_values)',
+     ['test_assert.py'], ['test_assert.py::test_values']),
+    ('test_calc.py', 'calc.py', ADDRESS,
+     'AssertionError: assert <calc.Num object at 0x?> == 3 (test_calc.py::test_add)',
+     ['calc.py', 'test_calc.py'], ['test_calc.py::test_add']),
+])
+def test_parse_failure(test_file, source_file, output, signature, files, tests):
+    failure = parse_failure({'test_file': test_file, 'status': 'failed', 'output': output}, PROJECT, source_file,
+                            FILES)
+    assert failure.test_file == test_file
+    assert failure.signature == signature
+    assert failure.files == files
+    assert failure.tests == tests
+
+
+@pytest.mark.parametrize('status, output, signature', [
+    ('timeout', 'test_calc.py ..', 'Timeout: test_calc.py did not finish'),
+    # A crash without a report is located at the test file
+    ('error', 'Fatal Python error: Segmentation fault', 'Error: Fatal Python error: Segmentation fault (test_calc.py)'),
+    ('error', '', 'Error: no output (test_calc.py)'),
+])
+def test_parse_failure_without_report(status, output, signature):
+    failure = parse_failure({'test_file': './test_calc.py', 'status': status, 'output': output}, PROJECT, 'calc.py',
+                            FILES)
+    assert failure.test_file == 'test_calc.py'
+    assert failure.signature == signature
+    assert failure.files == ['calc.py', 'test_calc.py']
+    assert failure.excerpt == output.strip()
+
+
+def test_same_import_error_is_one_group():
+    other = IMPORT_ERROR.replace('test_import.py', 'test_calc.py')
+    failures = [parse_failure({'test_file': name, 'status': 'failed', 'output': output}, PROJECT, 'calc.py', FILES)
+                for name, output in (('test_import.py', IMPORT_ERROR), ('test_calc.py', other))]
+    groups = group_failures(failures)
+    assert len(groups) == 1
+    assert groups[0].test_files == ['test_import.py', 'test_calc.py']
+    assert groups[0].files == ['calc.py', 'test_import.py', 'test_calc.py']
+
+
+@pytest.mark.parametrize('output, kept, dropped', [
+    (TYPE_ERROR, ['calc.py:6: in helper', '    return a["x"]', "E   TypeError: 'int' object is not subscriptable",
+                  '___________________________________ test_add ___________________________________'],
+     ['FAILED test_calc.py::test_add', '2 failed']),
+    (SYNTAX_ERROR, ['test_syntax.py:1: in <module>', 'E   SyntaxError: invalid syntax'],
+     ['_pytest/python.py', 'exec(co, module.__dict__)', '???', 'rewrite.py']),
+    (IMPORT_ERROR, ["E   ModuleNotFoundError: No module named 'missing_mod'"],
+     ['importlib/__init__.py', '_bootstrap._gcd_import']),
+])
+def test_trim_output(output, kept, dropped):
+    text = trim_output(output, FILES)
+    for line in kept:
+        assert line in text.splitlines()
+    for part in dropped:
+        assert part not in text
+
+
+def test_trim_output_keeps_the_end():
+    text = trim_output(TYPE_ERROR, FILES, max_chars=40)
+    assert text.startswith('[... earlier output trimmed ...]\n')
+    assert text.endswith('E   assert (1 + 1) == 3')
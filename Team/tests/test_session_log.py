@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+import session_log
+from session_log import SessionLog
+
+
+def write_log(root, messages, segment_bytes=1024, segments=5):
+    log = SessionLog('s1', root=root, segment_bytes=segment_bytes, segments=segments)
+    for message in messages:
+        log.append(message)
+    log.close()
+    return log
+
+
+# Ten 5-byte lines ("msg0\n" ... "msg9\n") in 10-byte segments: two lines per segment
+MESSAGES = [f"msg{i}" for i in range(10)]
+TEXT = ''.join(f"{message}\n" for message in MESSAGES)
+
+
+def test_segments_are_named_by_offset(tmp_path):
+    write_log(str(tmp_path), MESSAGES, segment_bytes=10, segments=100)
+    names = sorted(os.listdir(os.path.join(str(tmp_path), 's1')))
+    assert names == [f"{start:012d}.log" for start in range(0, 50, 10)]
+
+
+@pytest.mark.parametrize('offset, max_bytes, text, next_offset', [
+    (0, 1000, TEXT, 50),
+    (-5, 1000, TEXT, 50),
+    (20, 1000, TEXT[20:], 50),
+    # An offset in the middle of a segment
+    (15, 1000, TEXT[15:], 50),
+    (50, 1000, '', 50),
+    # Cut after the last complete line
+    (0, 12, 'msg0\nmsg1\n', 10),
+    (0, 5, 'msg0\n', 5),
+    (5, 17, 'msg1\nmsg2\nmsg3\n', 20),
+    # A line longer than max_bytes is returned cut
+    (0, 3, 'msg', 3),
+])
+def test_read(tmp_path, offset, max_bytes, text, next_offset):
+    write_log(str(tmp_path), MESSAGES, segment_bytes=10, segments=100)
+    result = session_log.read('s1', offset, max_bytes, root=str(tmp_path))
+    assert result == {'text': text, 'offset': max(0, offset), 'next_offset': next_offset, 'skipped': 0}
+
+
+def test_read_resumes_at_next_offset(tmp_path):
+    write_log(str(tmp_path), MESSAGES, segment_bytes=10, segments=100)
+    texts = []
+    offset = 0
+    while True:
+        result = session_log.read('s1', offset, 7, root=str(tmp_path))
+        if not result['text']:
+            break
+        assert result['offset'] == offset
+        texts.append(result['text'])
+        offset = result['next_offset']
+    assert texts == [f"{message}\n" for message in MESSAGES]
+
+
+@pytest.mark.parametrize('offset, text, skipped', [
+    # The three oldest segments (bytes 0-29) were deleted
+    (0, TEXT[30:], 30),
+    (12, TEXT[30:], 18),
+    (30, TEXT[30:], 0),
+    (45, TEXT[45:], 0),
+])
+def test_read_after_rotation(tmp_path, offset, text, skipped):
+    write_log(str(tmp_path), MESSAGES, segment_bytes=10, segments=2)
+    assert len(os.listdir(os.path.join(str(tmp_path), 's1'))) == 2
+    result = session_log.read('s1', offset, root=str(tmp_path))
+    assert result == {'text': text, 'offset': offset + skipped, 'next_offset': 50, 'skipped': skipped}
+
+
+def test_read_past_the_end(tmp_path):
+    write_log(str(tmp_path), MESSAGES, segment_bytes=10, segments=100)
+    result = session_log.read('s1', 80, root=str(tmp_path))
+    assert result == {'text': '', 'offset': 50, 'next_offset': 50, 'skipped': 0}
+
+
+def test_resumed_session_appends(tmp_path):
+    write_log(str(tmp_path), MESSAGES[:3], segment_bytes=10, segments=100)
+    write_log(str(tmp_path), MESSAGES[3:], segment_bytes=10, segments=100)
+    result = session_log.read('s1', 0, root=str(tmp_path))
+    assert result['text'] == TEXT
+    assert result['next_offset'] == 50
+
+
+def test_multibyte_text_is_cut_at_a_line(tmp_path):
+    write_log(str(tmp_path), ['héllo', 'wörld'])
+    result = session_log.read('s1', 0, 10, root=str(tmp_path))
+    assert result['text'] == 'héllo\n'
+    assert result['next_offset'] == len('héllo\n'.encode('utf-8'))
+
+
+def test_tail_is_kept_in_memory(tmp_path):
+    log = SessionLog('s1', root=str(tmp_path), tail_lines=3)
+    for message in MESSAGES + ['x' * (session_log.LOG_MESSAGE_CHARS + 5)]:
+        log.append(message)
+    log.close()
+    tail = log.tail()
+    assert tail[:2] == ['msg8', 'msg9']
+    assert tail[2] == 'x' * session_log.LOG_MESSAGE_CHARS + ' [... 5 more characters in the session log]'
+    result = session_log.read('s1', 0, root=str(tmp_path))
+    assert result['text'].endswith('x' * (session_log.LOG_MESSAGE_CHARS + 5) + '\n')
+
+
+def test_without_session_id_nothing_is_written(tmp_path):
+    log = SessionLog(None, root=str(tmp_path))
+    log.append('msg0')
+    assert log.tail() == ['msg0']
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_missing_log(tmp_path):
+    assert session_log.read('s1', root=str(tmp_path)) is None
+
+
+@pytest.mark.parametrize('session_id', ['', '..', '../other', 'a/b', 'a b', 'a\\b'])
+def test_invalid_session_id(tmp_path, session_id):
+    with pytest.raises(ValueError):
+        session_log.read(session_id, root=str(tmp_path))
+    with pytest.raises(ValueError):
+        SessionLog(session_id or '.', root=str(tmp_path))
+    session_log.remove(session_id, root=str(tmp_path))
+
+
+def test_remove(tmp_path):
+    write_log(str(tmp_path), MESSAGES)
+    session_log.remove('s1', root=str(tmp_path))
+    assert session_log.read('s1', root=str(tmp_path)) is None
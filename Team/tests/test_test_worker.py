@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import test_worker
+
+FILES = {
+    'calc.py': 'def add(a, b):\n    return a + b\n',
+    'test_pass.py': 'from calc import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n',
+    'test_fail.py': 'from calc import add\n\n\ndef test_add():\n    assert add(1, 2) == 4\n',
+    # A QA answer without a single test function
+    'test_empty.py': 'def helper():\n    return 1\n',
+    'test_module_skip.py': 'import pytest\n\npytest.skip("not ready", allow_module_level=True)\n\n\n'
+                           'def test_never():\n    assert False\n',
+    'test_skip.py': 'import pytest\n\n\n@pytest.mark.skip(reason="not ready")\ndef test_later():\n    pass\n',
+    'test_collect_error.py': 'from calc import missing\n\n\ndef test_x():\n    pass\n',
+}
+
+
+@pytest.fixture
+def project(tmp_path):
+    for name, source in FILES.items():
+        (tmp_path / name).write_text(source)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('persistent', [True, False])
+@pytest.mark.parametrize('test_file, status, counts', [
+    ('test_pass.py', 'passed', {'passed': 1}),
+    ('test_fail.py', 'failed', {'failed': 1}),
+    ('test_empty.py', 'failed', {}),
+    # pytest exits with "no tests collected" for a module skipped as a whole
+    ('test_module_skip.py', 'failed', {'skipped': 1}),
+    ('test_skip.py', 'passed', {'skipped': 1}),
+    ('test_collect_error.py', 'failed', {'error': 1}),
+    ('test_missing.py', None, {}),
+])
+def test_run_one_file(project, persistent, test_file, status, counts):
+    with test_worker.TestWorker(project, timeout=60, persistent=persistent) as worker:
+        records = worker.run([test_file])
+    assert list(records) == [test_file]
+    record = records[test_file]
+    assert record['test_file'] == test_file
+    if status is None:
+        assert record['status'] in ('failed', 'error')
+    else:
+        assert record['status'] == status
+    assert record['passed'] == (record['status'] == 'passed')
+    assert {kind: n for kind, n in record['counts'].items() if n} == counts
+
+
+def test_one_session_over_every_file(project):
+    names = sorted(name for name in FILES if name.startswith('test_')) + ['test_missing.py']
+    with test_worker.TestWorker(project, timeout=60, persistent=True) as worker:
+        records = worker.run(names)
+        assert set(records) == set(names)
+        assert [name for name in names if records[name]['passed']] == ['test_pass.py', 'test_skip.py']
+        assert 'no tests ran' in records['test_empty.py']['output']
+        assert 'assert 3 == 4' in records['test_fail.py']['output']
+        # A later run reads the files again
+        with open(os.path.join(project, 'calc.py'), 'w') as f:
+            f.write('def add(a, b):\n    return 4\n')
+        records = worker.run(['test_pass.py', 'test_fail.py'])
+    assert not records['test_pass.py']['passed']
+    assert records['test_fail.py']['passed']
+
+
+def test_no_files(project):
+    with test_worker.TestWorker(project, persistent=True) as worker:
+        assert worker.run([]) == {}